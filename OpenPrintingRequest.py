@@ -26,6 +26,7 @@ import config
 
 import cupshelpers
 from debug import *
+import threading
 
 from gi.repository import GObject
 
@@ -53,30 +54,48 @@ class OpenPrintingRequest(GObject.GObject):
     def __init__ (self, **args):
         GObject.GObject.__init__ (self)
         debugprint ("Starting")
+        if 'snapshot' not in args:
+            # Use the system-wide snapshot if there is one.
+            args['snapshot'] = cupshelpers.openprinting.getDefaultSnapshot ()
+
         self.openprinting = cupshelpers.openprinting.OpenPrinting (**args)
-        self._handle = None
+        self._handles = []
+        self._pending = None
+        self._lock = threading.Lock ()
         debugprint ("+%s" % self)
 
     def __del__ (self):
         debugprint ("-%s" % self)
 
+    def _cancel_queries (self):
+        with self._lock:
+            handles = self._handles
+            self._handles = []
+
+        for handle in handles:
+            self.openprinting.cancelOperation (handle)
+
     def cancel (self):
         debugprint ("%s: cancel()" % self)
-        if self._handle is not None:
-            self.openprinting.cancelOperation (self._handle)
-            self._handle = None
+        with self._lock:
+            self._pending = None
 
+        self._cancel_queries ()
         debugprint ("%s -> 'error'" % self)
         self.emit ('error', 0, 'canceled')
 
     def searchPrinters (self, searchterm, user_data=None):
         debugprint ("%s: searchPrinters()" % self)
-        self._handle = self.openprinting.searchPrinters (searchterm,
-                                                         self._printers_got,
-                                                         user_data)
+        handle = self.openprinting.searchPrinters (searchterm,
+                                                   self._printers_got,
+                                                   user_data)
+        with self._lock:
+            self._handles = [handle]
 
     def _printers_got (self, status, user_data, printers):
-        self._handle = None
+        with self._lock:
+            self._handles = []
+
         if status != 0:
             debugprint ("%s -> 'error'" % self)
             self.emit ('error', status, printers)
@@ -86,25 +105,11 @@ class OpenPrintingRequest(GObject.GObject):
                                                 for x in printers]
         self.downloadable_printers = []
         self.downloadable_drivers = dict() # by printer id of dict
-
-        # Kick off a search for drivers for each model.
-        if not self._query_next_printer ():
+        self._pending = len (self.downloadable_printers_unchecked)
+        self._found = dict()
+        if not self._pending:
             self._drivers_got ()
-
-    def _query_next_printer (self):
-        """
-        If there are more printers to query, kick off a query and
-        return True.
-
-        Otherwise return False.
-        """
-
-        try:
-            user_data = self.downloadable_printers_unchecked.pop ()
-            (printer_id, printer_name) = user_data
-        except IndexError:
-            debugprint ("%s: All printer driver queries finished" % self)
-            return False
+            return
 
         if config.DOWNLOADABLE_ONLYFREE:
             self.openprinting.onlyfree = 1
@@ -118,17 +123,31 @@ class OpenPrintingRequest(GObject.GObject):
             options['onlydownload'] = '1'
             options['packagesystem'] = config.packagesystem
 
-        debugprint ("%s: Querying drivers for %s" % (self, printer_id))
-        self._handle = self.openprinting.listDrivers (printer_id,
-                                                      self._printer_drivers_got,
-                                                      user_data=user_data,
-                                                      extra_options=options)
+        # Kick off a search for drivers for each model.  The
+        # OpenPrinting module limits how many run at once.
+        handles = []
+        for user_data in self.downloadable_printers_unchecked:
+            (printer_id, printer_name) = user_data
+            debugprint ("%s: Querying drivers for %s" % (self, printer_id))
+            handles.append (
+                self.openprinting.listDrivers (printer_id,
+                                               self._printer_drivers_got,
+                                               user_data=user_data,
+                                               extra_options=options))
 
-        return True
+        with self._lock:
+            self._handles = handles
 
     def _printer_drivers_got (self, status, user_data, drivers):
-        self._handle = None
         if status != 0:
+            # Stop the other queries; only report the first error.
+            with self._lock:
+                if self._pending is None:
+                    return
+
+                self._pending = None
+
+            self._cancel_queries ()
             debugprint ("%s -> 'error'" % self)
             self.emit ('error', status, drivers)
             return
@@ -154,14 +173,32 @@ class OpenPrintingRequest(GObject.GObject):
                 debugprint ("%s: - drivers with installable resources found" %
                             self)
                 (printer_id, printer_name) = user_data
-                self.downloadable_drivers[printer_id] = drivers_installable
-                self.downloadable_printers.append (user_data)
+                with self._lock:
+                    self._found[printer_id] = drivers_installable
+
+        with self._lock:
+            if self._pending is None:
+                # Another query failed.
+                return
+
+            self._pending -= 1
+            finished = self._pending == 0
 
-        if not self._query_next_printer ():
+        if finished:
+            debugprint ("%s: All printer driver queries finished" % self)
             self._drivers_got ()
 
     def _drivers_got (self):
-        self._handle = None
+        with self._lock:
+            self._handles = []
+
+        # Report printers in the order the search returned them.
+        for user_data in self.downloadable_printers_unchecked:
+            (printer_id, printer_name) = user_data
+            if printer_id in self._found:
+                self.downloadable_drivers[printer_id] = self._found[printer_id]
+                self.downloadable_printers.append (user_data)
+
         debugprint ("%s -> 'finished'" % self)
         self.emit ('finished',
                    self.downloadable_printers,
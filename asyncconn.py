@@ -19,6 +19,7 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import cups
+import functools
 import os
 from debug import *
 import debug
@@ -151,20 +152,6 @@ class Connection(SemanticOperations):
                                             semantic=self)
             self._conn = c
 
-        methodtype = type (self._conn.getPrinters)
-        instancemethodtype = type (self._conn.getDevices)
-        bindings = []
-        for fname in dir (self._conn):
-            if fname.startswith ('_'):
-                continue
-            fn = getattr (self._conn, fname)
-            if type (fn) != methodtype and type (fn) != instancemethodtype:
-                continue
-            if not hasattr (self, fname):
-                setattr (self, fname, self._make_binding (fn))
-                bindings.append (fname)
-
-        self._bindings = bindings
         self._methodcalls = []
         debugprint ("+%s" % self)
 
@@ -182,11 +169,17 @@ class Connection(SemanticOperations):
         for methodcall in self._methodcalls:
             methodcall.destroy ()
 
-        for binding in self._bindings:
-            delattr (self, binding)
+    def __getattr__ (self, fname):
+        # Operations not implemented here are passed on to the
+        # underlying connection.
+        if fname[0] == '_' or self._destroyed:
+            raise AttributeError (fname)
 
-    def _make_binding (self, fn):
-        return lambda *args, **kwds: self._call_function (fn, *args, **kwds)
+        fn = getattr (self._conn, fname)
+        if not callable (fn):
+            raise AttributeError (fname)
+
+        return functools.partial (self._call_function, fn)
 
     def _call_function (self, fn, *args, **kwds):
         methodcall = _AsyncMethodCall (fn,
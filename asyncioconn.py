@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import asyncio
+import asyncconn
+from debug import *
+import debug
+
+######
+###### An asyncio API over asyncconn.Connection.  Replies arrive from
+###### the GLib main loop, so that must be running too: either use an
+###### asyncio event loop that is integrated with GLib (see
+###### install_glib_event_loop), or run coroutines with run().
+######
+
+class Connection:
+    """
+    Awaitable versions of the asyncconn.Connection methods.
+
+    Any asyncconn method can be awaited using call(); the most common
+    ones have their own coroutines.  Awaiting is cancellable, for
+    instance with asyncio.wait_for, but the underlying operation will
+    still run to completion.
+    """
+
+    def __init__ (self, host=None, port=None, encryption=None,
+                  parent=None, try_as_root=True, prompt_allowed=True,
+                  conn=None):
+        """
+        @param conn: an existing asyncconn.Connection (or compatible
+        object) to use instead of creating one
+        """
+        if conn is None:
+            conn = asyncconn.Connection (host=host, port=port,
+                                         encryption=encryption,
+                                         parent=parent,
+                                         try_as_root=try_as_root,
+                                         prompt_allowed=prompt_allowed)
+
+        self._conn = conn
+        debugprint ("+%s" % self)
+
+    def __del__ (self):
+        debug.debugprint ("-%s" % self)
+
+    def destroy (self):
+        debugprint ("DESTROY: %s" % self)
+        self._conn.destroy ()
+
+    def call (self, fname, *args, **kwds):
+        """
+        Start an operation.
+
+        @param fname: name of the asyncconn.Connection method
+        @returns: asyncio.Future for the result
+        """
+        loop = asyncio.get_event_loop ()
+        future = loop.create_future ()
+
+        def set_result (result):
+            if not future.done ():
+                future.set_result (result)
+
+        def set_exception (exc):
+            if not future.done ():
+                future.set_exception (exc)
+
+        # The handlers may run in a GLib main loop that is not the
+        # asyncio loop's thread.
+        def reply_handler (conn, result):
+            loop.call_soon_threadsafe (set_result, result)
+
+        def error_handler (conn, exc):
+            loop.call_soon_threadsafe (set_exception, exc)
+
+        fn = getattr (self._conn, fname)
+        fn (*args, reply_handler=reply_handler, error_handler=error_handler,
+            **kwds)
+        return future
+
+    async def getPrinters (self, **kwds):
+        return await self.call ('getPrinters', **kwds)
+
+    async def getJobs (self, **kwds):
+        return await self.call ('getJobs', **kwds)
+
+    async def getPPDs2 (self, **kwds):
+        return await self.call ('getPPDs2', **kwds)
+
+    async def getDevices (self, **kwds):
+        return await self.call ('getDevices', **kwds)
+
+    async def getPPD3 (self, name, **kwds):
+        return await self.call ('getPPD3', name, **kwds)
+
+def install_glib_event_loop ():
+    """
+    Make asyncio use the GLib main loop, if PyGObject supports it.
+
+    @returns: True if the GLib event loop policy was installed
+    """
+    try:
+        from gi.events import GLibEventLoopPolicy
+    except ImportError:
+        return False
+
+    asyncio.set_event_loop_policy (GLibEventLoopPolicy ())
+    return True
+
+async def _iterate_glib (interval):
+    from gi.repository import GLib
+    context = GLib.MainContext.default ()
+    while True:
+        while context.pending ():
+            context.iteration (False)
+
+        await asyncio.sleep (interval)
+
+def run (coro, timeout=None, interval=0.02):
+    """
+    Run a coroutine to completion, dispatching GLib events meanwhile.
+
+    This is for use when asyncio is not already integrated with the
+    GLib main loop.
+
+    @param timeout: give up with asyncio.TimeoutError after this
+    many seconds
+    @param interval: seconds to wait between dispatching GLib events
+    """
+    async def main ():
+        pump = asyncio.ensure_future (_iterate_glib (interval))
+        try:
+            return await asyncio.wait_for (coro, timeout)
+        finally:
+            pump.cancel ()
+
+    return asyncio.run (main ())
+
+if __name__ == "__main__":
+    # Demo
+    set_debugging (True)
+
+    async def demo ():
+        conn = Connection ()
+        try:
+            printers, devices = await asyncio.gather (conn.getPrinters (),
+                                                      conn.getDevices ())
+            print (printers)
+            print (devices)
+        finally:
+            conn.destroy ()
+
+    run (demo (), timeout=60)
@@ -21,6 +21,7 @@
 import threading
 import config
 import cups
+import functools
 from gi.repository import GObject
 from gi.repository import GLib
 from gi.repository import Gdk
@@ -30,6 +31,7 @@ import queue
 cups.require ("1.9.60")
 
 import authconn
+import cupshelpers
 from debug import *
 import debug
 import gettext
@@ -41,6 +43,109 @@ gettext.install(domain=config.PACKAGE, localedir=config.localedir)
 ###### thread.
 ######
 
+_cups_methods = None
+def cups_methods ():
+    """
+    Return the methods of cups.Connection, by name.
+
+    This is worked out once rather than for each connection object.
+    """
+    global _cups_methods
+    if _cups_methods is None:
+        methodtype = type (cups.Connection.getPrinters)
+        methods = {}
+        for fname in dir (cups.Connection):
+            if fname[0] == ' ':
+                continue
+            fn = getattr (cups.Connection, fname)
+            if type (fn) != methodtype:
+                continue
+            methods[fname] = fn
+
+        _cups_methods = methods
+
+    return _cups_methods
+
+class _CupsMethodDispatch:
+    """
+    Provide each cups.Connection method as an asynchronous operation
+    handled by self._call_function.
+
+    The methods are looked up in __getattr__, which Python only calls
+    for attributes not found in the usual way, so nothing is bound per
+    instance.  The other connection classes pass operations on to
+    their underlying connection in the same way.
+    """
+
+    _destroyed = False
+
+    def __getattr__ (self, fname):
+        if self._destroyed:
+            raise AttributeError (fname)
+
+        try:
+            fn = cups_methods ()[fname]
+        except KeyError:
+            raise AttributeError (fname)
+
+        return functools.partial (self._call_function, fn)
+
+    def batch (self, operations, **kwds):
+        """
+        Perform several independent operations back to back on the
+        same connection.
+
+        Each operation is a tuple of cups.Connection method name,
+        positional arguments and optionally keyword arguments.  The
+        reply handler is given the list of results.  If any operation
+        fails the error handler is given a cupshelpers.BatchError
+        holding the result or exception of each one, unless it was an
+        authentication failure which stopped the batch.
+        """
+        return self._call_function (_run_batch, list (operations), [],
+                                    **kwds)
+
+    def call (self, fn, *args, **kwds):
+        """
+        Perform fn (connection, *args) in the worker thread, where
+        connection is its cups.Connection, and handle the outcome as
+        for the cups.Connection methods.
+        """
+        return self._call_function (fn, *args, **kwds)
+
+def _run_batch (conn, operations, done):
+    # Runs in a worker thread.  If the operation is retried after
+    # authentication, 'done' holds the outcomes from before.
+    for operation in operations[len (done):]:
+        fname, args = operation[:2]
+        kwds = {}
+        if len (operation) > 2:
+            kwds = operation[2]
+
+        try:
+            result = getattr (conn, fname) (*args, **kwds)
+        except cups.HTTPError:
+            raise
+        except cups.IPPError as e:
+            if e.args[0] in [cups.IPP_NOT_AUTHORIZED,
+                             cups.IPP_FORBIDDEN,
+                             cups.IPP_AUTHENTICATION_CANCELED]:
+                raise
+
+            done.append ((None, e))
+            continue
+        except Exception as e:
+            done.append ((None, e))
+            continue
+
+        done.append ((result, None))
+
+    for (result, exc) in done:
+        if exc is not None:
+            raise cupshelpers.BatchError (list (done))
+
+    return [result for (result, exc) in done]
+
 ###
 ### This is the worker thread.
 ###
@@ -218,7 +323,7 @@ class _IPPConnectionThread(threading.Thread):
 ### This is the user-visible class.  Although it does not inherit from
 ### cups.Connection it implements the same functions.
 ###
-class IPPConnection:
+class IPPConnection(_CupsMethodDispatch):
     """
     This class starts a new thread to handle IPP operations.
 
@@ -246,19 +351,6 @@ class IPPConnection:
                                             user=user, host=host, port=port,
                                             encryption=encryption)
         self.thread.start ()
-
-        methodtype = type (cups.Connection.getPrinters)
-        bindings = []
-        for fname in dir (cups.Connection):
-            if fname[0] == ' ':
-                continue
-            fn = getattr (cups.Connection, fname)
-            if type (fn) != methodtype:
-                continue
-            setattr (self, fname, self._make_binding (fn))
-            bindings.append (fname)
-
-        self.bindings = bindings
         debugprint ("+%s" % self)
 
     def __del__ (self):
@@ -266,9 +358,7 @@ class IPPConnection:
 
     def destroy (self):
         debugprint ("DESTROY: %s" % self)
-        for binding in self.bindings:
-            delattr (self, binding)
-
+        self._destroyed = True
         if self.thread.is_alive ():
             debugprint ("Stopping worker thread")
             self.thread.stop ()
@@ -291,9 +381,6 @@ class IPPConnection:
         self.queue.put ((True, (user,), {},
                          reply_handler, error_handler, False))
 
-    def _make_binding (self, fn):
-        return lambda *args, **kwds: self._call_function (fn, *args, **kwds)
-
     def _call_function (self, fn, *args, **kwds):
         reply_handler = error_handler = auth_handler = False
         if "reply_handler" in kwds:
@@ -309,6 +396,316 @@ class IPPConnection:
         self.queue.put ((fn, args, kwds,
                          reply_handler, error_handler, auth_handler))
 
+######
+###### A pool of worker threads shared by many connection objects.
+######
+
+# Priority classes, most urgent first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+###
+### A single queued operation.
+###
+class _IPPPoolRequest:
+    def __init__ (self, conn, fn, args, kwds, user, priority,
+                  reply_handler, error_handler, auth_handler):
+        self.conn = conn
+        self.fn = fn
+        self.args = args
+        self.kwds = kwds
+        self.user = user
+        self.priority = priority
+        self.reply_handler = reply_handler
+        self.error_handler = error_handler
+        self.auth_handler = auth_handler
+        self.cancelled = False
+        self._auth_queue = queue.Queue (1)
+
+    def cancel (self):
+        """Drop the request if it has not started, and its result if
+        it has."""
+        self.cancelled = True
+        self.conn._requests.discard (self)
+        if self in self.conn._awaiting_auth:
+            self.conn._awaiting_auth.remove (self)
+
+        # Unblock the worker if it is waiting for a password.
+        self.set_auth_info ("")
+
+    def set_auth_info (self, password):
+        try:
+            self._auth_queue.put_nowait (password)
+        except queue.Full:
+            # Already answered, e.g. by cancel().
+            pass
+
+    def auth (self, prompt, conn=None, method=None, resource=None):
+        # Called from the worker thread by libcups.
+        def prompt_auth (prompt):
+            if self.cancelled:
+                # cancel() has given the worker its answer.
+                return False
+
+            Gdk.threads_enter ()
+            self.conn._awaiting_auth.append (self)
+            if conn is None:
+                self.auth_handler (prompt, self.conn)
+            else:
+                self.auth_handler (prompt, self.conn, method, resource)
+
+            Gdk.threads_leave ()
+            return False
+
+        if self.auth_handler is None or self.cancelled:
+            return ""
+
+        GLib.idle_add (prompt_auth, prompt)
+        return self._auth_queue.get ()
+
+    def reply (self, result):
+        self._send (self.reply_handler, result)
+
+    def error (self, exc):
+        self._send (self.error_handler, exc)
+
+    def _send (self, handler, arg):
+        def send (handler, arg):
+            if not self.cancelled:
+                Gdk.threads_enter ()
+                handler (self.conn, arg)
+                Gdk.threads_leave ()
+            return False
+
+        if handler and not self.cancelled:
+            GLib.idle_add (send, handler, arg)
+
+###
+### A worker thread.  Each has its own libcups connection, and since
+### libcups keeps the user name and password callback per thread,
+### each request can run as a different user.
+###
+class _IPPWorkerThread(threading.Thread):
+    def __init__ (self, pool):
+        threading.Thread.__init__ (self)
+        self.setDaemon (True)
+        self._pool = pool
+        self.idle = True
+        debugprint ("+%s" % self)
+
+    def __del__ (self):
+        debug.debugprint ("-%s" % self)
+
+    def run (self):
+        pool = self._pool
+        conn = None
+        user = None
+        while True:
+            self.idle = True
+            (priority, seq, request) = pool._queue.get ()
+            if request is None:
+                # Our signal to quit.
+                pool._queue.task_done ()
+                break
+
+            if request.cancelled:
+                pool._queue.task_done ()
+                continue
+
+            self.idle = False
+            cups.setPasswordCB2 (request.auth)
+            if conn is None or request.user != user:
+                user = request.user
+                cups.setUser (user)
+                debugprint ("%s: connecting as %s" % (self, user))
+                try:
+                    conn = cups.Connection (host=pool.host,
+                                            port=pool.port,
+                                            encryption=pool.encryption)
+                except RuntimeError as e:
+                    conn = None
+                    request.error (e)
+                    pool._queue.task_done ()
+                    continue
+
+            try:
+                debugprint ("%s: call %s" % (self, request.fn))
+                result = request.fn (conn, *request.args, **request.kwds)
+                if request.fn == cups.Connection.adminGetServerSettings.__call__:
+                    # Special case for a rubbish bit of API.
+                    if result == {}:
+                        # Authentication failed, but we aren't told that.
+                        raise cups.IPPError (cups.IPP_NOT_AUTHORIZED, '')
+
+                request.reply (result)
+            except Exception as e:
+                debugprint ("%s: failure (%s)" % (self, repr (e)))
+                if isinstance (e, cups.HTTPError):
+                    # The connection may no longer be usable.
+                    conn = None
+
+                request.error (e)
+
+            pool._queue.task_done ()
+
+        cups.setPasswordCB2 (None)
+        del conn
+        debugprint ("%s: exiting" % self)
+
+class IPPWorkerPool:
+    """
+    A fixed number of worker threads performing IPP operations.
+
+    Requests are taken in priority order, and in submission order
+    within a priority class, so interactive requests overtake queued
+    bulk refreshes.  Each request carries the user name to run as.
+    """
+
+    def __init__ (self, workers=4, host=None, port=None, encryption=None):
+        if host is None:
+            host = cups.getServer ()
+        if port is None:
+            port = cups.getPort ()
+        if encryption is None:
+            encryption = cups.getEncryption ()
+
+        self.host = host
+        self.port = port
+        self.encryption = encryption
+        self._queue = queue.PriorityQueue ()
+        self._seq = 0
+        self._lock = threading.Lock ()
+        self._threads = []
+        for i in range (workers):
+            thread = _IPPWorkerThread (self)
+            thread.start ()
+            self._threads.append (thread)
+
+        debugprint ("+%s" % self)
+
+    def __del__ (self):
+        debug.debugprint ("-%s" % self)
+
+    def submit (self, request):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+
+        self._queue.put ((request.priority, seq, request))
+
+    def destroy (self):
+        debugprint ("DESTROY: %s" % self)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+
+        # Lowest priority, so queued work is done first.
+        for thread in self._threads:
+            self._queue.put ((PRIORITY_BULK + 1, seq, None))
+
+        self._threads = []
+
+_worker_pools = {}
+def get_worker_pool (host=None, port=None, encryption=None):
+    """
+    Return the shared worker pool for a server.
+    """
+    if host is None:
+        host = cups.getServer ()
+    if port is None:
+        port = cups.getPort ()
+    if encryption is None:
+        encryption = cups.getEncryption ()
+
+    key = (host, port, encryption)
+    try:
+        return _worker_pools[key]
+    except KeyError:
+        pool = IPPWorkerPool (host=host, port=port, encryption=encryption)
+        _worker_pools[key] = pool
+        return pool
+
+class PooledIPPConnection(_CupsMethodDispatch):
+    """
+    Like IPPConnection, but operations run on a shared pool of
+    worker threads so that several can be in progress at once.
+
+    Each IPP operation method takes optional reply_handler,
+    error_handler and auth_handler parameters, as well as priority
+    (one of PRIORITY_INTERACTIVE, PRIORITY_NORMAL and PRIORITY_BULK)
+    and user.  Operations are not guaranteed to complete in the
+    order they were made.
+
+    Calling destroy() cancels any operations not yet started and
+    discards the results of the rest.
+    """
+
+    def __init__ (self, reply_handler=None, error_handler=None,
+                  auth_handler=None, user=None, host=None, port=None,
+                  encryption=None, parent=None, priority=PRIORITY_NORMAL,
+                  pool=None):
+        debugprint ("New PooledIPPConnection")
+        if pool is None:
+            pool = get_worker_pool (host=host, port=port,
+                                    encryption=encryption)
+
+        if user is None:
+            user = cups.getUser ()
+
+        self._parent = parent
+        self._pool = pool
+        self._reply_handler = reply_handler
+        self._error_handler = error_handler
+        self._auth_handler = auth_handler
+        self._requests = set ()
+        self._awaiting_auth = []
+        self.user = user
+        self.priority = priority
+        debugprint ("+%s" % self)
+
+    def __del__ (self):
+        debug.debugprint ("-%s" % self)
+
+    def destroy (self):
+        debugprint ("DESTROY: %s" % self)
+        self._destroyed = True
+        self.cancel ()
+
+    def cancel (self):
+        """Cancel all outstanding operations."""
+        for request in list (self._requests):
+            request.cancel ()
+
+        self._awaiting_auth = []
+
+    def set_auth_info (self, password):
+        """Call this from your auth_handler function."""
+        if self._awaiting_auth:
+            self._awaiting_auth.pop (0).set_auth_info (password)
+
+    def _call_function (self, fn, *args, **kwds):
+        reply_handler = kwds.pop ("reply_handler", self._reply_handler)
+        error_handler = kwds.pop ("error_handler", self._error_handler)
+        auth_handler = kwds.pop ("auth_handler", self._auth_handler)
+        priority = kwds.pop ("priority", self.priority)
+        user = kwds.pop ("user", self.user)
+
+        def done (handler):
+            def wrapped (conn, arg):
+                self._requests.discard (request)
+                if handler:
+                    handler (conn, arg)
+
+            return wrapped
+
+        request = _IPPPoolRequest (self, fn, args, kwds, user, priority,
+                                   done (reply_handler), done (error_handler),
+                                   auth_handler)
+        self._requests.add (request)
+        self._pool.submit (request)
+        return request
+
 ######
 ###### An asynchronous libcups API with graphical authentication and
 ###### retrying.
@@ -35,6 +35,7 @@ import tempfile
 import xml.etree.ElementTree
 
 import asyncipp
+import cupshelpers
 from debug import *
 import debug
 
@@ -276,25 +277,20 @@ class PK1Connection:
             except Exception as e:
                 debugprint ("Exception assessing DevicesGet API: %s" % repr (e))
 
-        methodtype = type (self._conn.getPrinters)
-        bindings = []
-        for fname in dir (self._conn):
-            if fname.startswith ('_'):
-                continue
-            fn = getattr (self._conn, fname)
-            if type (fn) != methodtype:
-                continue
-            if not hasattr (self, fname):
-                setattr (self, fname, self._make_binding (fn))
-                bindings.append (fname)
-
-        self._bindings = bindings
+        self._destroyed = False
         debugprint ("+%s" % self)
 
     def __del__ (self):
         debug.debugprint ("-%s" % self)
 
-    def _make_binding (self, fn):
+    def __getattr__ (self, fname):
+        # IPP operations not implemented using PolicyKit are passed on
+        # to the IPP connection.
+        if (fname[0] == '_' or self.__dict__.get ('_destroyed', True) or
+            fname not in asyncipp.cups_methods ()):
+            raise AttributeError (fname)
+
+        fn = getattr (self._conn, fname)
         def binding (*args, **kwds):
             op = _PK1AsyncMethodCall (None, self, None, None,
                                       kwds.get ("reply_handler"),
@@ -306,10 +302,46 @@ class PK1Connection:
 
     def destroy (self):
         debugprint ("DESTROY: %s" % self)
+        self._destroyed = True
         self._conn.destroy ()
 
-        for binding in self._bindings:
-            delattr (self, binding)
+    def batch (self, operations, reply_handler=None, error_handler=None,
+               auth_handler=None):
+        """
+        Perform several independent operations one after another,
+        using PolicyKit where possible.  Results are reported as for
+        asyncipp.IPPConnection.batch.
+        """
+        operations = list (operations)
+        results = []
+
+        def next_operation ():
+            if len (results) == len (operations):
+                if [exc for (result, exc) in results if exc is not None]:
+                    if error_handler:
+                        error_handler (self, cupshelpers.BatchError (results))
+                elif reply_handler:
+                    reply_handler (self, [result for (result, exc) in results])
+                return
+
+            operation = operations[len (results)]
+            fname, args = operation[:2]
+            kwds = {}
+            if len (operation) > 2:
+                kwds = operation[2].copy ()
+
+            def reply (conn, result):
+                results.append ((result, None))
+                next_operation ()
+
+            def error (conn, exc):
+                results.append ((None, exc))
+                next_operation ()
+
+            getattr (self, fname) (*args, reply_handler=reply,
+                                   error_handler=error, **kwds)
+
+        next_operation ()
 
     def _coerce (self, typ, val):
         return typ (val)
@@ -21,6 +21,7 @@ import threading
 import config
 import cups
 import cupspk
+import functools
 import gi
 from gi.repository import GLib
 gi.require_version('Gdk', '3.0')
@@ -215,22 +216,24 @@ class Connection:
 
         self._user = self._use_user
         debugprint ("Connected as user %s" % self._user)
-        methodtype_lambda = type (self._connection.getPrinters)
-        methodtype_real = type (self._connection.addPrinter)
-        for fname in dir (self._connection):
-            if fname[0] == '_':
-                continue
-            fn = getattr (self._connection, fname)
-            if not type (fn) in [methodtype_lambda, methodtype_real]:
-                continue
-            setattr (self, fname, self._make_binding (fname, fn))
+
+    def __getattr__ (self, fname):
+        # Methods of the underlying connection are wrapped in the
+        # authentication loop when looked up.
+        if fname[0] == '_' or '_connection' not in self.__dict__:
+            raise AttributeError (fname)
+
+        fn = getattr (self._connection, fname)
+        if not callable (fn):
+            raise AttributeError (fname)
+
+        # Named after the wrapped method, e.g. for timedops.
+        return functools.update_wrapper (
+            functools.partial (self._authloop, fname, fn), fn)
 
     def _using_polkit (self):
         return isinstance (self._connection, cupspk.Connection)
 
-    def _make_binding (self, fname, fn):
-        return lambda *args, **kwds: self._authloop (fname, fn, *args, **kwds)
-
     def _authloop (self, fname, fn, *args, **kwds):
         self._passes = 0
         # remove signature if dbus is not being used and signature is provided
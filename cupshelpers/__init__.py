@@ -19,11 +19,12 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 __all__  = ['set_debugprint_fn',
-            'Device', 'Printer', 'activateNewPrinter',
+            'BatchError', 'Device', 'Printer', 'activateNewPrinter',
             'copyPPDOptions', 'getDevices', 'getPrinters',
             'missingPackagesAndExecutables', 'missingExecutables',
-            'parseDeviceID',
+            'parseDeviceID', 'runBatch',
             'setPPDPageSize',
+            'bulkadmin',
             'ppds',
             'openprinting']
 
@@ -45,6 +46,7 @@ def set_debugprint_fn (debugprint):
     _debugprint_fn = debugprint
 
 from .cupshelpers import				\
+    BatchError,					\
     Device,					\
     Printer,					\
     activateNewPrinter,				\
@@ -54,7 +56,9 @@ from .cupshelpers import				\
     missingPackagesAndExecutables,		\
     missingExecutables,                         \
     parseDeviceID,				\
+    runBatch,					\
     setPPDPageSize
 
+from . import bulkadmin
 from . import ppds
 from . import openprinting
@@ -0,0 +1,327 @@
+## system-config-printer
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Administer many queues at once.
+
+Select queues with a L{QueueSelector}, describe the changes with a
+list of L{Action} objects, and run them with L{BulkAdmin}:
+
+  admin = BulkAdmin (prompt=getpass.getpass)
+  queues = admin.select (QueueSelector (pattern="lab-.*"))
+  for result in admin.run (queues, [disable ("maintenance"), reject ()]):
+      print (result)
+"""
+
+import concurrent.futures
+import cups
+import re
+import threading
+from . import _debugprint
+from .cupshelpers import BatchError, runBatch
+
+class QueueSelector:
+    """
+    Choose queues by name, by regular expression, or by class
+    membership.  A queue is selected if it matches any of the given
+    criteria.  With no criteria at all, every queue is selected.
+    """
+
+    def __init__(self, names=None, pattern=None, classes=None):
+        """
+        @param names: queue names
+        @type names: list of strings
+        @param pattern: regular expression matched against the whole
+        queue name
+        @type pattern: string or compiled regular expression
+        @param classes: select the members of these classes
+        @type classes: list of strings
+        """
+        self.names = set (names or [])
+        if isinstance (pattern, str):
+            pattern = re.compile (pattern)
+        self.pattern = pattern
+        self.classes = set (classes or [])
+
+    def select(self, printers, classes):
+        """
+        Apply the criteria.
+
+        @param printers: queues, as returned by cups.Connection.getPrinters
+        @type printers: dict indexed by queue name
+        @param classes: classes, as returned by cups.Connection.getClasses
+        @type classes: dict indexed by class name
+        @returns: sorted list of selected queue names
+        """
+        if not (self.names or self.pattern or self.classes):
+            return sorted (printers.keys ())
+
+        members = set ()
+        for name in self.classes:
+            class_members = classes.get (name, [])
+            # Remote classes are reported by URI rather than by members.
+            if isinstance (class_members, list):
+                members.update (class_members)
+
+        selected = []
+        for name in printers.keys ():
+            if (name in self.names or name in members or
+                (self.pattern and self.pattern.fullmatch (name))):
+                selected.append (name)
+
+        selected.sort ()
+        return selected
+
+class Action:
+    """
+    A change to make to each selected queue: a cups.Connection method
+    called with the queue name followed by the given arguments.
+    """
+
+    def __init__(self, description, fname, args=(), kwds=None):
+        """
+        @param description: human-readable description
+        @type description: string
+        @param fname: cups.Connection method name
+        @type fname: string
+        @param args: positional arguments after the queue name
+        @type args: tuple
+        @param kwds: keyword arguments
+        @type kwds: dict
+        """
+        self.description = description
+        self.fname = fname
+        self.args = args
+        self.kwds = kwds or {}
+
+    def __repr__(self):
+        return "<cupshelpers.bulkadmin.Action %s>" % self.description
+
+    def operation(self, queue):
+        """
+        @param queue: queue name
+        @type queue: string
+        @returns: operation for L{cupshelpers.runBatch}
+        """
+        return (self.fname, (queue,) + tuple (self.args), self.kwds)
+
+def _reason(reason):
+    if reason:
+        return { 'reason': reason }
+    return None
+
+def enable():
+    return Action ("enable", "enablePrinter")
+
+def disable(reason=None):
+    return Action ("disable", "disablePrinter", kwds=_reason (reason))
+
+def accept():
+    return Action ("accept jobs", "acceptJobs")
+
+def reject(reason=None):
+    return Action ("reject jobs", "rejectJobs", kwds=_reason (reason))
+
+def share(on=True):
+    return Action ("share" if on else "unshare", "setPrinterShared", (on,))
+
+def setErrorPolicy(policy):
+    return Action ("error policy %s" % policy, "setPrinterErrorPolicy",
+                   (policy,))
+
+def setOptionDefault(name, value):
+    return Action ("%s=%s" % (name, value), "addPrinterOptionDefault",
+                   (name, value))
+
+def unsetOptionDefault(name):
+    return Action ("unset %s" % name, "deletePrinterOptionDefault", (name,))
+
+class QueueResult:
+    """
+    The outcome of running the actions for one queue.
+
+    @ivar queue: queue name
+    @ivar actions: the actions, in the order they were run
+    @ivar errors: (action, exception) for each action that failed
+    @ivar dry_run: whether the actions were only planned
+    """
+
+    def __init__(self, queue, actions, dry_run=False):
+        self.queue = queue
+        self.actions = actions
+        self.errors = []
+        self.dry_run = dry_run
+
+    def __repr__(self):
+        if self.dry_run:
+            state = "would run"
+        elif self.errors:
+            state = "failed"
+        else:
+            state = "done"
+
+        return "<cupshelpers.bulkadmin.QueueResult %s %s: %s>" % \
+            (self.queue, state,
+             ", ".join ([action.description for action in self.actions]))
+
+    def succeeded(self):
+        return not self.errors
+
+class BulkAdmin:
+    """
+    Run actions across many queues using a bounded number of
+    connections, authenticating only once.
+
+    Each worker thread keeps its own connection.  libcups keeps the
+    user name and password callback per thread, so every worker
+    installs the same callback, which prompts at most once and then
+    reuses the answer.
+    """
+
+    def __init__(self, host=None, port=None, encryption=None,
+                 user=None, prompt=None, workers=4):
+        """
+        @param host: CUPS server, or None for the current server
+        @type host: string
+        @param port: CUPS port, or None for the current port
+        @type port: int
+        @param encryption: encryption setting, or None for the current one
+        @param user: user name to authenticate as
+        @type user: string
+        @param prompt: called to ask for the password
+        @type prompt: fn (string) -> string, or None to never prompt
+        @param workers: maximum number of concurrent connections
+        @type workers: int
+        """
+        if host is None:
+            host = cups.getServer ()
+        if port is None:
+            port = cups.getPort ()
+        if encryption is None:
+            encryption = cups.getEncryption ()
+
+        self.host = host
+        self.port = port
+        self.encryption = encryption
+        self.user = user
+        self.prompt = prompt
+        self.workers = workers
+        self._password = None
+        self._password_lock = threading.Lock ()
+        self._local = threading.local ()
+
+    def _connect(self):
+        return cups.Connection (host=self.host, port=self.port,
+                                encryption=self.encryption)
+
+    def _password_cb(self, prompt):
+        # A second request for the same operation means the password
+        # was rejected; give up rather than asking again.
+        self._local.tries += 1
+        if self._local.tries > 1:
+            return ''
+
+        with self._password_lock:
+            if self._password is None:
+                password = None
+                if self.prompt:
+                    password = self.prompt (prompt)
+                self._password = password or ''
+
+            return self._password
+
+    def select(self, selector, connection=None):
+        """
+        Find the queues a selector chooses.
+
+        @param selector: queue selector
+        @type selector: L{QueueSelector}
+        @param connection: CUPS connection to use, or None to connect
+        @type connection: cups.Connection object
+        @returns: sorted list of queue names
+        """
+        if connection is None:
+            connection = self._connect ()
+
+        return selector.select (connection.getPrinters (),
+                                connection.getClasses ())
+
+    def _run_queue(self, queue, actions):
+        local = self._local
+        result = QueueResult (queue, actions)
+        if getattr (local, 'connection', None) is None:
+            if self.user:
+                cups.setUser (self.user)
+            cups.setPasswordCB (self._password_cb)
+            try:
+                local.connection = self._connect ()
+            except RuntimeError as e:
+                result.errors = [(action, e) for action in actions]
+                return result
+
+        local.tries = 0
+        try:
+            runBatch (local.connection,
+                      [action.operation (queue) for action in actions])
+        except BatchError as e:
+            for action, (value, exc) in zip (actions, e.results):
+                if exc is None:
+                    continue
+
+                result.errors.append ((action, exc))
+                if isinstance (exc, cups.HTTPError):
+                    # The connection is unusable; make a new one
+                    # next time.
+                    local.connection = None
+
+        _debugprint ("%s" % repr (result))
+        return result
+
+    def run(self, queues, actions, dry_run=False):
+        """
+        Run actions for each queue.  Actions for any one queue run in
+        order; different queues are handled concurrently.
+
+        Results are yielded as each queue finishes, so progress can be
+        reported as len(queues) is known in advance.  Closing the
+        generator early abandons queues that have not yet started.
+
+        @param queues: queue names, e.g. from L{select}
+        @type queues: list of strings
+        @param actions: actions to run for each queue
+        @type actions: list of L{Action}
+        @param dry_run: only report what would be done
+        @type dry_run: bool
+        @returns: generator of L{QueueResult}
+        """
+        actions = list (actions)
+        if dry_run:
+            for queue in queues:
+                yield QueueResult (queue, actions, dry_run=True)
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor (self.workers)
+        futures = [executor.submit (self._run_queue, queue, actions)
+                   for queue in queues]
+        try:
+            for future in concurrent.futures.as_completed (futures):
+                yield future.result ()
+        finally:
+            for future in futures:
+                future.cancel ()
+            executor.shutdown (wait=True)
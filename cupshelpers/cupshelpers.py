@@ -224,12 +224,16 @@ class Printer:
         @param value: option value
         @type value: option-specific
         """
+        self.connection.addPrinterOptionDefault(self.name, name,
+                                                self._optionValue (value))
+
+    def _optionValue(self, value):
         if isinstance (value, float):
             radixchar = locale.nl_langinfo (locale.RADIXCHAR)
             if radixchar != '.':
                 # Convert floats to strings, being careful with decimal points.
                 value = str (value).replace (radixchar, '.')
-        self.connection.addPrinterOptionDefault(self.name, name, value)
+        return value
 
     def unsetOption(self, name):
         """
@@ -240,6 +244,26 @@ class Printer:
         """
         self.connection.deletePrinterOptionDefault(self.name, name)
 
+    def setOptions(self, options, unset=None):
+        """
+        Set and unset several of a printer's options in one batch.
+
+        @param options: option values to set
+        @type options: dict indexed by option name
+        @param unset: names of options to unset first
+        @type unset: list of strings
+        @raise cups.IPPError: IPP error from the first failing operation
+        """
+        operations = []
+        for name in unset or []:
+            operations.append (("deletePrinterOptionDefault",
+                                (self.name, name)))
+        for name, value in options.items ():
+            operations.append (("addPrinterOptionDefault",
+                                (self.name, name, self._optionValue (value))))
+
+        runBatch (self.connection, operations, stop_on_error=True)
+
     def setEnabled(self, on, reason=None):
         """
         Set the printer's enabled state.
@@ -673,6 +697,62 @@ def getDevices(connection, **kw):
     op = _GetDevicesCall ()
     return op.call (connection, kw)
 
+class BatchError(Exception):
+    """
+    One or more operations in a batch failed.
+
+    @ivar results: (result, exception) for each operation, with
+    exception None for those that succeeded
+    @ivar errors: exceptions raised, in order
+    """
+    def __init__(self, results):
+        self.results = results
+        self.errors = [exc for (result, exc) in results if exc is not None]
+        Exception.__init__ (self, "%d of %d operations failed" %
+                            (len (self.errors), len (results)))
+
+def runBatch(connection, operations, stop_on_error=False):
+    """
+    Perform several independent operations back to back over one
+    connection.
+
+    @param connection: CUPS connection
+    @type connection: cups.Connection object
+    @param operations: operations, each a tuple of method name,
+    positional arguments and optionally keyword arguments
+    @type operations: list of (string, tuple[, dict])
+    @param stop_on_error: whether to raise the first exception
+    straight away instead of attempting the remaining operations
+    @type stop_on_error: bool
+    @returns: list of results, one per operation
+    @raise BatchError: if any operations failed and stop_on_error is False
+    """
+    results = []
+    failed = False
+    for operation in operations:
+        fname, args = operation[:2]
+        kwds = {}
+        if len (operation) > 2:
+            kwds = operation[2]
+
+        try:
+            result = getattr (connection, fname) (*args, **kwds)
+        except Exception as e:
+            if stop_on_error:
+                raise
+
+            _debugprint ("%s%s failed: %s" % (fname, args, repr (e)))
+            results.append ((None, e))
+            failed = True
+            continue
+
+        results.append ((result, None))
+
+    if failed:
+        raise BatchError (results)
+
+    return [result for (result, exc) in results]
+
 def activateNewPrinter(connection, name):
     """
     Set a new printer enabled, accepting jobs, and (if necessary) the
@@ -684,11 +764,14 @@ def activateNewPrinter(connection, name):
     @type name: string
     @raise cups.IPPError: IPP error
     """
-    connection.enablePrinter (name)
-    connection.acceptJobs (name)
+    (enabled, accepting, default) = runBatch (connection,
+                                              [("enablePrinter", (name,)),
+                                               ("acceptJobs", (name,)),
+                                               ("getDefault", ())],
+                                              stop_on_error=True)
 
     # Set as the default if there is not already a default printer.
-    if connection.getDefault () is None:
+    if default is None:
         connection.setDefault (name)
 
 def copyPPDOptions(ppd1, ppd2):
@@ -20,12 +20,50 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import requests, urllib.request, urllib.parse, urllib.error, platform, threading, tempfile, traceback
-import os, sys
+import concurrent.futures, gzip, hashlib, json, os, sys, time
 from xml.etree.ElementTree import XML
 from . import Device
 from . import _debugprint
-
-__all__ = ['OpenPrinting']
+from . import config
+from .cupshelpers import parseDeviceID
+from .ppds import normalize
+
+__all__ = ['OpenPrinting', 'Snapshot', 'createSnapshot',
+           'getDefaultSnapshot', 'loadSnapshot']
+
+# Maximum number of simultaneous requests to the OpenPrinting server.
+MAX_CONCURRENT_REQUESTS = 4
+
+# Seconds for which query results are cached on disk.
+CACHE_TTL = 24 * 60 * 60
+
+# All queries share one session so that connections are kept alive
+# and reused.
+_session = None
+_session_lock = threading.Lock ()
+_request_slots = threading.BoundedSemaphore (MAX_CONCURRENT_REQUESTS)
+
+def _get_session ():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session ()
+            adapter = requests.adapters.HTTPAdapter (
+                pool_maxsize=MAX_CONCURRENT_REQUESTS)
+            _session.mount ("https://", adapter)
+            _session.mount ("http://", adapter)
+
+        return _session
+
+# A snapshot here is used instead of querying the OpenPrinting
+# server where possible.  See createSnapshot.
+DEFAULT_SNAPSHOT = os.path.join (config.sysconfdir, "cupshelpers",
+                                 "openprinting-snapshot.json.gz")
+
+def _default_cache_dir ():
+    cache_home = (os.environ.get ("XDG_CACHE_HOME") or
+                  os.path.expanduser ("~/.cache"))
+    return os.path.join (cache_home, "system-config-printer", "openprinting")
 
 def _normalize_space (text):
     result = text.strip ()
@@ -53,39 +91,346 @@ class _QueryThread (threading.Thread):
 
     def run (self):
 
-        # CGI script to be executed
-        query_command = "/query.cgi"
-        # Headers for the post request
-        headers = {"Content-type": "application/x-www-form-urlencoded",
-                   "Accept": "text/plain"}
-        params = ("%s&uilanguage=%s&locale=%s" %
-                  (urllib.parse.urlencode (self.parameters),
-                   self.parent.language[0],
-                   self.parent.language[0]))
-        self.url = "https://%s%s?%s" % (self.parent.base_url, query_command, params)
+        self.url = self.parent._queryURL (self.parameters)
         # Send request
-        result = None
         self.result = b''
         status = 1
         try:
-            req = requests.get(self.url, verify=True)
-            self.result = req.content
+            self.result = self.parent._fetch (self.url)
             status = 0
         except:
             self.result = sys.exc_info ()
-            if status is None:
-                status = 0
 
         _debugprint ("%s: query complete" % self)
         if self.callback is not None:
             self.callback (status, self.user_data, self.result)
 
+class _SnapshotReply (threading.Thread):
+    """
+    Deliver an answer from a snapshot the same way a query's result
+    is delivered: from another thread, unless cancelled.
+    """
+    def __init__ (self, answer, callback, user_data=None):
+        threading.Thread.__init__ (self)
+        self.answer = answer
+        self.callback = callback
+        self.user_data = user_data
+        self.daemon = True
+
+    def run (self):
+        try:
+            result = self.answer ()
+            status = 0
+        except:
+            result = sys.exc_info ()
+            status = 1
+
+        callback = self.callback
+        if callback is not None:
+            callback (status, self.user_data, result)
+
+# Extra driver query options that can be applied to snapshot answers.
+SNAPSHOT_OPTIONS = ['onlyppdfiles', 'onlydownload', 'packagesystem']
+
+def _filterDrivers (drivers, extra_options):
+    """
+    Do for parsed drivers what the server does for these options.
+
+    @type drivers: dict
+    @param drivers: drivers, as passed to the listDrivers callback
+    @type extra_options: dict
+    @param extra_options: listDrivers extra options; those not in
+    L{SNAPSHOT_OPTIONS} are ignored
+    @return: dict of the drivers that are left
+    """
+    packagesystem = extra_options.get ('packagesystem')
+    if packagesystem:
+        for driver in drivers.values ():
+            packages = {}
+            for arch, rpms in driver.get ('packages', {}).items ():
+                rpms = { file: rpm for file, rpm in rpms.items ()
+                         if rpm.get ('pkgsys') in (None, packagesystem) }
+                if rpms:
+                    packages[arch] = rpms
+
+            if packages:
+                driver['packages'] = packages
+            else:
+                driver.pop ('packages', None)
+
+    if extra_options.get ('onlyppdfiles') == '1':
+        drivers = { id: driver for id, driver in drivers.items ()
+                    if driver.get ('ppds') }
+    elif extra_options.get ('onlydownload') == '1':
+        drivers = { id: driver for id, driver in drivers.items ()
+                    if driver.get ('ppds') or driver.get ('packages') }
+
+    return drivers
+
+def _parsePrinters (result):
+    """
+    Parse the result of a printer search.
+
+    @return: dict of foomatic_id: (make, model)
+    """
+    printers = {}
+    root = XML (result)
+    for printer in root.findall ("printer"):
+        id = printer.find ("id")
+        make = printer.find ("make")
+        model = printer.find ("model")
+        if id is not None and make is not None and model is not None:
+            idtxt = id.text
+            maketxt = make.text
+            modeltxt = model.text
+            if idtxt and maketxt and modeltxt:
+                printers[idtxt] = (maketxt, modeltxt)
+
+    return printers
+
+def _architecture ():
+    architecture = platform.machine()
+
+    # On Intel, we could be running a 32bit user space with a 64bit kernel, in
+    # which case platform.machine() will return x86_64, leading to downloading
+    # the wrong printer driver, so we make sure we ask for i386 in that case.
+    if architecture == 'x86_64' and platform.architecture()[0] == '32bit':
+        architecture = 'i386'
+
+    return architecture
+
+class Snapshot:
+    """
+    A local copy of OpenPrinting query results, indexed for fast
+    lookups by make and model.
+
+    The snapshot holds the printer list, the raw driver query result
+    for each printer, and the text of each license link.  Driver
+    queries are captured without the onlyfree restriction or any
+    extra options, so that those can be applied locally.  See
+    L{SNAPSHOT_OPTIONS}.
+    """
+
+    FORMAT = 1
+
+    def __init__ (self, printers=None, drivers=None, licenses=None,
+                  architecture=None, created=None):
+        """
+        @type printers: dict
+        @param printers: foomatic_id: (make, model)
+        @type drivers: dict
+        @param drivers: foomatic_id: driver query result (XML string)
+        @type licenses: dict
+        @param licenses: license URL: license text
+        @type architecture: string
+        @param architecture: architecture driver packages are for
+        @type created: float
+        @param created: time the snapshot was taken
+        """
+        self.printers = printers or {}
+        self.drivers = drivers or {}
+        self.licenses = licenses or {}
+        self.architecture = architecture or _architecture ()
+        self.created = created or time.time ()
+
+        # Index by normalized make and model, and by each word of it.
+        self._by_makemodel = {}
+        self._by_word = {}
+        for id, (make, model) in self.printers.items ():
+            key = normalize ("%s %s" % (make, model))
+            self._by_makemodel.setdefault (key, []).append (id)
+            for word in set (key.split ()):
+                self._by_word.setdefault (word, set ()).add (id)
+
+    def save (self, filename):
+        """
+        Write the snapshot as compressed JSON.
+        """
+        data = { 'format': self.FORMAT,
+                 'created': self.created,
+                 'architecture': self.architecture,
+                 'printers': self.printers,
+                 'drivers': self.drivers,
+                 'licenses': self.licenses }
+        dirname = os.path.dirname (os.path.abspath (filename))
+        (fd, tmpname) = tempfile.mkstemp (dir=dirname)
+        try:
+            with os.fdopen (fd, "wb") as raw:
+                with gzip.open (raw, "wt", encoding="utf-8") as f:
+                    json.dump (data, f)
+
+            os.replace (tmpname, filename)
+        except:
+            os.unlink (tmpname)
+            raise
+
+    def _lookup (self, key):
+        ids = self._by_makemodel.get (key)
+        if ids:
+            return set (ids)
+
+        words = key.split ()
+        if not words:
+            return set ()
+
+        # Every word must match; start with the rarest.
+        sets = [self._by_word.get (word, set ()) for word in words]
+        sets.sort (key=len)
+        return sets[0].intersection (*sets[1:])
+
+    def searchPrinters (self, searchterm):
+        """
+        Find printers matching a search term or IEEE 1284 Device ID.
+
+        @type searchterm: string
+        @param searchterm: search term
+        @return: dict of foomatic_id: displayname
+        """
+        ids = None
+        if searchterm.find ("MFG:") != -1 or \
+           searchterm.find ("MANUFACTURER:") != -1:
+            id_dict = parseDeviceID (searchterm)
+            if id_dict["MFG"] and id_dict["MDL"]:
+                ids = self._lookup (normalize ("%s %s" % (id_dict["MFG"],
+                                                          id_dict["MDL"])))
+                if not ids:
+                    # The manufacturer name may be spelt differently,
+                    # e.g. Hewlett-Packard for HP.
+                    ids = self._lookup (normalize (id_dict["MDL"]))
+
+        if ids is None:
+            ids = self._lookup (normalize (searchterm))
+
+        printers = {}
+        for id in ids:
+            (make, model) = self.printers[id]
+            printers[id] = make + " " + model
+
+        return printers
+
+def loadSnapshot (filename):
+    """
+    Read a snapshot written by L{Snapshot.save}.
+
+    @return: L{Snapshot}
+    @raise ValueError: unknown snapshot format
+    """
+    with gzip.open (filename, "rt", encoding="utf-8") as f:
+        data = json.load (f)
+
+    if data.get ('format') != Snapshot.FORMAT:
+        raise ValueError ("Unknown snapshot format %s" %
+                          repr (data.get ('format')))
+
+    printers = { id: tuple (makemodel)
+                 for id, makemodel in data['printers'].items () }
+    return Snapshot (printers=printers,
+                     drivers=data['drivers'],
+                     licenses=data['licenses'],
+                     architecture=data['architecture'],
+                     created=data['created'])
+
+_default_snapshot = None
+_default_snapshot_mtime = None
+_default_snapshot_lock = threading.Lock ()
+
+def getDefaultSnapshot ():
+    """
+    Load the system-wide snapshot, if there is one.  It is only
+    re-read when the file changes.
+
+    @return: L{Snapshot}, or None
+    """
+    global _default_snapshot, _default_snapshot_mtime
+    with _default_snapshot_lock:
+        try:
+            mtime = os.stat (DEFAULT_SNAPSHOT).st_mtime
+        except OSError:
+            _default_snapshot = _default_snapshot_mtime = None
+            return None
+
+        if mtime != _default_snapshot_mtime:
+            try:
+                _default_snapshot = loadSnapshot (DEFAULT_SNAPSHOT)
+            except (OSError, ValueError, KeyError) as e:
+                _debugprint ("Cannot load %s: %s" % (DEFAULT_SNAPSHOT, e))
+                _default_snapshot = None
+
+            _default_snapshot_mtime = mtime
+
+        return _default_snapshot
+
+def createSnapshot (filename, searchterms, op=None, progress=None):
+    """
+    Query OpenPrinting and save the results as a snapshot.
+
+    @type filename: string
+    @param filename: file to write
+    @type searchterms: string list
+    @param searchterms: printer searches to run, e.g. manufacturer names
+    @type op: L{OpenPrinting}
+    @param op: object to query with, or None for a new one; its
+    onlyfree restriction is turned off
+    @type progress: function
+    @param progress: called with (done, total) as driver queries finish
+    @return: L{Snapshot}
+    """
+    if op is None:
+        op = OpenPrinting (cache_ttl=0)
+
+    op.onlyfree = 0
+    printers = {}
+    for searchterm in searchterms:
+        result = op._fetch (op._queryURL (op._searchParameters (searchterm)))
+        printers.update (_parsePrinters (result))
+
+    def fetch_drivers (id):
+        return op._fetch (op._queryURL (op._driverParameters (id)))
+
+    drivers = {}
+    license_urls = set ()
+    ids = sorted (printers.keys ())
+    with concurrent.futures.ThreadPoolExecutor (
+            MAX_CONCURRENT_REQUESTS) as executor:
+        for id, result in zip (ids, executor.map (fetch_drivers, ids)):
+            result = result.decode ('UTF-8', errors='replace')
+            drivers[id] = result
+            root = XML (result.encode ('UTF-8'))
+            for driver in root.findall ('driver'):
+                if driver.find ('licensetext') is None:
+                    element = driver.find ('licenselink')
+                    if element is not None and element.text:
+                        license_urls.add (element.text)
+
+            if progress:
+                progress (len (drivers), len (ids))
+
+    licenses = op._fetchLicenses (license_urls)
+    snapshot = Snapshot (printers=printers, drivers=drivers,
+                         licenses=licenses)
+    snapshot.save (filename)
+    return snapshot
+
 class OpenPrinting:
-    def __init__(self, language=None):
+    def __init__(self, language=None, cache_dir=None, cache_ttl=CACHE_TTL,
+                 snapshot=None, network_fallback=False):
         """
         @param language: language, as given by the first element of
         locale.setlocale().
         @type language: string
+        @param cache_dir: directory for cached query results, or None
+        for the default
+        @type cache_dir: string
+        @param cache_ttl: seconds to keep cached results, or 0 to
+        disable caching
+        @type cache_ttl: int
+        @param snapshot: answer queries from this snapshot instead of
+        the network; it is ignored if it was taken for a different
+        architecture
+        @type snapshot: L{Snapshot}
+        @param network_fallback: with a snapshot, query the network
+        for anything the snapshot does not have
+        @type network_fallback: bool
         """
         if language is None:
             import locale
@@ -95,7 +440,21 @@ class OpenPrinting:
                 language = 'C'
         self.language = language
 
+        if cache_dir is None:
+            cache_dir = _default_cache_dir ()
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        if (snapshot is not None and
+            snapshot.architecture != _architecture ()):
+            _debugprint ("Ignoring snapshot for architecture %s" %
+                         snapshot.architecture)
+            snapshot = None
+
+        self.snapshot = snapshot
+        self.network_fallback = network_fallback
+
         # XXX Read configuration file.
+        self.scheme = "https"
         self.base_url = "www.openprinting.org"
 
         # Restrictions on driver choices XXX Parameters to be taken from
@@ -108,6 +467,267 @@ class OpenPrinting:
     def __del__ (self):
         _debugprint ("-%s" % self)
 
+    def _queryURL(self, parameters):
+        # CGI script to be executed
+        query_command = "/query.cgi"
+        params = ("%s&uilanguage=%s&locale=%s" %
+                  (urllib.parse.urlencode (parameters),
+                   self.language[0],
+                   self.language[0]))
+        return "%s://%s%s?%s" % (self.scheme, self.base_url,
+                                 query_command, params)
+
+    def _cache_file(self, url):
+        if not self.cache_ttl:
+            return None
+
+        key = hashlib.sha1 (url.encode ('utf-8')).hexdigest ()
+        return os.path.join (self.cache_dir, key)
+
+    def _fetch(self, url):
+        """
+        Fetch a URL, using the on-disk cache if it has a fresh copy.
+
+        @type url: string
+        @param url: URL to fetch
+        @return: response body as bytes
+        @raise requests.RequestException: request failed
+        """
+        cache_file = self._cache_file (url)
+        if cache_file is not None:
+            try:
+                age = time.time () - os.stat (cache_file).st_mtime
+                if age < self.cache_ttl:
+                    with open (cache_file, "rb") as f:
+                        content = f.read ()
+                    _debugprint ("%s: cached result" % url)
+                    return content
+            except OSError:
+                pass
+
+        with _request_slots:
+            req = _get_session ().get (url, verify=True)
+        req.raise_for_status ()
+        content = req.content
+
+        if cache_file is not None:
+            tmpname = None
+            try:
+                os.makedirs (self.cache_dir, exist_ok=True)
+                (fd, tmpname) = tempfile.mkstemp (dir=self.cache_dir)
+                with os.fdopen (fd, "wb") as f:
+                    f.write (content)
+                os.replace (tmpname, cache_file)
+            except OSError as e:
+                _debugprint ("Cannot cache %s: %s" % (url, e))
+                if tmpname is not None and os.path.exists (tmpname):
+                    os.unlink (tmpname)
+
+        return content
+
+    def _fetchLicenses(self, urls):
+        """
+        Fetch license texts, several at a time.
+
+        @type urls: list of strings
+        @param urls: license URLs
+        @return: dict of URL: license text, for those retrieved
+        """
+        def fetch (url):
+            try:
+                return self._fetch (url).decode ("utf-8")
+            except:
+                _debugprint ('Cannot retrieve %s' % url)
+                return None
+
+        urls = set (urls)
+        texts = {}
+        if self.snapshot is not None:
+            for url in urls:
+                if url in self.snapshot.licenses:
+                    texts[url] = self.snapshot.licenses[url]
+
+            if not self.network_fallback:
+                return texts
+
+        urls = list (urls.difference (texts.keys ()))
+        if not urls:
+            return texts
+
+        with concurrent.futures.ThreadPoolExecutor (
+                MAX_CONCURRENT_REQUESTS) as executor:
+            for url, text in zip (urls, executor.map (fetch, urls)):
+                if text is not None:
+                    texts[url] = text
+
+        return texts
+
+    def _parseDrivers(self, result):
+        """
+        Parse the result of a driver query.
+
+        @type result: bytes
+        @param result: XML query result
+        @return: dict of drivers, as passed to the listDrivers callback
+        """
+        # filter out invalid UTF-8 to avoid breaking the XML parser
+        result = result.decode('UTF-8', errors='replace').encode('UTF-8')
+        root = XML (result)
+        drivers = {}
+        license_urls = {}
+        # We store the drivers as a dict of:
+        # foomatic_id:
+        #   { 'name': name,
+        #     'url': url,
+        #     'supplier': supplier,
+        #     'license': short license string e.g. GPLv2,
+        #     'licensetext': license text (Plain text),
+        #     'nonfreesoftware': Boolean,
+        #     'thirdpartysupplied': Boolean,
+        #     'manufacturersupplied': Boolean,
+        #     'patents': Boolean,
+        #     'supportcontacts' (optional):
+        #       list of { 'name',
+        #                 'url',
+        #                 'level',
+        #               }
+        #     'shortdescription': short description,
+        #     'recommended': Boolean,
+        #     'functionality':
+        #       { 'text': integer percentage,
+        #         'lineart': integer percentage,
+        #         'graphics': integer percentage,
+        #         'photo': integer percentage,
+        #         'speed': integer percentage,
+        #       }
+        #     'packages' (optional):
+        #       { arch:
+        #         { file:
+        #           { 'url': url,
+        #             'fingerprint': signature key fingerprint URL
+        #             'realversion': upstream version string,
+        #             'version': packaged version string,
+        #             'release': package release string
+        #           }
+        #         }
+        #       }
+        #     'ppds' (optional):
+        #       URL string list
+        #   }
+        # There is more information in the raw XML, but this
+        # can be added to the Python structure as needed.
+
+        for driver in root.findall ('driver'):
+            id = driver.attrib.get ('id')
+            if id is None:
+                continue
+
+            dict = {}
+            for attribute in ['name', 'url', 'supplier', 'license',
+                              'shortdescription' ]:
+                element = driver.find (attribute)
+                if element is not None and element.text is not None:
+                    dict[attribute] = _normalize_space (element.text)
+
+            element = driver.find ('licensetext')
+            if element is not None and element.text is not None:
+                dict['licensetext'] = element.text
+            if not 'licensetext' in dict or \
+               dict['licensetext'] is None:
+                element = driver.find ('licenselink')
+                if element is not None:
+                    license_url = element.text
+                    if license_url is not None:
+                        # Fetched below, once all drivers are
+                        # known.
+                        license_urls[id] = license_url
+
+            for boolean in ['nonfreesoftware', 'recommended',
+                            'patents', 'thirdpartysupplied',
+                            'manufacturersupplied']:
+                dict[boolean] = driver.find (boolean) is not None
+
+            # Make a 'freesoftware' tag for compatibility with
+            # how the OpenPrinting API used to work (see trac
+            # #74).
+            dict['freesoftware'] = not dict['nonfreesoftware']
+
+            supportcontacts = []
+            container = driver.find ('supportcontacts')
+            if container is not None:
+                for sc in container.findall ('supportcontact'):
+                    supportcontact = {}
+                    if sc.text is not None:
+                        supportcontact['name'] = \
+                            _normalize_space (sc.text)
+                    else:
+                        supportcontact['name'] = ""
+                    supportcontact['url'] = sc.attrib.get ('url')
+                    supportcontact['level'] = sc.attrib.get ('level')
+                    supportcontacts.append (supportcontact)
+
+            if supportcontacts:
+                dict['supportcontacts'] = supportcontacts
+
+            if 'name' not in dict or 'url' not in dict:
+                continue
+
+            container = driver.find ('functionality')
+            if container is not None:
+                functionality = {}
+                for attribute in ['text', 'lineart', 'graphics',
+                                  'photo', 'speed']:
+                    element = container.find (attribute)
+                    if element is not None:
+                        functionality[attribute] = element.text
+                if functionality:
+                    dict[container.tag] = functionality
+
+            packages = {}
+            container = driver.find ('packages')
+            if container is not None:
+                for arch in list(container):
+                    rpms = {}
+                    for package in arch.findall ('package'):
+                        rpm = {}
+                        for attribute in ['realversion','version',
+                                          'release', 'url', 'pkgsys',
+                                          'fingerprint']:
+                            element = package.find (attribute)
+                            if element is not None:
+                                rpm[attribute] = element.text
+
+                        repositories = package.find ('repositories')
+                        if repositories is not None:
+                            for pkgsys in list(repositories):
+                                rpm.setdefault('repositories', {})[pkgsys.tag] = pkgsys.text
+
+                        rpms[package.attrib['file']] = rpm
+                    packages[arch.tag] = rpms
+
+            if packages:
+                dict['packages'] = packages
+
+            ppds = []
+            container = driver.find ('ppds')
+            if container is not None:
+                for each in list(container):
+                    ppds.append (each.text)
+
+            if ppds:
+                dict['ppds'] = ppds
+
+            drivers[id] = dict
+
+        license_urls = { id: url for id, url in license_urls.items ()
+                         if id in drivers }
+        texts = self._fetchLicenses (license_urls.values ())
+        for id, url in license_urls.items ():
+            if url in texts:
+                drivers[id]['licensetext'] = texts[url]
+
+        return drivers
+
     def cancelOperation(self, handle):
         """
         Cancel an operation.
@@ -156,22 +776,12 @@ class OpenPrinting:
                 return
 
             status = 0
-            printers = {}
             try:
-                root = XML (result)
                 # We store the printers as a dict of:
                 # foomatic_id: displayname
-
-                for printer in root.findall ("printer"):
-                    id = printer.find ("id")
-                    make = printer.find ("make")
-                    model = printer.find ("model")
-                    if id is not None and make is not None and model is not None:
-                        idtxt = id.text
-                        maketxt = make.text
-                        modeltxt = model.text
-                        if idtxt and maketxt and modeltxt:
-                            printers[idtxt] = maketxt + " " + modeltxt
+                printers = { id: make + " " + model
+                             for id, (make, model)
+                             in _parsePrinters (result).items () }
             except:
                 status = 1
                 printers = sys.exc_info ()
@@ -189,13 +799,26 @@ class OpenPrinting:
                     print (line.strip ())
                 print (extxt[0].strip ())
 
-        # Common parameters for the request
-        params = { 'type': 'printers',
-                   'printer': searchterm,
-                   'format': 'xml' }
+        if self.snapshot is not None:
+            printers = self.snapshot.searchPrinters (searchterm)
+            if printers or not self.network_fallback:
+                _debugprint ("searchPrinters: %d entries from snapshot" %
+                             len (printers))
+                handle = _SnapshotReply (lambda: printers, callback,
+                                         user_data)
+                handle.start ()
+                return handle
+
+        params = self._searchParameters (searchterm)
         _debugprint ("searchPrinters: Querying OpenPrinting: %s" % repr(params))
         return self.webQuery(params, parse_result, (callback, user_data))
 
+    def _searchParameters(self, searchterm):
+        # Common parameters for the request
+        return { 'type': 'printers',
+                 'printer': searchterm,
+                 'format': 'xml' }
+
     def listDrivers(self, model, callback, user_data=None, extra_options=None):
         """
         Obtain a list of printer drivers.
@@ -217,160 +840,11 @@ class OpenPrinting:
             (callback, user_data) = data
             if status != 0:
                 callback (status, user_data, result)
+                return
 
             try:
-                # filter out invalid UTF-8 to avoid breaking the XML parser
-                result = result.decode('UTF-8', errors='replace').encode('UTF-8')
-                root = XML (result)
-                drivers = {}
-                # We store the drivers as a dict of:
-                # foomatic_id:
-                #   { 'name': name,
-                #     'url': url,
-                #     'supplier': supplier,
-                #     'license': short license string e.g. GPLv2,
-                #     'licensetext': license text (Plain text),
-                #     'nonfreesoftware': Boolean,
-                #     'thirdpartysupplied': Boolean,
-                #     'manufacturersupplied': Boolean,
-                #     'patents': Boolean,
-                #     'supportcontacts' (optional):
-                #       list of { 'name',
-                #                 'url',
-                #                 'level',
-                #               }
-                #     'shortdescription': short description,
-                #     'recommended': Boolean,
-                #     'functionality':
-                #       { 'text': integer percentage,
-                #         'lineart': integer percentage,
-                #         'graphics': integer percentage,
-                #         'photo': integer percentage,
-                #         'speed': integer percentage,
-                #       }
-                #     'packages' (optional):
-                #       { arch:
-                #         { file:
-                #           { 'url': url,
-                #             'fingerprint': signature key fingerprint URL
-                #             'realversion': upstream version string,
-                #             'version': packaged version string,
-                #             'release': package release string
-                #           }
-                #         }
-                #       }
-                #     'ppds' (optional):
-                #       URL string list
-                #   }
-                # There is more information in the raw XML, but this
-                # can be added to the Python structure as needed.
-
-                for driver in root.findall ('driver'):
-                    id = driver.attrib.get ('id')
-                    if id is None:
-                        continue
-
-                    dict = {}
-                    for attribute in ['name', 'url', 'supplier', 'license',
-                                      'shortdescription' ]:
-                        element = driver.find (attribute)
-                        if element is not None and element.text is not None:
-                            dict[attribute] = _normalize_space (element.text)
-
-                    element = driver.find ('licensetext')
-                    if element is not None and element.text is not None:
-                        dict['licensetext'] = element.text
-                    if not 'licensetext' in dict or \
-                       dict['licensetext'] is None:
-                        element = driver.find ('licenselink')
-                        if element is not None:
-                            license_url = element.text
-                            if license_url is not None:
-                                try:
-                                    req = requests.get(license_url, verify=True)
-                                    dict['licensetext'] = \
-                                        req.content.decode("utf-8")
-                                except:
-                                    _debugprint('Cannot retrieve %s' %
-                                                license_url)
-
-                    for boolean in ['nonfreesoftware', 'recommended',
-                                    'patents', 'thirdpartysupplied',
-                                    'manufacturersupplied']:
-                        dict[boolean] = driver.find (boolean) is not None
-
-                    # Make a 'freesoftware' tag for compatibility with
-                    # how the OpenPrinting API used to work (see trac
-                    # #74).
-                    dict['freesoftware'] = not dict['nonfreesoftware']
-
-                    supportcontacts = []
-                    container = driver.find ('supportcontacts')
-                    if container is not None:
-                        for sc in container.findall ('supportcontact'):
-                            supportcontact = {}
-                            if sc.text is not None:
-                                supportcontact['name'] = \
-                                    _normalize_space (sc.text)
-                            else:
-                                supportcontact['name'] = ""
-                            supportcontact['url'] = sc.attrib.get ('url')
-                            supportcontact['level'] = sc.attrib.get ('level')
-                            supportcontacts.append (supportcontact)
-
-                    if supportcontacts:
-                        dict['supportcontacts'] = supportcontacts
-
-                    if 'name' not in dict or 'url' not in dict:
-                        continue
-
-                    container = driver.find ('functionality')
-                    if container is not None:
-                        functionality = {}
-                        for attribute in ['text', 'lineart', 'graphics',
-                                          'photo', 'speed']:
-                            element = container.find (attribute)
-                            if element is not None:
-                                functionality[attribute] = element.text
-                        if functionality:
-                            dict[container.tag] = functionality
-
-                    packages = {}
-                    container = driver.find ('packages')
-                    if container is not None:
-                        for arch in list(container):
-                            rpms = {}
-                            for package in arch.findall ('package'):
-                                rpm = {}
-                                for attribute in ['realversion','version',
-                                                  'release', 'url', 'pkgsys',
-                                                  'fingerprint']:
-                                    element = package.find (attribute)
-                                    if element is not None:
-                                        rpm[attribute] = element.text
-
-                                repositories = package.find ('repositories')
-                                if repositories is not None:
-                                    for pkgsys in list(repositories):
-                                        rpm.setdefault('repositories', {})[pkgsys.tag] = pkgsys.text
-
-                                rpms[package.attrib['file']] = rpm
-                            packages[arch.tag] = rpms
-
-                    if packages:
-                        dict['packages'] = packages
-
-                    ppds = []
-                    container = driver.find ('ppds')
-                    if container is not None:
-                        for each in list(container):
-                            ppds.append (each.text)
-
-                    if ppds:
-                        dict['ppds'] = ppds
-
-                    drivers[id] = dict
-                    _debugprint ("listDrivers/parse_result: OpenPrinting entries: %s" % repr(drivers))
+                drivers = self._parseDrivers (result)
+                _debugprint ("listDrivers/parse_result: OpenPrinting entries: %s" % repr(drivers))
                 callback (0, user_data, drivers)
             except:
                 callback (1, user_data, sys.exc_info ())
@@ -378,19 +852,35 @@ class OpenPrinting:
         if isinstance(model, Device):
             model = model.id
 
-        architecture = platform.machine()
-
-        # On Intel, we could be running a 32bit user space with a 64bit kernel, in
-        # which case platform.machine() will return x86_64, leading to downloading
-        # the wrong printer driver, so we make sure we ask for i386 in that case.
-        if architecture == 'x86_64' and platform.architecture()[0] == '32bit':
-            architecture = 'i386'
+        if self.snapshot is not None:
+            # Only some options can be applied to the snapshot's
+            # answers; the network is only asked about others if
+            # falling back to it is allowed.
+            unknown = set (extra_options or {}).difference (SNAPSHOT_OPTIONS)
+            result = self.snapshot.drivers.get (model)
+            if ((result is not None and not unknown) or
+                not self.network_fallback):
+                _debugprint ("listDrivers: answering from snapshot")
+                if unknown:
+                    _debugprint ("listDrivers: ignoring options %s" %
+                                 repr (sorted (unknown)))
+
+                handle = _SnapshotReply (
+                    lambda: self._snapshotDrivers (model, extra_options),
+                    callback, user_data)
+                handle.start ()
+                return handle
+
+        params = self._driverParameters (model, extra_options)
+        _debugprint ("listDrivers: Querying OpenPrinting: %s" % repr(params))
+        return self.webQuery(params, parse_result, (callback, user_data))
 
+    def _driverParameters(self, model, extra_options=None):
         params = { 'type': 'drivers',
                    'moreinfo': '1',
                    'showprinterid': '1',
                    'onlynewestdriverpackages': '1',
-                   'architectures': architecture,
+                   'architectures': _architecture (),
                    'noobsoletes': '1',
                    'onlyfree': str (self.onlyfree),
                    'onlymanufacturer': str (self.onlymanufacturer),
@@ -398,8 +888,23 @@ class OpenPrinting:
                    'format': 'xml'}
         if extra_options:
             params.update(extra_options)
-        _debugprint ("listDrivers: Querying OpenPrinting: %s" % repr(params))
-        return self.webQuery(params, parse_result, (callback, user_data))
+        return params
+
+    def _snapshotDrivers(self, model, extra_options=None):
+        result = self.snapshot.drivers.get (model)
+        if result is None:
+            return {}
+
+        drivers = self._parseDrivers (result.encode ('UTF-8'))
+        if self.onlyfree:
+            drivers = { id: driver for id, driver in drivers.items ()
+                        if driver['freesoftware'] }
+
+        if extra_options:
+            drivers = _filterDrivers (drivers, extra_options)
+
+        _debugprint ("listDrivers: %d entries from snapshot" % len (drivers))
+        return drivers
 
 def _simple_gui ():
     from gi.repository import Gdk
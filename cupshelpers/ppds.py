@@ -442,6 +442,15 @@ class PPDs:
         models_list.sort(key=functools.cmp_to_key(compare_models))
         return models_list
 
+    def buildIndexes (self):
+        """
+        Build the make/model and Device ID lookup tables now rather
+        than on first use.  Useful for long-running processes that
+        want the first lookup to be quick.
+        """
+        self._init_makes ()
+        self._init_ids ()
+
     def getInfoFromModel (self, make, model):
         """
 	Obtain a list of PPDs that are suitable for use with a
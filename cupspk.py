@@ -26,7 +26,9 @@
 # define fine-grained policy (more than one level of permission)
 # add missing methods
 
+import errno
 import os
+import shutil
 import sys
 
 import tempfile
@@ -45,6 +47,40 @@ CUPS_PK_IFACE = 'org.opensuse.CupsPkHelper.Mechanism'
 
 CUPS_PK_NEED_AUTH = 'org.opensuse.CupsPkHelper.Mechanism.NotPrivileged'
 
+# Buffer size for copying files to and from the mechanism, large
+# enough that error_log and cupsd.conf take only a few system calls.
+_COPY_BUFSIZE = 1024 * 1024
+
+def _copy_fd(in_fd, out_fd):
+    """
+    Copy the whole of in_fd, from its start, to out_fd's current
+    position, without passing the data through Python where the
+    kernel allows it.
+    """
+    offset = 0
+    try:
+        while True:
+            sent = os.sendfile (out_fd, in_fd, offset, _COPY_BUFSIZE)
+            if sent == 0:
+                return
+
+            offset += sent
+    except OSError as e:
+        if offset > 0 or e.errno not in (errno.EINVAL, errno.ENOSYS,
+                                         errno.ESPIPE):
+            raise
+
+    try:
+        os.lseek (in_fd, 0, os.SEEK_SET)
+    except OSError:
+        # Not seekable, e.g. a pipe: copy what is left.
+        pass
+
+    buf = os.read (in_fd, _COPY_BUFSIZE)
+    while buf:
+        written = os.write (out_fd, buf)
+        buf = buf[written:] or os.read (in_fd, _COPY_BUFSIZE)
+
 
 # we can't subclass cups.Connection, even when adding
 # Py_TPFLAGS_BASETYPE to cupsconnection.c
@@ -64,21 +100,14 @@ class Connection:
                                            port=port,
                                            encryption=encryption)
 
-        self._hack_subclass()
 
+    def __getattr__(self, fname):
+        # here's how to subclass without really subclassing: anything
+        # not provided here is looked up on the real connection
+        if fname[0] == '_' or '_connection' not in self.__dict__:
+            raise AttributeError(fname)
 
-    def _hack_subclass(self):
-        # here's how to subclass without really subclassing. Just provide
-        # the same methods
-        methodtype = type(self._connection.getPrinters)
-        for fname in dir(self._connection):
-            if fname[0] == '_':
-                continue
-            fn = getattr(self._connection, fname)
-            if type(fn) != methodtype:
-                continue
-            if not hasattr(self, fname):
-                setattr(self, fname, fn.__call__)
+        return getattr(self._connection, fname)
 
 
     def set_parent(self, parent):
@@ -385,36 +414,43 @@ class Connection:
                     filename = None
 
         if (not use_pycups) and (fd is not None or file_object is not None):
-            # Create the temporary file in /tmp to ensure that
-            # cups-pk-helper-mechanism is able to write to it.
+            # The mechanism only accepts file names, so it writes to a
+            # temporary file which is then copied in binary.  Create it
+            # in /tmp to ensure that cups-pk-helper-mechanism is able
+            # to write to it.
             (tmpfd, tmpfname) = tempfile.mkstemp(dir="/tmp")
             os.close (tmpfd)
 
-            pk_args = (resource, tmpfname)
-            self._call_with_pk_and_fallback(use_pycups,
-                                            'FileGet', pk_args,
-                                            self._connection.getFile,
-                                            *args, **kwds)
+            # If pycups is used instead, it writes to fd or file
+            # itself.
+            used_fallback = []
+            def fallback (*args, **kwds):
+                used_fallback.append (True)
+                return self._connection.getFile (*args, **kwds)
 
-            tmpfd = os.open (tmpfname, os.O_RDONLY)
-            tmpfile = os.fdopen (tmpfd, 'rt')
-            tmpfile.seek (0)
-
-            if fd is not None:
-                os.lseek (fd, 0, os.SEEK_SET)
-                line = tmpfile.readline()
-                while line != '':
-                    os.write (fd, line.encode('UTF-8'))
-                    line = tmpfile.readline()
-            else:
-                file_object.seek (0)
-                line = tmpfile.readline()
-                while line != '':
-                    file_object.write (line.encode('UTF-8'))
-                    line = tmpfile.readline()
-
-            tmpfile.close ()
-            os.remove (tmpfname)
+            pk_args = (resource, tmpfname)
+            try:
+                self._call_with_pk_and_fallback(use_pycups,
+                                                'FileGet', pk_args,
+                                                fallback,
+                                                *args, **kwds)
+
+                if not used_fallback:
+                    with open (tmpfname, 'rb') as tmpfile:
+                        if fd is not None:
+                            try:
+                                os.lseek (fd, 0, os.SEEK_SET)
+                            except OSError:
+                                # Not seekable, e.g. a pipe.
+                                pass
+
+                            _copy_fd (tmpfile.fileno (), fd)
+                        else:
+                            file_object.seek (0)
+                            shutil.copyfileobj (tmpfile, file_object,
+                                                _COPY_BUFSIZE)
+            finally:
+                os.remove (tmpfname)
         else:
             pk_args = (resource, filename)
 
@@ -425,6 +461,8 @@ class Connection:
 
 
     def putFile(self, *args, **kwds):
+        file_object = None
+        fd = None
         if len(args) == 2:
             (use_pycups, resource, filename) = self._args_to_tuple([str, str], *args)
         else:
@@ -442,32 +480,34 @@ class Connection:
                     filename = None
 
         if (not use_pycups) and (fd is not None or file_object is not None):
+            # The mechanism only accepts file names, so give it a
+            # binary copy of the data.
             (tmpfd, tmpfname) = tempfile.mkstemp()
-            os.lseek (tmpfd, 0, os.SEEK_SET)
-
-            if fd is not None:
-                os.lseek (fd, 0, os.SEEK_SET)
-                buf = os.read (fd, 512)
-                while buf != '' and buf != b'':
-                    os.write (tmpfd, buf)
-                    buf = os.read (fd, 512)
-            else:
-                file_object.seek (0)
-                line = file_object.readline ()
-                while line != '':
-                    os.write (tmpfd, line)
-                    line = file_object.readline ()
-
-            os.close (tmpfd)
-
-            pk_args = (resource, tmpfname)
-
-            self._call_with_pk_and_fallback(use_pycups,
-                                            'FilePut', pk_args,
-                                            self._connection.putFile,
-                                            *args, **kwds)
-
-            os.remove (tmpfname)
+            try:
+                if fd is not None:
+                    os.lseek (fd, 0, os.SEEK_SET)
+                    try:
+                        _copy_fd (fd, tmpfd)
+                    finally:
+                        os.close (tmpfd)
+
+                    # Leave fd ready to be read again by pycups.
+                    os.lseek (fd, 0, os.SEEK_SET)
+                else:
+                    file_object.seek (0)
+                    with os.fdopen (tmpfd, 'wb') as tmpfile:
+                        shutil.copyfileobj (file_object, tmpfile,
+                                            _COPY_BUFSIZE)
+                    file_object.seek (0)
+
+                pk_args = (resource, tmpfname)
+
+                self._call_with_pk_and_fallback(use_pycups,
+                                                'FilePut', pk_args,
+                                                self._connection.putFile,
+                                                *args, **kwds)
+            finally:
+                os.remove (tmpfname)
         else:
 
             pk_args = (resource, filename)
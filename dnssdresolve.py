@@ -19,31 +19,168 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import dbus, re
+import collections
+import time
 import urllib.parse
 from debug import *
 
+class AvahiResolverBackend:
+    """
+    Resolve DNS-SD services using the Avahi daemon over D-Bus.
+
+    The org.freedesktop.Avahi.Server object is fetched once and
+    reused for every request.  A different bus may be given, for
+    example a private bus running a stand-in Avahi service.
+    """
+    def __init__ (self, bus=None):
+        self._bus = bus
+        self._server = None
+
+    def _get_server (self):
+        if self._server is None:
+            bus = self._bus
+            if bus is None:
+                bus = dbus.SystemBus ()
+
+            obj = bus.get_object ("org.freedesktop.Avahi", "/")
+            self._server = dbus.Interface (obj,
+                                           "org.freedesktop.Avahi.Server")
+
+        return self._server
+
+    def resolve (self, name, stype, domain, reply_handler, error_handler):
+        """
+        Resolve a service, calling reply_handler (host, address)
+        or error_handler (exception).
+        """
+        def reply (interface, protocol, name, stype, domain,
+                   host, aprotocol, address, port, txt, flags):
+            reply_handler (host, address)
+
+        try:
+            server = self._get_server ()
+            server.ResolveService (-1, -1,
+                                   name, stype, domain,
+                                   -1, 0,
+                                   reply_handler=reply,
+                                   error_handler=error_handler)
+        except dbus.DBusException as e:
+            # Fetch the server object again next time, in case the
+            # daemon was restarted.
+            self._server = None
+            error_handler (e)
+
+class DNSSDServiceResolver:
+    """
+    Resolve DNS-SD services, keeping answers for ttl seconds and
+    running at most max_inflight requests at a time.  Requests for
+    a service already being resolved share the one answer.
+    """
+    def __init__ (self, backend=None, ttl=120, max_inflight=8):
+        if backend is None:
+            backend = AvahiResolverBackend ()
+
+        self._backend = backend
+        self.ttl = ttl
+        self.max_inflight = max_inflight
+        self._cache = {}
+        self._waiters = {}
+        self._queue = collections.deque ()
+        self._inflight = 0
+
+    def resolve (self, name, stype, domain, callback):
+        """
+        Resolve a service, calling callback (host, address).  Both
+        are None if the service could not be resolved.
+        """
+        key = (name, stype, domain)
+        cached = self._cache.get (key)
+        if cached is not None:
+            (expiry, host, address) = cached
+            if expiry > time.time ():
+                callback (host, address)
+                return
+
+            del self._cache[key]
+
+        if key in self._waiters:
+            self._waiters[key].append (callback)
+            return
+
+        self._waiters[key] = [callback]
+        self._queue.append (key)
+        self._start_queued ()
+
+    def flush (self):
+        self._cache = {}
+
+    def _start_queued (self):
+        while self._queue and self._inflight < self.max_inflight:
+            key = self._queue.popleft ()
+            (name, stype, domain) = key
+            self._inflight += 1
+            debugprint ("Resolving address for %s.%s.%s" % key)
+            self._backend.resolve (name, stype, domain,
+                                   reply_handler=lambda host, address, key=key:
+                                       self._reply (key, host, address),
+                                   error_handler=lambda e, key=key:
+                                       self._error (key, e))
+
+    def _reply (self, key, host, address):
+        self._cache[key] = (time.time () + self.ttl, host, address)
+        self._finished (key, host, address)
+
+    def _error (self, key, error):
+        debugprint ("Error resolving %s.%s.%s: %s" % (key + (repr (error),)))
+        self._finished (key, None, None)
+
+    def _finished (self, key, host, address):
+        self._inflight -= 1
+        callbacks = self._waiters.pop (key, [])
+        for callback in callbacks:
+            try:
+                callback (host, address)
+            except Exception:
+                nonfatalException ()
+
+        self._start_queued ()
+
+_resolver = None
+def get_resolver ():
+    """
+    Return the DNSSDServiceResolver shared by everything in this
+    process, creating it if necessary.
+    """
+    global _resolver
+    if _resolver is None:
+        _resolver = DNSSDServiceResolver ()
+
+    return _resolver
+
 class DNSSDHostNamesResolver:
-    def __init__ (self, devices):
+    def __init__ (self, devices, resolver=None):
         self._devices = devices
         self._unresolved = len (devices)
-        self._device_uri_by_name = {}
+        if resolver is None:
+            resolver = get_resolver ()
+
+        self._resolver = resolver
         debugprint ("+%s" % self)
 
     def __del__ (self):
         debugprint ("-%s" % self)
 
-    def resolve (self, reply_handler):
+    def resolve (self, reply_handler, partial_handler=None):
+        """
+        Resolve the host names of the dnssd:// devices.
 
+        partial_handler (uri, device), if given, is called as each
+        device is resolved (or fails to be).  reply_handler (devices)
+        is called once all of them are done.
+        """
         self._reply_handler = reply_handler
-
-        bus = dbus.SystemBus ()
-        if not bus:
-            reply_handler ([])
-            del self._devices
-            del self._reply_handler
-            return
-
-        for uri, device in self._devices.items ():
+        self._partial_handler = partial_handler
+        for uri, device in list (self._devices.items ()):
             if not uri.startswith ("dnssd://"):
                 self._unresolved -= 1
                 continue
@@ -54,40 +191,40 @@ class DNSSDHostNamesResolver:
             hostname = result.netloc
             elements = hostname.rsplit (".", 3)
             if len (elements) != 4:
-                self._resolved ()
+                self._resolved (uri)
                 continue
 
             name, stype, protocol, domain = elements
             name = urllib.parse.unquote (name)
             stype += "." + protocol #  e.g. _printer._tcp
 
-            try:
-                obj = bus.get_object ("org.freedesktop.Avahi", "/")
-                server = dbus.Interface (obj,
-                                         "org.freedesktop.Avahi.Server")
-                self._device_uri_by_name[(name, stype, domain)] = uri
-                debugprint ("Resolving address for %s" % hostname)
-                server.ResolveService (-1, -1,
-                                        name, stype, domain,
-                                        -1, 0,
-                                        reply_handler=self._reply,
-                                        error_handler=lambda e:
-                                            self._error (uri, e))
-            except dbus.DBusException as e:
-                debugprint ("Failed to resolve address: %s" % repr (e))
-                self._resolved ()
-
-    def _resolved (self):
+            self._resolver.resolve (name, stype, domain,
+                                    lambda host, address, uri=uri:
+                                        self._reply (uri, host, address))
+
+        if self._unresolved == 0 and hasattr (self, '_reply_handler'):
+            self._finish ()
+
+    def _resolved (self, uri):
+        if self._partial_handler:
+            self._partial_handler (uri, self._devices[uri])
+
         self._unresolved -= 1
         if self._unresolved == 0:
-            debugprint ("All addresses resolved")
-            self._reply_handler (self._devices)
-            del self._devices
-            del self._reply_handler
-
-    def _reply (self, interface, protocol, name, stype, domain,
-                host, aprotocol, address, port, txt, flags):
-        uri = self._device_uri_by_name[(name, stype, domain)]
+            self._finish ()
+
+    def _finish (self):
+        debugprint ("All addresses resolved")
+        self._reply_handler (self._devices)
+        del self._devices
+        del self._reply_handler
+        del self._partial_handler
+
+    def _reply (self, uri, host, address):
+        if host is None:
+            self._resolved (uri)
+            return
+
         self._devices[uri].address = address
         hostname = host
         p = hostname.find(".")
@@ -95,11 +232,7 @@ class DNSSDHostNamesResolver:
             hostname = hostname[:p]
         debugprint ("%s is at %s (%s)" % (uri, address, hostname))
         self._devices[uri].hostname = hostname
-        self._resolved ()
-
-    def _error (self, uri, error):
-        debugprint ("Error resolving %s: %s" % (uri, repr (error)))
-        self._resolved ()
+        self._resolved (uri)
 
 if __name__ == '__main__':
     class Device:
@@ -19,6 +19,7 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import asyncconn
+import asyncipp
 import authconn
 import cups
 import dbus
@@ -128,30 +129,111 @@ if USE_SECRET:
 
 
 class PrinterURIIndex:
-    def __init__ (self, names=None):
-        self.printer = {}
+    """
+    Map printer URIs to queue names and back.
+
+    The index is filled from a single CUPS-Get-Printers request the
+    first time it is needed, and afterwards kept up to date from
+    printer events.  Only URIs not covered by that are looked up
+    individually.  If the request fails it is not tried again for
+    POPULATE_RETRY seconds, or until the next printer event.
+    """
+
+    POPULATE_RETRY = 30
+
+    def __init__ (self, names=None, host=None, port=None, encryption=None):
+        self.printer = {} # URI -> printer name
+        self.uris = {} # printer name -> list of URIs
+        self.unknown = set () # URIs known not to be a printer
+        self.populated = False
+        self._populate_after = 0 # when to try again after a failure
         if names is None:
             names = []
 
         self.names = names
+        self.host = host
+        self.port = port
+        self.encryption = encryption
         self._collect_names ()
 
+    def _connect (self):
+        kwds = {}
+        if self.host is not None:
+            kwds['host'] = self.host
+        if self.port is not None:
+            kwds['port'] = self.port
+        if self.encryption is not None:
+            kwds['encryption'] = self.encryption
+
+        return cups.Connection (**kwds)
+
+    def _populate (self, connection=None):
+        if self.populated or time.time () < self._populate_after:
+            return
+
+        try:
+            if connection is None:
+                connection = self._connect ()
+
+            printers = connection.getPrinters ()
+        except (RuntimeError, cups.IPPError):
+            debugprint ("PrinterURIIndex: getPrinters failed")
+            self._populate_after = time.time () + self.POPULATE_RETRY
+            return
+
+        for name, attrs in printers.items ():
+            self.update_from_attrs (name, attrs)
+
+        self.populated = True
+        self.unknown.clear ()
+
     def _collect_names (self, connection=None):
         if not self.names:
             return
 
         if not connection:
             try:
-                c = cups.Connection ()
+                connection = self._connect ()
             except RuntimeError:
                 return
 
+        self._populate (connection=connection)
         for name in self.names:
-            self.add_printer (name, connection=c)
+            if name not in self.uris:
+                self._add_printer (name, connection=connection)
 
         self.names = []
 
+    def _add_uri (self, uri, printer):
+        old = self.printer.get (uri)
+        if old == printer:
+            return
+
+        if old is not None:
+            self._remove_uri (uri)
+
+        self.printer[uri] = printer
+        self.uris.setdefault (printer, []).append (uri)
+        self.unknown.discard (uri)
+
+    def _remove_uri (self, uri):
+        printer = self.printer.pop (uri)
+        uris = self.uris[printer]
+        uris.remove (uri)
+        if not uris:
+            del self.uris[printer]
+
     def add_printer (self, printer, connection=None):
+        # A printer event: the server is answering again.
+        self._populate_after = 0
+        self._add_printer (printer, connection=connection)
+
+    def _add_printer (self, printer, connection=None):
+        self._populate (connection=connection)
+        self.unknown.clear ()
+        if printer in self.uris:
+            return
+
         try:
             self._map_printer (name=printer, connection=connection)
         except KeyError:
@@ -170,39 +252,42 @@ class PrinterURIIndex:
             uris.append (attrs['printer-more-info'])
 
         for uri in uris:
-            self.printer[uri] = printer
+            self._add_uri (uri, printer)
 
     def remove_printer (self, printer):
         # Remove references to this printer in the URI map.
+        self._populate_after = 0
         self._collect_names ()
-        uris = list(self.printer.keys ())
-        for uri in uris:
-            if self.printer[uri] == printer:
-                del self.printer[uri]
+        for uri in self.uris.pop (printer, []):
+            del self.printer[uri]
 
     def lookup (self, uri, connection=None):
         self._collect_names ()
+        self._populate (connection=connection)
         try:
             return self.printer[uri]
         except KeyError:
+            if uri in self.unknown:
+                raise
+
             return self._map_printer (uri=uri, connection=connection)
 
     def all_printer_names (self):
         self._collect_names ()
-        return set (self.printer.values ())
+        self._populate ()
+        return set (self.uris.keys ())
 
     def lookup_cached_by_name (self, name):
         self._collect_names ()
-        for uri, printer in self.printer.items ():
-            if printer == name:
-                return uri
-
-        raise KeyError
+        try:
+            return self.uris[name][0]
+        except (KeyError, IndexError):
+            raise KeyError
 
     def _map_printer (self, uri=None, name=None, connection=None):
         try:
             if connection is None:
-                connection = cups.Connection ()
+                connection = self._connect ()
 
             r = ['printer-name', 'printer-uri-supported', 'printer-more-info']
             if uri is not None:
@@ -216,15 +301,233 @@ class PrinterURIIndex:
             raise KeyError
         except cups.IPPError:
             # URI not known.
+            if uri is not None:
+                self.unknown.add (uri)
             raise KeyError
 
         name = attrs['printer-name']
         self.update_from_attrs (name, attrs)
         if uri is not None:
-            self.printer[uri] = name
+            self._add_uri (uri, name)
         return name
 
 
+def _fetch_job_attributes (c, spans, jobids, requested_attributes):
+    # Runs in an asyncipp worker thread.
+    results = {}
+    for first, last in spans:
+        try:
+            jobs = c.getJobs (which_jobs='all', first_job_id=first,
+                              limit=last - first + 1,
+                              requested_attributes=requested_attributes)
+        except (cups.IPPError, RuntimeError):
+            continue
+
+        for jobid, attrs in jobs.items ():
+            if jobid in jobids:
+                results[jobid] = attrs
+
+    # Jobs not returned by Get-Jobs are asked about individually.
+    for jobid in jobids:
+        if jobid in results:
+            continue
+
+        try:
+            results[jobid] = c.getJobAttributes (
+                jobid, requested_attributes=requested_attributes)
+        except cups.IPPError:
+            # someone else may have purged the job
+            results[jobid] = None
+        except (RuntimeError, AttributeError):
+            results[jobid] = {}
+
+    return results
+
+class JobAttributesLoader:
+    """
+    Fetch missing job attributes for many jobs at once.
+
+    Jobs are queued as they arrive and fetched together once the main
+    loop becomes idle, by a worker thread from the shared asyncipp
+    pool.  Contiguous job IDs are fetched with one Get-Jobs request.
+    The printer attributes needed for held and stopped jobs are
+    remembered per printer until invalidated.
+    """
+
+    # Attributes always needed for held and stopped jobs.
+    held_job_attributes = ['job-state', 'job-hold-until', 'job-printer-uri']
+    held_printer_attributes = ['auth-info-required', 'device-uri']
+
+    # Queued job IDs closer together than this share a Get-Jobs request.
+    max_span = 500
+
+    def __init__ (self, reply_handler, parent=None,
+                  host=None, port=None, encryption=None):
+        """
+        @param reply_handler: function called as reply_handler (results)
+        where results maps job ID to a dict of fetched attributes, or
+        to None if the job no longer exists
+        @param parent: parent window for authentication dialogs
+        """
+        self._reply_handler = reply_handler
+        self._parent = parent
+        self._host = host
+        self._port = port
+        self._encryption = encryption
+        self._queued = {} # job ID -> set of attribute names
+        self._held = set () # of job IDs
+        self._printer_attrs = {} # printer URI -> dict
+        self._source = None
+        self._conn = None # asyncipp.PooledIPPConnection
+
+    def queue (self, jobid, attributes, held=False):
+        """
+        Schedule attributes to be fetched for a job.
+
+        @param jobid: job ID
+        @param attributes: attribute names to fetch
+        @param held: whether printer attributes for authentication
+        are needed as well
+        """
+        r = self._queued.setdefault (jobid, set ())
+        r.update (attributes)
+        if held:
+            r.update (self.held_job_attributes)
+            self._held.add (jobid)
+
+        if self._source is None:
+            self._source = GLib.idle_add (self._fetch,
+                                          priority=GLib.PRIORITY_LOW)
+
+    def forget_printer (self, uri=None):
+        """
+        Discard cached printer attributes.
+
+        @param uri: printer URI, or None for all printers
+        """
+        if uri is None:
+            self._printer_attrs = {}
+        else:
+            self._printer_attrs.pop (uri, None)
+
+    def cancel (self):
+        """
+        Discard queued jobs, and stop any pending or running fetch.
+        """
+        if self._source is not None:
+            GLib.source_remove (self._source)
+            self._source = None
+
+        if self._conn is not None:
+            self._conn.cancel ()
+
+        self._queued = {}
+        self._held = set ()
+
+    def _fetch (self):
+        self._source = None
+        queued = self._queued
+        held = self._held
+        self._queued = {}
+        self._held = set ()
+        if not queued:
+            return False
+
+        if self._conn is None:
+            self._conn = asyncipp.PooledIPPConnection (
+                host=self._host, port=self._port,
+                encryption=self._encryption, parent=self._parent,
+                priority=asyncipp.PRIORITY_BULK)
+
+        r = set (['job-state'])
+        for attrs in queued.values ():
+            r.update (attrs)
+
+        r = list (r)
+        debugprint ("requesting %s for %d jobs" % (r, len (queued)))
+        spans = list (self._spans (sorted (queued.keys ())))
+        self._conn.call (_fetch_job_attributes, spans, set (queued.keys ()),
+                         r,
+                         reply_handler=lambda conn, results:
+                             self._fetched (results, held),
+                         error_handler=self._fetch_failed)
+        return False
+
+    def _fetched (self, results, held):
+        self._add_printer_attributes (results, held)
+        self._reply_handler (results)
+
+    def _fetch_failed (self, conn, exc):
+        debugprint ("Fetching job attributes failed: %s" % repr (exc))
+
+    def _spans (self, jobids):
+        first = last = None
+        for jobid in jobids:
+            if first is not None and jobid - first < self.max_span:
+                last = jobid
+                continue
+
+            if first is not None:
+                yield (first, last)
+
+            first = last = jobid
+
+        if first is not None:
+            yield (first, last)
+
+    def _add_printer_attributes (self, results, held):
+        uris = set ()
+        for jobid in held:
+            attrs = results.get (jobid)
+            if not attrs:
+                continue
+
+            try:
+                s = int (attrs.get ('job-state', cups.IPP_JOB_PROCESSING))
+            except ValueError:
+                continue
+
+            if s in [cups.IPP_JOB_HELD, cups.IPP_JOB_STOPPED]:
+                uri = attrs.get ('job-printer-uri')
+                if uri:
+                    uris.add (uri)
+
+        missing = uris - set (self._printer_attrs.keys ())
+        if missing:
+            try:
+                c = authconn.Connection (self._parent,
+                                         host=self._host,
+                                         port=self._port,
+                                         encryption=self._encryption)
+                for uri in missing:
+                    pattrs = self.held_printer_attributes
+                    attrs = c.getPrinterAttributes (uri=uri,
+                                                    requested_attributes=pattrs)
+                    try:
+                        auth_info_required = attrs['auth-info-required']
+                    except KeyError:
+                        debugprint ("No auth-info-required attribute; "
+                                    "guessing instead")
+                        auth_info_required = ['username', 'password']
+
+                    if not isinstance (auth_info_required, list):
+                        auth_info_required = [auth_info_required]
+
+                    attrs['auth-info-required'] = auth_info_required
+                    self._printer_attrs[uri] = attrs
+            except (RuntimeError, cups.IPPError):
+                pass
+
+        for jobid in held:
+            attrs = results.get (jobid)
+            if not attrs:
+                continue
+
+            pattrs = self._printer_attrs.get (attrs.get ('job-printer-uri'))
+            if pattrs:
+                attrs.update (pattrs)
+
+
 class CancelJobsOperation(GObject.GObject):
     __gsignals__ = {
         'destroy':     (GObject.SignalFlags.RUN_LAST, None, ()),
@@ -399,10 +702,20 @@ class JobViewer (GtkGUI):
         self.jobs = {}
         self.jobiters = {}
         self.jobids = []
+        self.move_job_exclude = None # printer not offered as move target
+        self.move_job_menu_key = None
+        self.submenu_once = threading.Semaphore (1)
+        self.sensitivity_timer = None
         self.jobs_attrs = {} # dict of jobid->(GtkListStore, page_index)
-        self.active_jobs = set() # of job IDs
+        self.active_jobs = {} # job ID -> (printer, job state)
+        self.active_state_count = {} # job state -> number of active jobs
+        self.active_printer_count = {} # printer -> number of active jobs
         self.stopped_job_prompts = set() # of job IDs
         self.printer_state_reasons = {}
+        self.printer_worst_reason = {} # printer -> StateReason
+        self.worst_reason = None
+        self.status_timer = None
+        self.status_have_jobs = None
         self.num_jobs_when_hidden = 0
         self.connecting_to_device = {} # dict of printer->time first seen
         self.state_reason_notifications = {}
@@ -486,6 +799,7 @@ class JobViewer (GtkGUI):
                 if action_name == 'move-job':
                     self.move_job_menuitem = item
                     printers = Gtk.Menu ()
+                    printers.connect ('show', self.on_move_job_menu_show)
                     item.set_submenu (printers)
 
             item.show ()
@@ -526,7 +840,8 @@ class JobViewer (GtkGUI):
             self.treeview.append_column(column)
 
         cell = Gtk.CellRendererText ()
-        column = Gtk.TreeViewColumn (_("Time submitted"), cell, text=1)
+        column = Gtk.TreeViewColumn (_("Time submitted"), cell)
+        column.set_cell_data_func (cell, self._set_job_time_text, None)
         column.set_resizable (True)
         self.treeview.append_column (column)
 
@@ -541,7 +856,9 @@ class JobViewer (GtkGUI):
         column.set_cell_data_func (text, self._set_job_status_text, None)
         self.treeview.append_column (column)
 
-        self.store = Gtk.TreeStore(int, str)
+        # The store only holds job IDs.  Everything shown is formatted
+        # on demand, for visible rows, from the job data.
+        self.store = Gtk.ListStore(int)
         self.store.set_sort_column_id (0, Gtk.SortType.DESCENDING)
         self.treeview.set_model(self.store)
         self.treeview.set_rules_hint (True)
@@ -587,6 +904,8 @@ class JobViewer (GtkGUI):
         theme = Gtk.IconTheme.get_default ()
         self.icon_jobs = load_icon (theme, ICON)
         self.icon_jobs_processing = load_icon (theme, "printer-printing")
+        self.icon_jobs_held = None # composited when first needed
+        self.emblem_icons = {} # (pixbuf, level) -> pixbuf with emblem
         self.icon_no_jobs = self.icon_jobs.copy ()
         self.icon_no_jobs.fill (0)
         self.icon_jobs.composite (self.icon_no_jobs,
@@ -613,6 +932,9 @@ class JobViewer (GtkGUI):
         self.host = cups.getServer ()
         self.port = cups.getPort ()
         self.encryption = cups.getEncryption ()
+        self.job_attributes_loader = JobAttributesLoader (
+            self.job_attributes_fetched, parent=self.JobsWindow,
+            host=self.host, port=self.port, encryption=self.encryption)
         self.monitor = monitor.Monitor (bus=bus, my_jobs=my_jobs,
                                         specific_dests=specific_dests,
                                         host=self.host, port=self.port,
@@ -678,6 +1000,7 @@ class JobViewer (GtkGUI):
         vbox.pack_start (self.notebook, True, True, 0)
 
     def cleanup (self):
+        self.job_attributes_loader.cancel ()
         self.monitor.cleanup ()
         if self.my_monitor:
             self.my_monitor.cleanup ()
@@ -701,6 +1024,14 @@ class JobViewer (GtkGUI):
             GLib.source_remove (self.job_creation_times_timer)
             self.job_creation_times_timer = None
 
+        if self.status_timer is not None:
+            GLib.source_remove (self.status_timer)
+            self.status_timer = None
+
+        if self.sensitivity_timer is not None:
+            GLib.source_remove (self.sensitivity_timer)
+            self.sensitivity_timer = None
+
         for op in self.ops:
             op.destroy ()
 
@@ -775,44 +1106,10 @@ class JobViewer (GtkGUI):
             self.my_monitor.refresh(which_jobs=which_jobs, refresh_all=False)
 
     def update_job_creation_times(self):
-        now = time.time ()
-        need_update = False
-        for job, data in self.jobs.items():
-            t = _("Unknown")
-            if 'time-at-creation' in data:
-                created = data['time-at-creation']
-                ago = now - created
-                need_update = True
-                if ago < 2 * 60:
-                    t = _("a minute ago")
-                elif ago < 60 * 60:
-                    mins = int (ago / 60)
-                    t = _("%d minutes ago") % mins
-                elif ago < 24 * 60 * 60:
-                    hours = int (ago / (60 * 60))
-                    if hours == 1:
-                        t = _("an hour ago")
-                    else:
-                        t = _("%d hours ago") % hours
-                elif ago < 7 * 24 * 60 * 60:
-                    days = int (ago / (24 * 60 * 60))
-                    if days == 1:
-                        t = _("yesterday")
-                    else:
-                        t = _("%d days ago") % days
-                elif ago < 6 * 7 * 24 * 60 * 60:
-                    weeks = int (ago / (7 * 24 * 60 * 60))
-                    if weeks == 1:
-                        t = _("last week")
-                    else:
-                        t = _("%d weeks ago") % weeks
-                else:
-                    need_update = False
-                    t = time.strftime ("%B %Y", time.localtime (created))
-
-            if job in self.jobiters:
-                iter = self.jobiters[job]
-                self.store.set_value (iter, 1, t)
+        # Redraw the visible rows.  Their labels are only reformatted
+        # for jobs whose age has moved on to a different bucket.
+        self.treeview.queue_draw ()
+        need_update = len (self.jobs) > 0
 
         if need_update and not self.job_creation_times_timer:
             def update_times_with_locking ():
@@ -846,17 +1143,10 @@ class JobViewer (GtkGUI):
     def on_troubleshoot_quit(self, troubleshooter):
         del self.troubleshooter
 
-    def add_job (self, job, data, connection=None):
-        self.update_job (job, data, connection=connection)
+    def add_job (self, job, data):
+        self.update_job (job, data)
 
-        # There may have been an error fetching additional attributes,
-        # in which case we need to give up.
-        if job not in self.jobs:
-            return
-
-        store = self.store
-        iter = self.store.append (None)
-        store.set_value (iter, 0, job)
+        iter = self.store.append ([job])
         debugprint ("Job %d added" % job)
         self.jobiters[job] = iter
 
@@ -885,93 +1175,48 @@ class JobViewer (GtkGUI):
         if self.my_monitor:
             self.my_monitor.update ()
 
-    def update_job (self, job, data, connection=None):
-        # Fetch required attributes for this job if they are missing.
-        r = self.required_job_attributes - set (data.keys ())
-
+    def update_job (self, job, data):
         # If we are showing attributes of this job at this moment, update them.
         if job in self.jobs_attrs:
             self.update_job_attributes_viewer(job)
 
-        if r:
-            attrs = None
-            try:
-                if connection is None:
-                    connection = cups.Connection (host=self.host,
-                                                  port=self.port,
-                                                  encryption=self.encryption)
-
-                debugprint ("requesting %s" % r)
-                r = list (r)
-                attrs = connection.getJobAttributes (job,
-                                                     requested_attributes=r)
-            except RuntimeError:
-                pass
-            except AttributeError:
-                pass
-            except cups.IPPError:
-                # someone else may have purged the job
-                return
-
-            if attrs:
-                data.update (attrs)
-
         self.jobs[job] = data
 
-        job_requires_auth = False
+        # Fetch required attributes for this job if they are missing.
+        # Held and stopped jobs also need the printer's authentication
+        # requirements.  Requests are gathered up and made together
+        # for all jobs updated before the main loop is next idle.
+        r = self.required_job_attributes - set (data.keys ())
         try:
-            jstate = data.get ('job-state', cups.IPP_JOB_PROCESSING)
-            s = int (jstate)
-
-            if s in [cups.IPP_JOB_HELD, cups.IPP_JOB_STOPPED]:
-                jattrs = ['job-state', 'job-hold-until', 'job-printer-uri']
-                pattrs = ['auth-info-required', 'device-uri']
-                # The current job-printer-uri may differ from the one that
-                # is returned when we request it over the connection.
-                # So while we use it to query the printer attributes we
-                # Update it afterwards to make sure that we really
-                # have the one cups uses in the job attributes.
-                uri = data.get ('job-printer-uri')
-                c = authconn.Connection (self.JobsWindow,
-                                         host=self.host,
-                                         port=self.port,
-                                         encryption=self.encryption)
-                attrs = c.getPrinterAttributes (uri = uri,
-                                                requested_attributes=pattrs)
-
-                try:
-                    auth_info_required = attrs['auth-info-required']
-                except KeyError:
-                    debugprint ("No auth-info-required attribute; "
-                                "guessing instead")
-                    auth_info_required = ['username', 'password']
-
-                if not isinstance (auth_info_required, list):
-                    auth_info_required = [auth_info_required]
-                    attrs['auth-info-required'] = auth_info_required
+            s = int (data.get ('job-state', cups.IPP_JOB_PROCESSING))
+        except ValueError:
+            s = cups.IPP_JOB_PROCESSING
 
-                data.update (attrs)
+        held = s in [cups.IPP_JOB_HELD, cups.IPP_JOB_STOPPED]
+        if r or held:
+            self.job_attributes_loader.queue (job, r, held=held)
 
-                attrs = c.getJobAttributes (job,
-                                            requested_attributes=jattrs)
-                data.update (attrs)
-                jstate = data.get ('job-state', cups.IPP_JOB_PROCESSING)
-                s = int (jstate)
-        except ValueError:
-            pass
-        except RuntimeError:
-            pass
-        except cups.IPPError:
-            pass
+        self._job_data_changed (job, data, check_auth=not held)
+        self.treeview.queue_draw ()
+        if job in self.jobids:
+            self.queue_update_sensitivity ()
 
-        # Invalidate the cached status description and redraw the treeview.
+    def _job_data_changed (self, job, data, check_auth=True):
+        # Invalidate the cached status description.
         try:
             del data['_status_text']
         except KeyError:
             pass
-        self.treeview.queue_draw ()
+
+        if not check_auth:
+            return
 
         # Check whether authentication is required.
+        try:
+            s = int (data.get ('job-state', cups.IPP_JOB_PROCESSING))
+        except ValueError:
+            return
+
         job_requires_auth = (s == cups.IPP_JOB_HELD and
                              data.get ('job-hold-until', 'none') ==
                              'auth-info-required')
@@ -984,8 +1229,32 @@ class JobViewer (GtkGUI):
                                      data.get ('auth-info-required', []),
                                      self.applet)
 
-        self.submenu_set = False
-        self.update_sensitivity ()
+    def job_attributes_fetched (self, results):
+        for job, attrs in results.items ():
+            if job not in self.jobs:
+                # Removed while we were waiting.
+                continue
+
+            if attrs is None:
+                # Someone else purged the job.
+                debugprint ("Job %d vanished" % job)
+                if job in self.jobiters:
+                    self.store.remove (self.jobiters[job])
+                    del self.jobiters[job]
+
+                del self.jobs[job]
+                self._untrack_active_job (job)
+                continue
+
+            data = self.jobs[job]
+            data.update (attrs)
+            self._track_active_job (job, data)
+            self._job_data_changed (job, data)
+            if job in self.jobids:
+                self.queue_update_sensitivity ()
+
+        self.treeview.queue_draw ()
+        self.update_status ()
 
     def get_authentication (self, job, device_uri, printer_uri,
                             auth_info_required, show_dialog):
@@ -1246,7 +1515,20 @@ class JobViewer (GtkGUI):
         if event.button == 3:
             self.show_treeview_popup_menu (treeview, event, event.button)
 
+    # Job updates affecting the selected jobs are coalesced into one
+    # sensitivity update per this many milliseconds.
+    sensitivity_delay = 100
+
+    def queue_update_sensitivity (self):
+        if self.sensitivity_timer is None:
+            self.sensitivity_timer = GLib.timeout_add (self.sensitivity_delay,
+                                                       self.update_sensitivity)
+
     def update_sensitivity (self, selection = None):
+        if self.sensitivity_timer is not None:
+            GLib.source_remove (self.sensitivity_timer)
+            self.sensitivity_timer = None
+
         if (selection is None):
             selection = self.treeview.get_selection () 
         (model, pathlist) = selection.get_selected_rows()
@@ -1260,18 +1542,17 @@ class JobViewer (GtkGUI):
         attributes = self.job_ui_manager.get_action ("/job-attributes")
         move = self.job_ui_manager.get_action ("/move-job")
         if len (pathlist) == 0:
+            self.jobids = []
             for widget in [cancel, delete, hold, release, reprint, retrieve,
                            move, authenticate, attributes]:
                 widget.set_sensitive (False)
-            return
+            return False
 
         cancel_sensitive = True
         hold_sensitive = True
         release_sensitive = True
         reprint_sensitive = True
         authenticate_sensitive = True
-        move_sensitive = False
-        other_printers = self.printer_uri_index.all_printer_names ()
         job_printers = dict()
 
         self.jobids = []
@@ -1305,31 +1586,13 @@ class JobViewer (GtkGUI):
                     printer = uri
                 job_printers[printer] = uri
 
+        # The "Move To" submenu itself is only built when shown.
+        self.move_job_exclude = None
         if len (job_printers.keys ()) == 1:
-            try:
-                other_printers.remove (list(job_printers.keys ())[0])
-            except KeyError:
-                pass
+            self.move_job_exclude = list(job_printers.keys ())[0]
 
-        if len (other_printers) > 0:
-            printers_menu = Gtk.Menu ()
-            other_printers = list (other_printers)
-            other_printers.sort ()
-            for printer in other_printers:
-                try:
-                    uri = self.printer_uri_index.lookup_cached_by_name (printer)
-                except KeyError:
-                    uri = None
-                menuitem = Gtk.MenuItem (label=printer)
-                menuitem.set_sensitive (uri is not None)
-                menuitem.show ()
-                self._submenu_connect_hack (menuitem,
-                                            self.on_job_move_activate,
-                                            uri)
-                printers_menu.append (menuitem)
-
-            self.move_job_menuitem.set_submenu (printers_menu)
-            move_sensitive = True
+        other_printers = self.printer_uri_index.all_printer_names ()
+        other_printers.discard (self.move_job_exclude)
 
         cancel.set_sensitive(cancel_sensitive)
         delete.set_sensitive(not cancel_sensitive)
@@ -1337,9 +1600,45 @@ class JobViewer (GtkGUI):
         release.set_sensitive(release_sensitive)
         reprint.set_sensitive(reprint_sensitive)
         retrieve.set_sensitive(reprint_sensitive)
-        move.set_sensitive (move_sensitive)
+        move.set_sensitive (len (other_printers) > 0)
         authenticate.set_sensitive(authenticate_sensitive)
         attributes.set_sensitive(True)
+        return False
+
+    def on_move_job_menu_show (self, menu):
+        # Only the first activation counts until the menu is shown again.
+        self.submenu_once = threading.Semaphore (1)
+
+        other_printers = self.printer_uri_index.all_printer_names ()
+        other_printers.discard (self.move_job_exclude)
+        other_printers = list (other_printers)
+        other_printers.sort ()
+        targets = []
+        for printer in other_printers:
+            try:
+                uri = self.printer_uri_index.lookup_cached_by_name (printer)
+            except KeyError:
+                uri = None
+            targets.append ((printer, uri))
+
+        # Keep the existing menu items if the targets are unchanged.
+        key = tuple (targets)
+        if key == self.move_job_menu_key:
+            return
+
+        self.move_job_menu_key = key
+        for child in menu.get_children ():
+            menu.remove (child)
+            child.destroy ()
+
+        for printer, uri in targets:
+            menuitem = Gtk.MenuItem (label=printer)
+            menuitem.set_sensitive (uri is not None)
+            menuitem.show ()
+            self._submenu_connect_hack (menuitem,
+                                        self.on_job_move_activate,
+                                        uri)
+            menu.append (menuitem)
 
     def on_selection_changed (self, selection):
         self.update_sensitivity (selection)
@@ -1550,9 +1849,9 @@ class JobViewer (GtkGUI):
 
     def _submenu_connect_hack (self, item, callback, *args):
         # See https://bugzilla.gnome.org/show_bug.cgi?id=695488
-        only_once = threading.Semaphore (1)
+        # The semaphore is replaced each time the submenu is shown.
         def handle_event (item, event=None):
-            if only_once.acquire (False):
+            if self.submenu_once.acquire (False):
                 GObject.idle_add (callback, item, *args)
 
         return (item.connect ('button-press-event', handle_event),
@@ -1696,17 +1995,20 @@ class JobViewer (GtkGUI):
             if worst_reason is None:
                 self.worst_reason = None
 
-        if printer is not None:
-            for reason in self.printer_state_reasons.get (printer, []):
-                if worst_reason is None:
-                    worst_reason = reason
-                elif reason > worst_reason:
-                    worst_reason = reason
+        if printer is not None and worst_reason is None:
+            worst_reason = self.printer_worst_reason.get (printer)
 
         if worst_reason is not None:
             level = worst_reason.get_level ()
             if level > StateReason.REPORT:
-                # Add an emblem to the icon.
+                # Add an emblem to the icon.  The result is kept, as
+                # this is done for every job row drawn.
+                try:
+                    return self.emblem_icons[(pixbuf, level)]
+                except KeyError:
+                    pass
+
+                base = pixbuf
                 icon = StateReason.LEVEL_ICON[level]
                 pixbuf = pixbuf.copy ()
                 try:
@@ -1724,6 +2026,8 @@ class JobViewer (GtkGUI):
                 except GObject.GError:
                     debugprint ("No %s icon available" % icon)
 
+                self.emblem_icons[(base, level)] = pixbuf
+
         return pixbuf
 
     def get_icon_pixbuf (self, have_jobs=None):
@@ -1735,11 +2039,8 @@ class JobViewer (GtkGUI):
 
         if have_jobs:
             pixbuf = self.icon_jobs
-            for jobid, jobdata in self.jobs.items ():
-                jstate = jobdata.get ('job-state', cups.IPP_JOB_PENDING)
-                if jstate == cups.IPP_JOB_PROCESSING:
-                    pixbuf = self.icon_jobs_processing
-                    break
+            if self.active_state_count.get (cups.IPP_JOB_PROCESSING, 0) > 0:
+                pixbuf = self.icon_jobs_processing
         else:
             pixbuf = self.icon_no_jobs
 
@@ -1765,37 +2066,76 @@ class JobViewer (GtkGUI):
 
         self.statusicon.set_tooltip_markup (tooltip)
 
+    def _track_active_job (self, jobid, jobdata):
+        # Keep the per-state and per-printer counts of active jobs up
+        # to date with this job's current state.
+        self._untrack_active_job (jobid)
+        if not self.job_is_active (jobdata):
+            return
+
+        printer = jobdata.get ('job-printer-name')
+        state = jobdata.get ('job-state')
+        self.active_jobs[jobid] = (printer, state)
+        count = self.active_state_count.get (state, 0)
+        self.active_state_count[state] = count + 1
+        count = self.active_printer_count.get (printer, 0)
+        self.active_printer_count[printer] = count + 1
+
+    def _untrack_active_job (self, jobid):
+        try:
+            (printer, state) = self.active_jobs.pop (jobid)
+        except KeyError:
+            return
+
+        for counts, key in [(self.active_state_count, state),
+                            (self.active_printer_count, printer)]:
+            count = counts[key] - 1
+            if count > 0:
+                counts[key] = count
+            else:
+                del counts[key]
+
+    def _printer_reasons_changed (self, printer):
+        # Remember the most problematic reason for each printer.
+        worst_reason = None
+        for reason in self.printer_state_reasons.get (printer, []):
+            if worst_reason is None or reason > worst_reason:
+                worst_reason = reason
+
+        if worst_reason is None:
+            self.printer_worst_reason.pop (printer, None)
+        else:
+            self.printer_worst_reason[printer] = worst_reason
+
+    # Status bar and icon refreshes are coalesced into one per this
+    # many milliseconds.
+    status_refresh_interval = 250
+
     def update_status (self, have_jobs=None):
-        # Found out which printer state reasons apply to our active jobs.
-        upset_printers = set()
-        for printer, reasons in self.printer_state_reasons.items ():
-            if len (reasons) > 0:
-                upset_printers.add (printer)
-        debugprint ("Upset printers: %s" % upset_printers)
-
-        my_upset_printers = set()
-        if len (upset_printers):
-            my_upset_printers = set()
-            for jobid in self.active_jobs:
-                # 'job-printer-name' is set by job_added/job_event
-                printer = self.jobs[jobid]['job-printer-name']
-                if printer in upset_printers:
-                    my_upset_printers.add (printer)
-            debugprint ("My upset printers: %s" % my_upset_printers)
-
-        my_reasons = []
-        for printer in my_upset_printers:
-            my_reasons.extend (self.printer_state_reasons[printer])
-
-        # Find out which is the most problematic.
+        if have_jobs:
+            self.status_have_jobs = True
+
+        if self.status_timer is None:
+            self.status_timer = GLib.timeout_add (self.status_refresh_interval,
+                                                  self._update_status_now)
+
+    def _update_status_now (self):
+        self.status_timer = None
+        have_jobs = self.status_have_jobs
+        self.status_have_jobs = None
+
+        # Find the most problematic state reason among printers we
+        # have active jobs for.
         self.worst_reason = None
-        if len (my_reasons) > 0:
-            worst_reason = my_reasons[0]
-            for reason in my_reasons:
-                if reason > worst_reason:
-                    worst_reason = reason
-            self.worst_reason = worst_reason
-            debugprint ("Worst reason: %s" % worst_reason)
+        for printer, reason in self.printer_worst_reason.items ():
+            if printer not in self.active_printer_count:
+                continue
+
+            if self.worst_reason is None or reason > self.worst_reason:
+                self.worst_reason = reason
+
+        if self.worst_reason is not None:
+            debugprint ("Worst reason: %s" % self.worst_reason)
 
         Gdk.threads_enter ()
         self.statusbar.pop (0)
@@ -1804,18 +2144,9 @@ class JobViewer (GtkGUI):
             self.statusbar.push (0, tooltip)
         else:
             tooltip = None
-            status_message = ""
-            processing = 0
-            pending = 0
-            for jobid in self.active_jobs:
-                try:
-                    job_state = self.jobs[jobid]['job-state']
-                except KeyError:
-                    continue
-                if job_state == cups.IPP_JOB_PROCESSING:
-                    processing = processing + 1
-                elif job_state == cups.IPP_JOB_PENDING:
-                    pending = pending + 1
+            processing = self.active_state_count.get (cups.IPP_JOB_PROCESSING,
+                                                      0)
+            pending = self.active_state_count.get (cups.IPP_JOB_PENDING, 0)
             if ((processing > 0) or (pending > 0)):
                 status_message = _("processing / pending:   %d / %d") % (processing, pending)
                 self.statusbar.push(0, status_message)
@@ -1827,6 +2158,7 @@ class JobViewer (GtkGUI):
             self.set_statusicon_tooltip (tooltip=tooltip)
 
         Gdk.threads_leave ()
+        return False
 
     ## Notifications
     def notify_printer_state_reason_if_important (self, reason):
@@ -1959,11 +2291,17 @@ class JobViewer (GtkGUI):
 
     ## Monitor signal handlers
     def on_refresh (self, mon):
+        self.job_attributes_loader.cancel ()
+        self.job_attributes_loader.forget_printer ()
         self.store.clear ()
         self.jobs = {}
-        self.active_jobs = set()
+        self.active_jobs = {}
+        self.active_state_count = {}
+        self.active_printer_count = {}
         self.jobiters = {}
-        self.printer_uri_index = PrinterURIIndex ()
+        self.printer_uri_index = PrinterURIIndex (host=self.host,
+                                                  port=self.port,
+                                                  encryption=self.encryption)
 
     def job_added (self, mon, jobid, eventname, event, jobdata):
         uri = jobdata.get ('job-printer-uri', '')
@@ -1992,10 +2330,7 @@ class JobViewer (GtkGUI):
         if jobid not in self.jobiters:
             return
 
-        if self.job_is_active (jobdata):
-            self.active_jobs.add (jobid)
-        elif jobid in self.active_jobs:
-            self.active_jobs.remove (jobid)
+        self._track_active_job (jobid, jobdata)
 
         self.update_status (have_jobs=True)
         if self.applet:
@@ -2018,19 +2353,13 @@ class JobViewer (GtkGUI):
 
         jobdata['job-printer-name'] = printer
 
-        if self.job_is_active (jobdata):
-            self.active_jobs.add (jobid)
-        elif jobid in self.active_jobs:
-            self.active_jobs.remove (jobid)
+        self._track_active_job (jobid, jobdata)
 
         self.update_job (jobid, jobdata)
         self.update_status ()
 
-        # Check that the job still exists, as update_status re-enters
-        # the main loop in order to paint/hide the tray icon.  Really
-        # that should probably be deferred to the idle handler, but
-        # for the moment just deal with the fact that the job might
-        # have gone (bug #640904).
+        # Check that the job still exists, in case anything we called
+        # re-entered the main loop (bug #640904).
         if jobid not in self.jobs:
             return
 
@@ -2065,13 +2394,13 @@ class JobViewer (GtkGUI):
             # authentication.  If the latter, the job will be held not
             # stopped, and the job-hold-until attribute will be
             # 'auth-info-required'.  This was already checked for in
-            # update_job.
+            # job_attributes_fetched.
             may_be_problem = True
             jstate = jobdata['job-state']
             if (jstate == cups.IPP_JOB_PROCESSING or
                 (jstate == cups.IPP_JOB_HELD and
-                 jobdata['job-hold-until'] == 'auth-info-required')):
-                # update_job already dealt with this.
+                 jobdata.get ('job-hold-until') == 'auth-info-required')):
+                # job_attributes_fetched deals with this.
                 may_be_problem = False
             else:
                 # Other than that, unfortunately the only
@@ -2180,8 +2509,7 @@ class JobViewer (GtkGUI):
             del self.jobiters[jobid]
             del self.jobs[jobid]
 
-        if jobid in self.active_jobs:
-            self.active_jobs.remove (jobid)
+        self._untrack_active_job (jobid)
 
         if jobid in self.jobs_attrs:
             del self.jobs_attrs[jobid]
@@ -2200,6 +2528,7 @@ class JobViewer (GtkGUI):
 
         reason.user_notified = False
         l.append (reason)
+        self._printer_reasons_changed (printer)
         self.update_status ()
         self.treeview.queue_draw ()
 
@@ -2207,13 +2536,9 @@ class JobViewer (GtkGUI):
             return
 
         # Find out if the user has jobs queued for that printer.
-        for job, data in self.jobs.items ():
-            if not self.job_is_active (data):
-                continue
-            if data['job-printer-name'] == printer:
-                # Yes!  Notify them of the state reason, if necessary.
-                self.notify_printer_state_reason_if_important (reason)
-                break
+        if printer in self.active_printer_count:
+            # Yes!  Notify them of the state reason, if necessary.
+            self.notify_printer_state_reason_if_important (reason)
 
     def state_reason_removed (self, mon, reason):
         printer = reason.get_printer ()
@@ -2230,6 +2555,7 @@ class JobViewer (GtkGUI):
             return
 
         del reasons[i]
+        self._printer_reasons_changed (printer)
 
         self.update_status ()
         self.treeview.queue_draw ()
@@ -2308,12 +2634,54 @@ class JobViewer (GtkGUI):
 
     def printer_added (self, mon, printer):
         self.printer_uri_index.add_printer (printer)
+        if self.jobids:
+            self.queue_update_sensitivity ()
 
     def printer_event (self, mon, printer, eventname, event):
         self.printer_uri_index.update_from_attrs (printer, event)
+        if eventname == 'printer-modified':
+            self.job_attributes_loader.forget_printer ()
 
     def printer_removed (self, mon, printer):
         self.printer_uri_index.remove_printer (printer)
+        self.job_attributes_loader.forget_printer ()
+        if self.jobids:
+            self.queue_update_sensitivity ()
+
+    def _job_age_bucket (self, ago):
+        if ago < 2 * 60:
+            return ('minute', 1)
+        elif ago < 60 * 60:
+            return ('minutes', int (ago / 60))
+        elif ago < 24 * 60 * 60:
+            return ('hours', int (ago / (60 * 60)))
+        elif ago < 7 * 24 * 60 * 60:
+            return ('days', int (ago / (24 * 60 * 60)))
+        elif ago < 6 * 7 * 24 * 60 * 60:
+            return ('weeks', int (ago / (7 * 24 * 60 * 60)))
+        else:
+            return ('month', 0)
+
+    def _format_job_age (self, bucket, created):
+        (unit, n) = bucket
+        if unit == 'minute':
+            return _("a minute ago")
+        elif unit == 'minutes':
+            return _("%d minutes ago") % n
+        elif unit == 'hours':
+            if n == 1:
+                return _("an hour ago")
+            return _("%d hours ago") % n
+        elif unit == 'days':
+            if n == 1:
+                return _("yesterday")
+            return _("%d days ago") % n
+        elif unit == 'weeks':
+            if n == 1:
+                return _("last week")
+            return _("%d weeks ago") % n
+
+        return time.strftime ("%B %Y", time.localtime (created))
 
     ### Cell data functions
     def _set_job_job_number_text (self, column, cell, model, iter, *data):
@@ -2351,6 +2719,30 @@ class JobViewer (GtkGUI):
             reason = ''
         cell.set_property("text", self.jobs[jobid]['job-printer-name']+reason)
 
+    def _set_job_time_text (self, column, cell, model, iter, *data):
+        jobid = model.get_value (iter, 0)
+        try:
+            data = self.jobs[jobid]
+        except KeyError:
+            return
+
+        if 'time-at-creation' not in data:
+            cell.set_property ("text", _("Unknown"))
+            return
+
+        created = data['time-at-creation']
+        bucket = self._job_age_bucket (time.time () - created)
+        try:
+            (cached_bucket, text) = data['_time_text']
+        except KeyError:
+            cached_bucket = None
+
+        if cached_bucket != bucket:
+            text = self._format_job_age (bucket, created)
+            data['_time_text'] = (bucket, text)
+
+        cell.set_property ("text", text)
+
     def _set_job_size_text (self, column, cell, model, iter, *data):
         jobid = model.get_value (iter, 0)
         try:
@@ -2460,7 +2852,9 @@ class JobViewer (GtkGUI):
         else:
             icon = self.icon_jobs
 
-        if s == cups.IPP_JOB_HELD:
+        if s == cups.IPP_JOB_HELD and self.icon_jobs_held is not None:
+            icon = self.icon_jobs_held
+        elif s == cups.IPP_JOB_HELD:
             try:
                 theme = Gtk.IconTheme.get_default ()
                 emblem = theme.load_icon (Gtk.STOCK_MEDIA_PAUSE, 22 / 2, 0)
@@ -2473,6 +2867,7 @@ class JobViewer (GtkGUI):
                                   1.0, 1.0,
                                   GdkPixbuf.InterpType.BILINEAR, 255)
                 icon = copy
+                self.icon_jobs_held = copy
             except GObject.GError:
                 debugprint ("No %s icon available" % Gtk.STOCK_MEDIA_PAUSE)
         else:
@@ -2496,12 +2891,8 @@ class JobViewer (GtkGUI):
             data['_status_text'] = text
 
         printer = data['job-printer-name']
-        reasons = self.printer_state_reasons.get (printer, [])
-        if len (reasons) > 0:
-            worst_reason = reasons[0]
-            for reason in reasons[1:]:
-                if reason > worst_reason:
-                    worst_reason = reason
+        worst_reason = self.printer_worst_reason.get (printer)
+        if worst_reason is not None:
             (title, unused) = worst_reason.get_description ()
             text += " - " + title
 
@@ -27,6 +27,11 @@ from gi.repository import GLib
 from debug import *
 
 class KillTimer:
+    """
+    Call killfunc (or exit) after timeout seconds with no holds.
+    A timeout of None means never.
+    """
+
     def __init__ (self, timeout=30, killfunc=None):
         self._timeout = timeout
         self._killfunc = killfunc
@@ -35,8 +40,17 @@ class KillTimer:
         self._lock = threading.Lock()
 
     def _add_timeout (self):
+        if self._timeout is None:
+            self._timer = None
+            return
+
         self._timer = GLib.timeout_add_seconds (self._timeout, self._kill)
 
+    def _remove_timeout (self):
+        if self._timer is not None:
+            GLib.source_remove (self._timer)
+            self._timer = None
+
     def _kill (self):
         debugprint ("Timeout (%ds), exiting" % self._timeout)
         if self._killfunc:
@@ -48,7 +62,7 @@ class KillTimer:
         self._lock.acquire()
         if self._holds == 0:
             debugprint ("Kill timer stopped")
-            GLib.source_remove (self._timer)
+            self._remove_timeout ()
 
         self._holds += 1
         self._lock.release()
@@ -65,6 +79,6 @@ class KillTimer:
     def alive (self):
         self._lock.acquire()
         if self._holds == 0:
-            GLib.source_remove (self._timer)
+            self._remove_timeout ()
             self._add_timeout ()
         self._lock.release()
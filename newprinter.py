@@ -2059,15 +2059,29 @@ class NewPrinterGUI(GtkGUI):
         if len (need_resolving) > 0:
             resolver = dnssdresolve.DNSSDHostNamesResolver (need_resolving)
             self.inc_spinner_task ()
+            if current_uri in need_resolving:
+                # It will be added along with its own device.
+                final_uri = None
+            else:
+                final_uri = current_uri
+
             resolver.resolve (reply_handler=lambda devices:
-                                  self.dnssd_resolve_reply (current_uri,
-                                                            devices))
+                                  self.dnssd_resolve_reply (final_uri,
+                                                            devices),
+                              partial_handler=lambda uri, device:
+                                  self.dnssd_resolve_partial (current_uri,
+                                                              uri, device))
 
         self.dec_spinner_task ()
         self.check_firewall ()
 
+    def dnssd_resolve_partial (self, current_uri, uri, device):
+        self.add_devices ({uri: device}, current_uri, no_more=False)
+
     def dnssd_resolve_reply (self, current_uri, devices):
-        self.add_devices (devices, current_uri, no_more=True)
+        # The devices themselves have already been added as each
+        # one was resolved.
+        self.add_devices ({}, current_uri, no_more=True)
         self.dec_spinner_task ()
         self.check_firewall ()
 
@@ -2177,28 +2191,20 @@ class NewPrinterGUI(GtkGUI):
                 host = device.uri[s:s+e]
         # Try to get make and model via SNMP
         if host:
-            args = ["/usr/lib/cups/backend/snmp", host]
-            debugprint (host + ": " + repr(args))
-            stdout = None
+            # The lookup is shared with (and may already have been
+            # done by) the network printer finder.
+            debugprint (host + ": querying SNMP")
+            service = probe_printer.get_snmp_service ()
             try:
-                p = subprocess.Popen (args, close_fds=True,
-                                      stdin=subprocess.DEVNULL,
-                                      stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE)
-                (stdout, stderr) = p.communicate ()
-                if p.returncode != 0:
-                    stdout = None
-            except:
-                # Problem executing command.
-                pass
-
+                # Keep the main loop running meanwhile.
+                op = TimedOperation (service.lookup_sync, args=(host,),
+                                     kwargs={'timeout': service.timeout},
+                                     parent=self.NewPrinterWindow)
+                stdout = op.run ()
+            except OperationCanceled:
+                stdout = None
             if stdout is not None:
-                try:
-                    line = stdout.decode ('utf-8').strip ()
-                except UnicodeDecodeError:
-                    # Work-around snmp backend output encoded as iso-8859-1 (despire RFC 2571).
-                    # If it's neither iso-8859-1, make a best guess by ignoring problematic bytes.
-                    line = stdout.decode (encoding='iso-8859-1', errors='ignore').strip ()
+                line = stdout.strip ()
                 words = probe_printer.wordsep (line)
                 n = len (words)
                 if n < 4:
@@ -3438,7 +3444,12 @@ class NewPrinterGUI(GtkGUI):
 
         self.WaitWindow.disconnect (self.WaitWindow_handler)
         signal = self.WaitWindow.connect ("delete-event", stop)
-        printers = server.probe()
+        try:
+            # Keep the main loop running so that the wait window
+            # can be closed.
+            printers = TimedOperation (server.probe).run ()
+        except OperationCanceled:
+            printers = []
         self.WaitWindow.disconnect (signal)
         self.WaitWindow_handler = self.WaitWindow.connect ("delete-event",
                                                            on_delete_just_hide)
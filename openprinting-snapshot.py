@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+## openprinting-snapshot
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import cupshelpers
+from cupshelpers import openprinting
+import getopt
+import sys
+
+def usage ():
+    print ("Syntax: openprinting-snapshot [--output FILE] SEARCH-TERM...")
+    print ("Query OpenPrinting for the printers matching each search term")
+    print ("(for example, manufacturer names) and their drivers, and save")
+    print ("the results for offline use.  The default output file is")
+    print ("%s" % openprinting.DEFAULT_SNAPSHOT)
+    sys.exit (1)
+
+try:
+    opts, args = getopt.gnu_getopt (sys.argv[1:], 'ho:d',
+                                    ['help', 'output=', 'debug'])
+except getopt.GetoptError:
+    usage ()
+
+output = openprinting.DEFAULT_SNAPSHOT
+for opt, optarg in opts:
+    if opt in ('-h', '--help'):
+        usage ()
+    elif opt in ('-o', '--output'):
+        output = optarg
+    elif opt in ('-d', '--debug'):
+        cupshelpers.set_debugprint_fn (print)
+
+if not args:
+    usage ()
+
+def progress (done, total):
+    sys.stderr.write ("\r%d/%d models" % (done, total))
+    if done == total:
+        sys.stderr.write ("\n")
+
+snapshot = openprinting.createSnapshot (output, args, progress=progress)
+print ("Saved %d models, %d licenses to %s" % (len (snapshot.printers),
+                                                len (snapshot.licenses),
+                                                output))
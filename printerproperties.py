@@ -1079,16 +1079,17 @@ class PrinterPropertiesDialog(GtkGUI):
                 except_users != printer.except_users) or saveall:
                 printer.setAccess(default_allow, except_users)
 
-            for option in printer.attributes:
-                if option not in self.server_side_options:
-                    printer.unsetOption(option)
+            unset = [option for option in printer.attributes
+                     if option not in self.server_side_options]
+            options = {}
             for option in self.server_side_options.values():
                 if (option.is_changed() or
                     (saveall and
                      option.get_current_value () != option.get_default())):
                     debugprint ("Set %s = %s" % (option.name,
                                                  option.get_current_value()))
-                    printer.setOption(option.name, option.get_current_value())
+                    options[option.name] = option.get_current_value()
+            printer.setOptions(options, unset=unset)
 
         except cups.IPPError as e:
             (e, s) = e.args
@@ -18,13 +18,18 @@
 ## along with this program; if not, write to the Free Software
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import collections
 import cupshelpers
 from debug import *
 import errno
+import ipaddress
+import selectors
 import socket, time
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 from gi.repository import Gdk
 from gi.repository import Gtk
-from timedops import TimedOperation
+from timedops import TimedOperation, OperationThread, OperationCanceled
 import subprocess
 import threading
 import cups
@@ -91,9 +96,16 @@ def wordsep (line):
 ##print wordsep ('network "foo bar" \ ofoo "\\"" 2" "3')
 
 def open_socket(hostname, port):
-    try:
-        host, port = hostname.split(":", 1)
-    except ValueError:
+    # The hostname may carry a port of its own: "host:port", or
+    # "[address]:port" for an IPv6 address.  A bare IPv6 address
+    # is taken as it is.
+    if hostname.startswith("["):
+        host, sep, rest = hostname[1:].partition("]")
+        if rest.startswith(":"):
+            port = rest[1:]
+    elif hostname.count(":") == 1:
+        host, port = hostname.split(":")
+    else:
         host = hostname
 
     s = None
@@ -120,16 +132,315 @@ def open_socket(hostname, port):
         break
     return s
 
+def parse_address_range (spec):
+    """
+    Expand an address range specification into a list of host
+    addresses.  The specification may be a network in CIDR notation
+    ('192.168.0.0/22'), an inclusive range of addresses
+    ('192.168.0.10-192.168.0.50') or a single address.
+    """
+    spec = spec.strip ()
+    if spec.find ("-") != -1:
+        (first, last) = spec.split ("-", 1)
+        first = ipaddress.ip_address (first.strip ())
+        last = ipaddress.ip_address (last.strip ())
+        if first.version != last.version or last < first:
+            raise ValueError ("bad address range: %s" % spec)
+
+        addrs = []
+        for network in ipaddress.summarize_address_range (first, last):
+            addrs.extend ([str (addr) for addr in network])
+
+        return addrs
+
+    network = ipaddress.ip_network (spec, strict=False)
+    if network.num_addresses == 1:
+        return [str (network.network_address)]
+
+    return [str (addr) for addr in network.hosts ()]
+
+def tcp_sweep (addresses, ports, timeout=0.5, max_inflight=256,
+               deadline=None, should_stop=None):
+    """
+    Connect asynchronously to every port of every address, with at
+    most max_inflight connection attempts outstanding at once.
+
+    Yields an (address, port) tuple for each port accepting
+    connections, as soon as it is found.  Each attempt is abandoned
+    after timeout seconds; the whole sweep stops at the deadline
+    (an absolute time.time() value) or when should_stop() returns
+    True.
+    """
+    sel = selectors.DefaultSelector ()
+    targets = ((addr, port) for addr in addresses for port in ports)
+    inflight = {}
+    exhausted = False
+    try:
+        while True:
+            now = time.time ()
+            if ((deadline is not None and now >= deadline) or
+                (should_stop is not None and should_stop ())):
+                break
+
+            while not exhausted and len (inflight) < max_inflight:
+                try:
+                    (addr, port) = next (targets)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                if ipaddress.ip_address (addr).version == 6:
+                    af = socket.AF_INET6
+                else:
+                    af = socket.AF_INET
+
+                try:
+                    s = socket.socket (af, socket.SOCK_STREAM)
+                except socket.error:
+                    continue
+
+                s.setblocking (False)
+                err = s.connect_ex ((addr, port))
+                if err == 0:
+                    s.close ()
+                    yield (addr, port)
+                elif err in [errno.EINPROGRESS, errno.EWOULDBLOCK]:
+                    sel.register (s, selectors.EVENT_WRITE)
+                    inflight[s] = (addr, port, now + timeout)
+                else:
+                    s.close ()
+
+            if exhausted and not inflight:
+                break
+
+            wait = 0.05
+            if inflight:
+                wait = min (wait,
+                            max (0, min ([e for (a, p, e)
+                                          in inflight.values ()]) - now))
+
+            found = []
+            for key, events in sel.select (wait):
+                s = key.fileobj
+                (addr, port, expiry) = inflight.pop (s)
+                sel.unregister (s)
+                if s.getsockopt (socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    found.append ((addr, port))
+
+                s.close ()
+
+            now = time.time ()
+            for s, (addr, port, expiry) in list (inflight.items ()):
+                if now >= expiry:
+                    del inflight[s]
+                    sel.unregister (s)
+                    s.close ()
+
+            for result in found:
+                yield result
+    finally:
+        for s in inflight.keys ():
+            sel.unregister (s)
+            s.close ()
+
+        sel.close ()
+
+def _uri_host (address):
+    if address.find (":") != -1:
+        return "[%s]" % address
+
+    return address
+
+def run_snmp_backend (hostname, timeout=None):
+    """
+    Run the CUPS SNMP backend, pointing it at the host.
+
+    @returns: the backend's output, or None if it failed or took
+    longer than timeout seconds
+    """
+    try:
+        p = subprocess.Popen (args=["/usr/lib/cups/backend/snmp",
+                                    hostname],
+                              close_fds=True,
+                              stdin=subprocess.DEVNULL,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL)
+    except OSError as e:
+        debugprint ("snmp: no good")
+        if e.errno == errno.ENOENT:
+            return None
+
+        raise
+
+    try:
+        (stdout, stderr) = p.communicate (timeout=timeout)
+    except subprocess.TimeoutExpired:
+        debugprint ("snmp: no good (timed out)")
+        p.kill ()
+        p.communicate ()
+        return None
+
+    if p.returncode != 0:
+        debugprint ("snmp: no good (return code %d)" % p.returncode)
+        return None
+
+    try:
+        return stdout.decode ('utf-8')
+    except UnicodeDecodeError:
+        # Work-around snmp backend output encoded as iso-8859-1
+        # (despite RFC 2571).  If it's neither iso-8859-1, make a
+        # best guess by ignoring problematic bytes.
+        return stdout.decode (encoding='iso-8859-1', errors='ignore')
+
+class SNMPIdentityService:
+    """
+    Look up printer identities with the CUPS SNMP backend.
+
+    Each lookup runs in its own thread, with at most max_running
+    running at once.  Concurrent lookups for the same host share
+    one backend run, and the output is kept for ttl seconds.  A
+    failed or empty run is not kept, so the next lookup tries again.
+    """
+    def __init__ (self, ttl=300, timeout=15, max_running=8):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock ()
+        self._running = threading.Semaphore (max_running)
+        self._cache = {}
+        self._pending = {}
+        self._callbacks = {}
+
+    def _cached (self, host):
+        # Call with the lock held.
+        cached = self._cache.get (host)
+        if cached is None:
+            return (False, None)
+
+        (expiry, output) = cached
+        if expiry <= time.time ():
+            del self._cache[host]
+            return (False, None)
+
+        return (True, output)
+
+    def _start (self, host):
+        # Call with the lock held.
+        event = self._pending.get (host)
+        if event is None:
+            event = threading.Event ()
+            event.output = None
+            self._pending[host] = event
+            t = threading.Thread (target=self._run, args=(host, event))
+            t.daemon = True
+            t.start ()
+
+        return event
+
+    def _run (self, host, event):
+        output = None
+        with self._running:
+            debugprint ("snmp: querying %s" % host)
+            try:
+                output = run_snmp_backend (host, timeout=self.timeout)
+            except Exception:
+                nonfatalException ()
+
+        with self._lock:
+            if output:
+                self._cache[host] = (time.time () + self.ttl, output)
+            del self._pending[host]
+            callbacks = self._callbacks.pop (host, [])
+
+        event.output = output
+        event.set ()
+        for callback in callbacks:
+            GLib.idle_add (callback, host, output)
+
+    def lookup (self, host, reply_handler):
+        """
+        Look up a host without blocking.  reply_handler (host,
+        output) is called from the main loop when done.
+        """
+        with self._lock:
+            (found, output) = self._cached (host)
+            if not found:
+                self._callbacks.setdefault (host, []).append (reply_handler)
+                self._start (host)
+                return
+
+        GLib.idle_add (reply_handler, host, output)
+
+    def lookup_sync (self, host, timeout=None):
+        """
+        Look up a host, waiting for at most timeout seconds.
+
+        @returns: the SNMP backend output for the host, or None
+        """
+        with self._lock:
+            (found, output) = self._cached (host)
+            if found:
+                debugprint ("snmp: using cached result for %s" % host)
+                return output
+
+            event = self._start (host)
+
+        if timeout is not None and timeout <= 0:
+            return None
+
+        if not event.wait (timeout):
+            return None
+
+        return event.output
+
+    def flush (self, host=None):
+        with self._lock:
+            if host is None:
+                self._cache = {}
+            else:
+                self._cache.pop (host, None)
+
+_snmp_service = None
+def get_snmp_service ():
+    """
+    Return the SNMPIdentityService shared by everything in this
+    process, creating it if necessary.
+    """
+    global _snmp_service
+    if _snmp_service is None:
+        _snmp_service = SNMPIdentityService ()
+
+    return _snmp_service
+
 class LpdServer:
-    def __init__(self, hostname):
+    # Queue names known not to exist, per host, shared between
+    # instances so that probing the same server again is quick.
+    # Maps hostname to a dict of queue name -> expiry time.
+    _negative_cache = {}
+    _negative_cache_lock = threading.Lock ()
+    negative_cache_ttl = 300
+
+    def __init__(self, hostname, port=515):
         self.hostname = hostname
+        self.port = port
+        if port == 515:
+            self._cache_key = hostname
+        else:
+            self._cache_key = "%s:%d" % (_uri_host (hostname), port)
+
         self.max_lpt_com = 8
+        self.max_parallel = 4
         self.stop = False
 
-    def probe_queue(self,name, result):
-        s = open_socket(self.hostname, 515)
+    # Outcomes of _try_queue.
+    QUEUE_FOUND = "found"
+    QUEUE_REJECTED = "rejected"
+    QUEUE_UNREACHABLE = "unreachable"
+    QUEUE_NO_REPLY = "no-reply"
+
+    def _try_queue(self, name):
+        s = open_socket(self.hostname, self.port)
         if not s:
-            return None
+            return self.QUEUE_UNREACHABLE
         debugprint(name)
         
         try:
@@ -137,13 +448,14 @@ class LpdServer:
             data = s.recv(1024).decode('UTF-8')  # receive status
             debugprint(repr(data))
         except socket.error as msg:
+            # Perhaps just slow: this says nothing about the queue.
             debugprint(msg)
             try:
                 s.close ()
             except:
                 pass
 
-            return False
+            return self.QUEUE_NO_REPLY
 
         if len(data)>0 and ord(data[0])==0:
             try:
@@ -152,14 +464,31 @@ class LpdServer:
             except:
                 pass
 
-            result.append(name)
-            return True
+            return self.QUEUE_FOUND
 
         try:
             s.close()
         except:
             pass
 
+        if len(data)>0:
+            return self.QUEUE_REJECTED
+
+        return self.QUEUE_NO_REPLY
+
+    def probe_queue(self,name, result):
+        """
+        @returns: True if the queue exists, None if the server could
+        not be reached, otherwise False
+        """
+        outcome = self._try_queue (name)
+        if outcome == self.QUEUE_FOUND:
+            result.append(name)
+            return True
+
+        if outcome == self.QUEUE_UNREACHABLE:
+            return None
+
         return False
 
     def get_possible_queue_names (self):
@@ -178,23 +507,89 @@ class LpdServer:
         debugprint ("LpdServer exiting: destroy called")
         self.stop = True
 
-    def probe(self):
+    def _cached_negatives (self):
+        now = time.time ()
+        with self._negative_cache_lock:
+            cache = self._negative_cache.get (self._cache_key, {})
+            for name, expiry in list (cache.items ()):
+                if expiry <= now:
+                    del cache[name]
+
+            return set (cache.keys ())
+
+    def _add_negative (self, name):
+        with self._negative_cache_lock:
+            cache = self._negative_cache.setdefault (self._cache_key, {})
+            cache[name] = time.time () + self.negative_cache_ttl
+
+    def probe(self, timeout=15):
+        """
+        Look for a queue on the server, trying several candidate
+        names at once.  Stops at the first queue found, when the
+        server cannot be reached at all, or after timeout seconds.
+
+        Names that the server rejected recently are not tried again.
+        This blocks, so run it in a separate thread from the GUI.
+
+        @returns: list of queue names found
+        """
         result = []
+        deadline = time.time () + timeout
+        negatives = self._cached_negatives ()
+        candidates = []
         for name in self.get_possible_queue_names ():
-            while Gtk.events_pending ():
-                Gtk.main_iteration ()
+            if name.startswith ("pr") and name != "pr0":
+                # Only worth trying if pr0 exists, and in that
+                # case we have already found a queue.
+                continue
 
-            if self.stop:
-                break
+            if name not in negatives:
+                candidates.append (name)
 
-            found = self.probe_queue(name, result)
-            if found is None:
-                # Couldn't even connect.
-                break
+        debugprint ("lpd: probing %d queue names (%d known negative)" %
+                    (len (candidates), len (negatives)))
+        pool = ThreadPoolExecutor (max_workers=self.max_parallel)
+        pending = {}
+        for name in candidates:
+            pending[pool.submit (self._try_queue, name)] = name
 
-            if not found and name.startswith ("pr"):
-                break
-            time.sleep(0.1) # avoid DOS and following counter measures 
+        try:
+            while pending and not self.stop:
+                remaining = deadline - time.time ()
+                if remaining <= 0:
+                    break
+
+                # Wake up now and then to notice destroy().
+                (done, not_done) = concurrent.futures.wait (
+                    pending.keys (), timeout=min (remaining, 0.5),
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    name = pending.pop (f)
+                    try:
+                        outcome = f.result ()
+                    except Exception:
+                        nonfatalException ()
+                        continue
+
+                    if outcome == self.QUEUE_FOUND:
+                        result.append (name)
+                        break
+                    elif outcome == self.QUEUE_UNREACHABLE:
+                        # Couldn't even connect.
+                        self.stop = True
+                        break
+                    elif outcome == self.QUEUE_REJECTED:
+                        # Only remember what the server said; a
+                        # timeout may be transient.
+                        self._add_negative (name)
+
+                if result:
+                    break
+        finally:
+            for f in pending.keys ():
+                f.cancel ()
+
+            pool.shutdown (wait=False)
 
         return result
 
@@ -227,6 +622,12 @@ class BackgroundSmbAuthContext(pysmb.AuthContext):
         return self._do_perform_authentication_result
 
 class PrinterFinder:
+    # Ports looked at when sweeping an address range, and the
+    # protocol probe to run against each one.
+    sweep_ports = { 9100: 'jetdirect',
+                    631: 'ipp',
+                    515: 'lpd' }
+
     def __init__ (self):
         self.quit = False
 
@@ -235,6 +636,42 @@ class PrinterFinder:
         self.callback_fn = callback_fn
         self.op = TimedOperation (self._do_find, callback=lambda x, y: None)
 
+    def find_range (self, address_range, callback_fn, max_hosts=16,
+                    max_connects=256, connect_timeout=0.5,
+                    host_timeout=10, timeout=300, ports=None):
+        """
+        Search for printers on every address in a range, such as a
+        network in CIDR notation (see parse_address_range).
+
+        Addresses are first swept with asynchronous TCP connection
+        attempts (at most max_connects at once).  Hosts accepting
+        connections are then probed with SNMP, IPP and LPD, at most
+        max_hosts at a time and for no longer than host_timeout
+        seconds each, counted from when probing the host begins.
+        JetDirect ports are reported as soon as they are found.  The
+        whole search ends after timeout seconds.
+
+        As with find(), callback_fn is called with a
+        cupshelpers.Device for each device found, and with None
+        once the search has finished.
+        """
+        if isinstance (address_range, str):
+            address_range = parse_address_range (address_range)
+
+        self.addresses = address_range
+        self.callback_fn = callback_fn
+        self.max_hosts = max_hosts
+        self.max_connects = max_connects
+        self.connect_timeout = connect_timeout
+        self.host_timeout = host_timeout
+        self.timeout = timeout
+        if ports is None:
+            ports = self.sweep_ports
+
+        self.ports = ports
+        self.op = TimedOperation (self._do_find_range,
+                                  callback=lambda x, y: None)
+
     def cancel (self):
         self.op.cancel ()
         self.quit = True
@@ -259,6 +696,201 @@ class PrinterFinder:
         if not self.quit:
             self.callback_fn (None)
 
+    def _do_find_range (self):
+        self._callback_lock = threading.Lock ()
+        self._deadline = time.time () + self.timeout
+        self._hosts_lock = threading.Lock ()
+        self._hosts = {}
+        self._pool = ThreadPoolExecutor (max_workers=self.max_hosts)
+        try:
+            for (addr, port) in tcp_sweep (self.addresses,
+                                           list (self.ports.keys ()),
+                                           timeout=self.connect_timeout,
+                                           max_inflight=self.max_connects,
+                                           deadline=self._deadline,
+                                           should_stop=lambda: self.quit):
+                debugprint ("sweep: %s:%d open" % (addr, port))
+                self._sweep_found (addr, port)
+        finally:
+            self._pool.shutdown (wait=True)
+
+        # Signal that we've finished.
+        if not self.quit:
+            self.callback_fn (None)
+
+    def _sweep_found (self, addr, port):
+        proto = self.ports[port]
+        if proto == 'jetdirect':
+            # Nothing to ask the printer, so report it now.
+            self._sweep_jetdirect (addr, None, port)
+
+        with self._hosts_lock:
+            host = self._hosts.get (addr)
+            if host is None:
+                host = { 'ports': collections.deque (),
+                         'deadline': None,
+                         'snmp_done': False,
+                         'running': False }
+                self._hosts[addr] = host
+
+            if proto != 'jetdirect':
+                host['ports'].append (port)
+
+            if host['running']:
+                return
+
+            host['running'] = True
+
+        self._pool.submit (self._sweep_host, addr, host)
+
+    def _sweep_host (self, addr, host):
+        # Probe one host: SNMP, then each open port as it is found.
+        # The host's time starts now, not when the sweep found it,
+        # as it may have waited a while for a free worker.
+        if host['deadline'] is None:
+            host['deadline'] = min (self._deadline,
+                                    time.time () + self.host_timeout)
+
+            # Start the SNMP query, to collect once the ports are done.
+            get_snmp_service ().lookup_sync (addr, timeout=0)
+
+        deadline = host['deadline']
+        while True:
+            with self._hosts_lock:
+                if host['ports']:
+                    port = host['ports'].popleft ()
+                elif host['snmp_done']:
+                    host['running'] = False
+                    return
+                else:
+                    port = None
+
+            if port is None:
+                host['snmp_done'] = True
+                self._sweep_probe (self._sweep_snmp, addr, deadline)
+            else:
+                fn = getattr (self, "_sweep_" + self.ports[port])
+                self._sweep_probe (fn, addr, deadline, port)
+
+    def _sweep_probe (self, fn, addr, deadline, *args):
+        if self.quit or time.time () >= deadline:
+            return
+
+        try:
+            fn (addr, deadline, *args)
+        except Exception:
+            nonfatalException ()
+
+    def _sweep_call (self, deadline, fn, *args, **kwargs):
+        # IPP requests cannot be given a timeout, so make them from
+        # a thread of their own and stop waiting at the deadline,
+        # raising OperationCanceled.
+        t = OperationThread (target=fn, args=args, kwargs=kwargs)
+        t.start ()
+        t.join (max (0, deadline - time.time ()))
+        return t.collect_result ()
+
+    def _sweep_device (self, uri, **device_dict):
+        device_dict.setdefault ('device-class', 'network')
+        device = cupshelpers.Device (uri, **device_dict)
+        debugprint ("Device found: %s" % uri)
+        with self._callback_lock:
+            if not self.quit:
+                self.callback_fn (device)
+
+    def _sweep_jetdirect (self, addr, deadline, port):
+        uri = "socket://%s:%d" % (_uri_host (addr), port)
+        self._sweep_device (uri, **{'device-info':
+                                    "JetDirect (%s)" % addr})
+
+    def _sweep_snmp (self, addr, deadline):
+        stdout = get_snmp_service ().lookup_sync (addr,
+                                                  timeout=deadline -
+                                                  time.time ())
+        if self.quit:
+            return
+
+        if stdout is None:
+            return
+
+        for (uri, device_dict) in self._parse_snmp_output (stdout):
+            self._sweep_device (uri, **device_dict)
+
+    def _sweep_lpd (self, addr, deadline, port):
+        lpd = LpdServer (addr, port)
+
+        for name in lpd.get_possible_queue_names ():
+            if self.quit or time.time () >= deadline:
+                return
+
+            found = lpd.probe_queue (name, [])
+            if found is None:
+                return
+
+            if found:
+                if port == 515:
+                    uri = "lpd://%s/%s" % (_uri_host (addr), name)
+                else:
+                    uri = "lpd://%s:%d/%s" % (_uri_host (addr), port, name)
+                self._sweep_device (uri, **{'device-info':
+                                            "LPD (%s)" % addr})
+                return
+
+            if name.startswith ("pr"):
+                return
+
+            time.sleep(0.1) # avoid DOS and following counter measures
+
+    def _sweep_ipp (self, addr, deadline, port):
+        if addr in ['127.0.0.1', '::1']:
+            debugprint ("ipp: do not probe local cups server")
+            return
+
+        try:
+            c = self._sweep_call (deadline, cups.Connection,
+                                  host=addr, port=port)
+            printers = self._sweep_call (deadline, c.getPrinters)
+        except RuntimeError:
+            # Includes OperationCanceled: out of time.
+            return
+        except cups.IPPError:
+            printers = None
+
+        if printers:
+            for name, queue in printers.items ():
+                self._sweep_device (queue['printer-uri-supported'],
+                                    **{'device-info': queue['printer-info'],
+                                       'device-location':
+                                       queue['printer-location']})
+            return
+
+        if self.quit or time.time () >= deadline:
+            return
+
+        uri = "ipp://%s:%d/ipp/print" % (_uri_host (addr), port)
+        device_dict = { 'device-info': "IPP (%s)" % addr }
+        try:
+            attrs = self._sweep_call (deadline, c.getPrinterAttributes,
+                                      uri=uri,
+                                      requested_attributes=
+                                      ['printer-make-and-model',
+                                       'printer-location',
+                                       'printer-device-id'])
+        except OperationCanceled:
+            return
+        except cups.IPPError:
+            attrs = {}
+
+        if 'printer-make-and-model' in attrs:
+            device_dict['device-make-and-model'] = \
+                attrs['printer-make-and-model']
+        if 'printer-location' in attrs:
+            device_dict['device-location'] = attrs['printer-location']
+        if 'printer-device-id' in attrs:
+            device_dict['device-id'] = attrs['printer-device-id']
+
+        self._sweep_device (uri, **device_dict)
+
     def _new_device (self, uri, info, location = None):
         device_dict = { 'device-class': 'network',
                         'device-info': "%s" % info }
@@ -269,33 +901,9 @@ class PrinterFinder:
         debugprint ("Device found: %s" % uri)
         self.callback_fn (new_device)
 
-    def _probe_snmp (self):
-        # Run the CUPS SNMP backend, pointing it at the host.
-        try:
-            debugprint ("snmp: trying")
-            p = subprocess.Popen (args=["/usr/lib/cups/backend/snmp",
-                                        self.hostname],
-                                  close_fds=True,
-                                  stdin=subprocess.DEVNULL,
-                                  stdout=subprocess.PIPE,
-                                  stderr=subprocess.DEVNULL)
-        except OSError as e:
-            debugprint ("snmp: no good")
-            if e.errno == errno.ENOENT:
-                return
-
-            raise
-
-        (stdout, stderr) = p.communicate ()
-        if p.returncode != 0:
-            debugprint ("snmp: no good (return code %d)" % p.returncode)
-            return
-
-        if self.quit:
-            debugprint ("snmp: no good")
-            return
-
-        for line in stdout.decode ().split ('\n'):
+    def _parse_snmp_output (self, stdout):
+        devices = []
+        for line in stdout.split ('\n'):
             words = wordsep (line)
             n = len (words)
             if n == 6:
@@ -318,14 +926,28 @@ class PrinterFinder:
             if n == 6:
                 device_dict['device-location'] = device_location
 
+            devices.append ((uri, device_dict))
+
+        return devices
+
+    def _probe_snmp (self):
+        debugprint ("snmp: trying")
+        stdout = get_snmp_service ().lookup_sync (self.hostname)
+        if stdout is None or self.quit:
+            debugprint ("snmp: no good")
+            return
+
+        for (uri, device_dict) in self._parse_snmp_output (stdout):
             device = cupshelpers.Device (uri, **device_dict)
             debugprint ("Device found: %s" % uri)
             self.callback_fn (device)
 
             # Cache the make and model for use by other search methods
             # that are not able to determine it.
-            self._cached_attributes['device-make-and-model'] = make_and_model
-            self._cached_attributes['device_id'] = device_id
+            self._cached_attributes['device-make-and-model'] = \
+                device_dict['device-make-and-model']
+            self._cached_attributes['device_id'] = \
+                device_dict.get ('device-id')
 
         debugprint ("snmp: done")
 
@@ -510,5 +1132,17 @@ if __name__ == '__main__':
 
     addr = sys.argv[1]
     p = PrinterFinder ()
-    p.find (addr, display)
+    is_range = False
+    if addr.find ("/") != -1 or addr.find ("-") != -1:
+        # Host names may contain hyphens too.
+        try:
+            parse_address_range (addr)
+            is_range = True
+        except ValueError:
+            pass
+
+    if is_range:
+        p.find_range (addr, display)
+    else:
+        p.find (addr, display)
     loop.run ()
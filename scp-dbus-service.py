@@ -24,11 +24,13 @@ import gi
 import dbus.service
 from gi.repository import GObject
 from gi.repository import GLib
+from gi.repository import Gio
 gi.require_version('Gdk', '3.0')
 from gi.repository import Gdk
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 import sys
+import time
 
 from debug import *
 import asyncconn
@@ -55,6 +57,12 @@ CONFIG_JOBVIEWER_IFACE=CONFIG_IFACE + ".JobViewer"
 g_ppds = None
 g_killtimer = None
 
+# Directories that driver packages install PPDs and PPD-generating
+# drivers into.  Watched in resident mode to keep the PPDs fresh.
+DRIVER_DIRS=[cupshelpers.config.cupsserverbindir + "/driver",
+             "/usr/share/cups/model",
+             "/usr/share/ppd"]
+
 #set program name
 GLib.set_prgname("system-config-printer")
 
@@ -65,11 +73,13 @@ class FetchedPPDs(GObject.GObject):
                   (GObject.TYPE_PYOBJECT,))
         }
 
-    def __init__ (self, cupsconn, language):
+    def __init__ (self, cupsconn, language, preload=False):
         GObject.GObject.__init__ (self)
         self._cupsconn = cupsconn
         self._language = language
+        self._preload = preload
         self._ppds = None
+        self._refreshing = False
 
     def is_ready (self):
         return self._ppds is not None
@@ -83,15 +93,113 @@ class FetchedPPDs(GObject.GObject):
         self._cupsconn.getPPDs2 (reply_handler=self._cups_getppds_reply,
                                  error_handler=self._cups_error)
 
+    def refresh (self):
+        """
+        Fetch the PPDs again, carrying on answering requests from
+        the current list until the new one is ready.
+        """
+        if not self.is_ready ():
+            # Already fetching.
+            return
+
+        if self._refreshing:
+            return
+
+        debugprint ("FetchPPDs: refreshing")
+        self._refreshing = True
+        self._cupsconn.getPPDs2 (reply_handler=self._cups_getppds_reply,
+                                 error_handler=self._cups_refresh_error)
+
     def _cups_error (self, conn, exc):
         debugprint ("FetchPPDs: error: %s" % repr (exc))
+        self._refreshing = False
         self.emit ('error', exc)
 
+    def _cups_refresh_error (self, conn, exc):
+        # Keep using the PPDs we already have.
+        debugprint ("FetchPPDs: refresh error: %s" % repr (exc))
+        self._refreshing = False
+
     def _cups_getppds_reply (self, conn, result):
         debugprint ("FetchPPDs: success")
-        self._ppds = cupshelpers.ppds.PPDs (result, language=self._language)
+        ppds = cupshelpers.ppds.PPDs (result, language=self._language)
+        if self._preload:
+            ppds.buildIndexes ()
+
+        self._ppds = ppds
+        self._refreshing = False
         self.emit ('ready')
 
+class DriverChangeMonitor:
+    """
+    Refresh the fetched PPDs when driver files are added or
+    removed.  Changes are collected for a few seconds first, as
+    package installation touches many files at once.
+    """
+    def __init__ (self, fetchedppds, dirs=DRIVER_DIRS, delay=5):
+        self._fetchedppds = fetchedppds
+        self._delay = delay
+        self._source = None
+        self._monitors = []
+        for path in dirs:
+            try:
+                gfile = Gio.File.new_for_path (path)
+                monitor = gfile.monitor_directory (Gio.FileMonitorFlags.NONE,
+                                                   None)
+            except GLib.GError as e:
+                debugprint ("Not monitoring %s: %s" % (path, repr (e)))
+                continue
+
+            monitor.connect ('changed', self._changed)
+            self._monitors.append (monitor)
+
+    def _changed (self, monitor, gfile, other_file, event_type):
+        debugprint ("Driver change: %s" % gfile.get_path ())
+        if self._source is not None:
+            GLib.source_remove (self._source)
+
+        self._source = GLib.timeout_add_seconds (self._delay, self._refresh)
+
+    def _refresh (self):
+        self._source = None
+        self._fetchedppds.refresh ()
+        return False
+
+    def destroy (self):
+        if self._source is not None:
+            GLib.source_remove (self._source)
+            self._source = None
+
+        for monitor in self._monitors:
+            monitor.cancel ()
+
+        self._monitors = []
+
+class LatencyHistogram:
+    """
+    Count how many calls took at most each of a fixed set of
+    durations (in seconds).
+    """
+    bounds = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+    def __init__ (self):
+        self.counts = [0] * (len (self.bounds) + 1)
+
+    def add (self, seconds):
+        for i, bound in enumerate (self.bounds):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+
+        self.counts[-1] += 1
+
+    def get (self):
+        """
+        @returns: list of (upper bound, count) pairs, the last
+        bound being infinity
+        """
+        return list (zip (self.bounds + [float ('inf')], self.counts))
+
 class GetBestDriversRequest:
     def __init__ (self, device_id, device_make_and_model, device_uri,
                   cupsconn, language, reply_handler, error_handler):
@@ -473,8 +581,26 @@ class ConfigPrinting(dbus.service.Object):
         self._language = locale.getlocale (locale.LC_MESSAGES)[0]
         if not self._language:
             self._language = locale.getlocale (locale.LC_CTYPE)[0]
+        self._get_best_drivers_latency = LatencyHistogram ()
+        self._driver_monitor = None
+
+    def preload (self):
+        """
+        Fetch the PPDs and build their lookup tables now, and keep
+        them up to date as drivers are installed or removed.
+        """
+        global g_ppds
+        if g_ppds is None:
+            g_ppds = FetchedPPDs (self._cupsconn, self._language,
+                                  preload=True)
+            g_ppds.run ()
+
+        self._driver_monitor = DriverChangeMonitor (g_ppds)
 
     def destroy (self):
+        if self._driver_monitor:
+            self._driver_monitor.destroy ()
+
         self._cupsconn.destroy ()
 
     @dbus.service.method(dbus_interface=CONFIG_IFACE,
@@ -512,9 +638,21 @@ class ConfigPrinting(dbus.service.Object):
                          async_callbacks=('reply_handler', 'error_handler'))
     def GetBestDrivers(self, device_id, device_make_and_model, device_uri,
                    reply_handler, error_handler):
+        start = time.time ()
+        def timed (handler):
+            def fn (*args):
+                self._get_best_drivers_latency.add (time.time () - start)
+                handler (*args)
+            return fn
+
         GetBestDriversRequest (device_id, device_make_and_model, device_uri,
                                self._cupsconn, self._language,
-                               reply_handler, error_handler)
+                               timed (reply_handler), timed (error_handler))
+
+    @dbus.service.method(dbus_interface=CONFIG_IFACE,
+                         in_signature='', out_signature='a(du)')
+    def GetBestDriversLatency(self):
+        return self._get_best_drivers_latency.get ()
 
     @dbus.service.method(dbus_interface=CONFIG_IFACE,
                          in_signature='s', out_signature='as')
@@ -584,6 +722,7 @@ if __name__ == '__main__':
     DBusGMainLoop (set_as_default=True)
 
     client_demo = False
+    resident = False
     if len (sys.argv) > 1:
         for opt in sys.argv[1:]:
             if opt == "--debug":
@@ -591,14 +730,24 @@ if __name__ == '__main__':
                 cupshelpers.set_debugprint_fn (debugprint)
             elif opt == "--client":
                 client_demo = True
+            elif opt == "--resident":
+                resident = True
 
     if client_demo:
         _client_demo ()
         sys.exit (0)
 
     debugprint ("Service running...")
-    g_killtimer = killtimer.KillTimer (killfunc=Gtk.main_quit)
+    if resident:
+        # Stay running, with the PPDs ready for the next request.
+        g_killtimer = killtimer.KillTimer (timeout=None)
+    else:
+        g_killtimer = killtimer.KillTimer (killfunc=Gtk.main_quit)
+
     cp = ConfigPrinting ()
+    if resident:
+        cp.preload ()
+
     Gdk.threads_enter ()
     Gtk.main ()
     Gdk.threads_leave ()
@@ -113,6 +113,18 @@ def CUPS_server_hostname ():
         return 'localhost'
     return host
 
+def delete_queues (connection, names):
+    """
+    Delete several queues, attempting every one even if some fail.
+
+    @raise cups.IPPError: IPP error from the first failing deletion
+    """
+    try:
+        cupshelpers.runBatch (connection,
+                              [("deletePrinter", (name,)) for name in names])
+    except cupshelpers.BatchError as e:
+        raise e.errors[0]
+
 class ServiceStart:
 
     def _get_iface (self, iface):
@@ -1716,15 +1728,19 @@ class GUI(GtkGUI):
         if result != Gtk.ResponseType.ACCEPT:
             return
 
+        # Attempt every deletion, and report the first failure.
+        self.cups._begin_operation (_("deleting printer %s") %
+                                    ", ".join (to_delete))
         try:
-            for name in to_delete:
-                self.cups._begin_operation (_("deleting printer %s") % name)
-                self.cups.deletePrinter (name)
-                self.cups._end_operation ()
+            delete_queues (self.cups, to_delete)
         except cups.IPPError as e:
             (e, msg) = e.args
-            self.cups._end_operation ()
             show_IPP_Error(e, msg, self.PrintersWindow)
+        except:
+            self.cups._end_operation ()
+            raise
+
+        self.cups._end_operation ()
 
         self.monitor.update ()
 
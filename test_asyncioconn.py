@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import asyncio
+import pytest
+import threading
+try:
+    import cups
+    import asyncioconn
+except ImportError:
+    cups = None
+
+class FakeConnection:
+    """Replies from another thread, the way asyncconn does."""
+    def __init__ (self, results):
+        self.results = results
+        self.destroyed = False
+
+    def __getattr__ (self, fname):
+        def method (*args, reply_handler=None, error_handler=None, **kwds):
+            result = self.results[fname]
+            def reply ():
+                if isinstance (result, Exception):
+                    error_handler (self, result)
+                else:
+                    reply_handler (self, result)
+
+            threading.Timer (0.01, reply).start ()
+
+        return method
+
+    def destroy (self):
+        self.destroyed = True
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_gather ():
+    fake = FakeConnection ({'getPrinters': {'p': {}},
+                            'getDevices': {'usb://x': {}}})
+    conn = asyncioconn.Connection (conn=fake)
+
+    async def main ():
+        return await asyncio.gather (conn.getPrinters (), conn.getDevices ())
+
+    assert asyncio.run (main ()) == [{'p': {}}, {'usb://x': {}}]
+    conn.destroy ()
+    assert fake.destroyed
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_error ():
+    exc = RuntimeError ("failed")
+    conn = asyncioconn.Connection (conn=FakeConnection ({'getJobs': exc}))
+    with pytest.raises (RuntimeError):
+        asyncio.run (conn.getJobs (which_jobs='all'))
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+import threading
+import time
+try:
+    import cups
+    import asyncipp
+    from gi.repository import GLib
+except ImportError:
+    asyncipp = None
+
+pytestmark = pytest.mark.skipif (asyncipp is None,
+                                 reason="asyncipp not available")
+
+class FakeConnection:
+    """Stands in for cups.Connection; getPrinters waits to be released."""
+    calls = []
+    release = None
+    barrier = None
+
+    def __init__ (self, host=None, port=None, encryption=None):
+        pass
+
+    def getPrinters (self, name=None):
+        FakeConnection.calls.append (name)
+        if FakeConnection.barrier is not None:
+            FakeConnection.barrier.wait (timeout=5)
+        if FakeConnection.release is not None:
+            FakeConnection.release.wait (timeout=5)
+        return { name: {} }
+
+    def adminGetServerSettings (self):
+        return {}
+
+def make_pool (monkeypatch, workers):
+    FakeConnection.calls = []
+    FakeConnection.release = None
+    FakeConnection.barrier = None
+    monkeypatch.setattr (asyncipp.cups, 'Connection', FakeConnection)
+    monkeypatch.setattr (asyncipp, '_cups_methods', None)
+    return asyncipp.IPPWorkerPool (workers=workers, host="localhost",
+                                   port=631, encryption=0)
+
+def iterate (until, timeout=5):
+    # Run the main loop until a condition holds.
+    context = GLib.MainContext.default ()
+    deadline = time.time () + timeout
+    while not until () and time.time () < deadline:
+        context.iteration (False)
+        time.sleep (0.01)
+
+def test_concurrent (monkeypatch):
+    pool = make_pool (monkeypatch, 2)
+    FakeConnection.barrier = threading.Barrier (2)
+    replies = []
+    conn = asyncipp.PooledIPPConnection (
+        pool=pool, reply_handler=lambda c, result: replies.append (result))
+    conn.getPrinters ("a")
+    conn.getPrinters ("b")
+
+    # Neither can finish unless both are running at once.
+    iterate (lambda: len (replies) == 2)
+    assert sorted (replies, key=list) == [{ "a": {} }, { "b": {} }]
+    pool.destroy ()
+
+def test_priority (monkeypatch):
+    pool = make_pool (monkeypatch, 1)
+    FakeConnection.release = threading.Event ()
+    replies = []
+    conn = asyncipp.PooledIPPConnection (
+        pool=pool, reply_handler=lambda c, result: replies.append (result))
+    conn.getPrinters ("first")
+    iterate (lambda: FakeConnection.calls == ["first"])
+    conn.getPrinters ("bulk", priority=asyncipp.PRIORITY_BULK)
+    conn.getPrinters ("interactive", priority=asyncipp.PRIORITY_INTERACTIVE)
+    FakeConnection.release.set ()
+    iterate (lambda: len (replies) == 3)
+    assert FakeConnection.calls == ["first", "interactive", "bulk"]
+    pool.destroy ()
+
+def test_cancel (monkeypatch):
+    pool = make_pool (monkeypatch, 1)
+    FakeConnection.release = threading.Event ()
+    replies = []
+    conn = asyncipp.PooledIPPConnection (
+        pool=pool, reply_handler=lambda c, result: replies.append (result))
+    conn.getPrinters ("running")
+    iterate (lambda: FakeConnection.calls == ["running"])
+    conn.getPrinters ("queued")
+    conn.cancel ()
+    FakeConnection.release.set ()
+
+    # Another connection's work is still done.
+    others = []
+    other = asyncipp.PooledIPPConnection (
+        pool=pool, reply_handler=lambda c, result: others.append (result))
+    other.getPrinters ("other")
+    iterate (lambda: others)
+    assert FakeConnection.calls == ["running", "other"]
+    assert replies == []
+    pool.destroy ()
+
+def test_cancel_before_auth_prompt (monkeypatch):
+    pool = make_pool (monkeypatch, 1)
+    prompts = []
+    passwords = []
+    requests = []
+    ready = threading.Event ()
+
+    def needs_auth (c):
+        ready.wait (timeout=5)
+        passwords.append (requests[0].auth ("Password:"))
+
+    # The request is cancelled after auth() decides to prompt but
+    # before the prompt is shown.
+    idle_add = GLib.idle_add
+    def cancel_first (fn, *args):
+        if fn.__name__ == 'prompt_auth':
+            requests[0].cancel ()
+        return idle_add (fn, *args)
+
+    monkeypatch.setattr (asyncipp.GLib, 'idle_add', cancel_first)
+    conn = asyncipp.PooledIPPConnection (
+        pool=pool, auth_handler=lambda *args: prompts.append (args))
+    requests.append (conn.call (needs_auth))
+    ready.set ()
+
+    # The worker is not left waiting for a password.
+    iterate (lambda: passwords)
+    iterate (lambda: False, timeout=0.1)
+    assert passwords == [""]
+    assert prompts == []
+    pool.destroy ()
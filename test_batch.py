@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import importlib.util
+import os.path
+import pytest
+try:
+    import cups
+    import cupshelpers
+except ImportError:
+    cupshelpers = None
+
+pytestmark = pytest.mark.skipif (cupshelpers is None,
+                                 reason="cups module not available")
+
+class FakeConnection:
+    """
+    Stands in for cups.Connection.  Deleting a printer named in
+    'fail' raises the IPP error given for it.
+    """
+    def __init__ (self, fail=None):
+        self.calls = []
+        self.fail = fail or {}
+
+    def deletePrinter (self, name):
+        self.calls.append (name)
+        if name in self.fail:
+            raise cups.IPPError (self.fail[name], "can't delete %s" % name)
+
+        return name
+
+def test_run_batch ():
+    conn = FakeConnection ()
+    assert cupshelpers.runBatch (conn, [("deletePrinter", ("a",)),
+                                        ("deletePrinter", (),
+                                         { 'name': "b" })]) == ["a", "b"]
+    assert conn.calls == ["a", "b"]
+
+def test_batch_error ():
+    conn = FakeConnection (fail={ "b": cups.IPP_NOT_FOUND,
+                                  "c": cups.IPP_NOT_POSSIBLE })
+    with pytest.raises (cupshelpers.BatchError) as e:
+        cupshelpers.runBatch (conn, [("deletePrinter", (name,))
+                                     for name in "abcd"])
+
+    # Every operation was attempted, and one error raised for them.
+    assert conn.calls == ["a", "b", "c", "d"]
+    assert [result for (result, exc) in e.value.results] == \
+        ["a", None, None, "d"]
+    assert [exc.args[0] for exc in e.value.errors] == \
+        [cups.IPP_NOT_FOUND, cups.IPP_NOT_POSSIBLE]
+
+def test_stop_on_error ():
+    conn = FakeConnection (fail={ "b": cups.IPP_NOT_FOUND })
+    with pytest.raises (cups.IPPError) as e:
+        cupshelpers.runBatch (conn, [("deletePrinter", (name,))
+                                     for name in "abc"],
+                              stop_on_error=True)
+
+    assert e.value.args[0] == cups.IPP_NOT_FOUND
+    assert conn.calls == ["a", "b"]
+
+def test_resume_after_authentication ():
+    try:
+        import asyncipp
+    except ImportError:
+        pytest.skip ("asyncipp not available")
+
+    conn = FakeConnection (fail={ "b": cups.IPP_NOT_AUTHORIZED,
+                                  "c": cups.IPP_NOT_FOUND })
+    operations = [("deletePrinter", (name,)) for name in "abcd"]
+    done = []
+
+    # An authentication failure stops the batch...
+    with pytest.raises (cups.IPPError) as e:
+        asyncipp._run_batch (conn, operations, done)
+
+    assert e.value.args[0] == cups.IPP_NOT_AUTHORIZED
+    assert conn.calls == ["a", "b"]
+    assert done == [("a", None)]
+
+    # ...and once authenticated it carries on from the failed
+    # operation, without repeating those that had finished.
+    del conn.fail["b"]
+    with pytest.raises (cupshelpers.BatchError) as e:
+        asyncipp._run_batch (conn, operations, done)
+
+    assert conn.calls == ["a", "b", "b", "c", "d"]
+    assert [result for (result, exc) in e.value.results] == \
+        ["a", "b", None, "d"]
+    assert e.value.errors[0].args[0] == cups.IPP_NOT_FOUND
+
+def test_delete_queues ():
+    try:
+        spec = importlib.util.spec_from_file_location (
+            'system_config_printer',
+            os.path.join (os.path.dirname (__file__),
+                          'system-config-printer.py'))
+        scp = importlib.util.module_from_spec (spec)
+        spec.loader.exec_module (scp)
+    except ImportError:
+        pytest.skip ("system-config-printer not available")
+
+    # The first failure is the one reported.
+    conn = FakeConnection (fail={ "b": cups.IPP_NOT_FOUND,
+                                  "c": cups.IPP_NOT_POSSIBLE })
+    with pytest.raises (cups.IPPError) as e:
+        scp.delete_queues (conn, ["a", "b", "c", "d"])
+
+    assert e.value.args == (cups.IPP_NOT_FOUND, "can't delete b")
+    assert conn.calls == ["a", "b", "c", "d"]
+
+    conn = FakeConnection ()
+    scp.delete_queues (conn, ["a"])
+    assert conn.calls == ["a"]
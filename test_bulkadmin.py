@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+try:
+    import cups
+    from cupshelpers import bulkadmin
+except ImportError:
+    cups = None
+
+PRINTERS = { 'lab-1': {}, 'lab-2': {}, 'office': {}, 'spare': {} }
+CLASSES = { 'floor2': ['office', 'spare'],
+            'remote': 'ipp://server/classes/remote' }
+
+class FakeConnection:
+    def __init__ (self, calls, fail):
+        self.calls = calls
+        self.fail = fail
+
+    def __getattr__ (self, fname):
+        def method (*args, **kwds):
+            self.calls.append ((fname, args, kwds))
+            if args[0] in self.fail:
+                raise cups.IPPError (0, 'failed')
+
+        return method
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_selector ():
+    select = lambda **kw: bulkadmin.QueueSelector (**kw).select (PRINTERS,
+                                                                 CLASSES)
+    assert select () == ['lab-1', 'lab-2', 'office', 'spare']
+    assert select (pattern='lab-.') == ['lab-1', 'lab-2']
+    assert select (pattern='lab') == []
+    assert select (names=['spare'], classes=['floor2', 'remote']) == \
+        ['office', 'spare']
+    assert select (names=['missing']) == []
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_run ():
+    calls = []
+    admin = bulkadmin.BulkAdmin (host='localhost', port=631, encryption=0,
+                                 workers=2)
+    admin._connect = lambda: FakeConnection (calls, ['lab-2'])
+    actions = [bulkadmin.disable ('maintenance'), bulkadmin.reject ()]
+
+    planned = list (admin.run (['lab-1', 'lab-2'], actions, dry_run=True))
+    assert [r.queue for r in planned] == ['lab-1', 'lab-2']
+    assert calls == []
+
+    results = { r.queue: r for r in admin.run (['lab-1', 'lab-2'], actions) }
+    assert results['lab-1'].succeeded ()
+    assert [action for (action, exc) in results['lab-2'].errors] == actions
+    assert ('disablePrinter', ('lab-1',), {'reason': 'maintenance'}) in calls
+    assert ('rejectJobs', ('lab-1',), {}) in calls
+    assert len (calls) == 4
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+try:
+    import dbus
+    import dnssdresolve
+except ImportError:
+    dnssdresolve = None
+
+pytestmark = pytest.mark.skipif (dnssdresolve is None,
+                                 reason="dnssdresolve not available")
+
+class FakeBackend:
+    """Holds on to each request until the test answers it."""
+    def __init__ (self):
+        self.pending = []
+        self.requests = []
+
+    def resolve (self, name, stype, domain, reply_handler, error_handler):
+        self.requests.append (name)
+        self.pending.append ((name, reply_handler, error_handler))
+
+    def answer (self, name, host=None, address=None):
+        for request in self.pending:
+            if request[0] == name:
+                self.pending.remove (request)
+                if host is None:
+                    request[2] (RuntimeError ("no such service"))
+                else:
+                    request[1] (host, address)
+                return
+
+        raise KeyError (name)
+
+def test_coalesce ():
+    backend = FakeBackend ()
+    resolver = dnssdresolve.DNSSDServiceResolver (backend=backend)
+    answers = []
+    for n in range (3):
+        resolver.resolve ("a", "_ipp._tcp", "local",
+                          lambda host, address, n=n:
+                              answers.append ((n, host, address)))
+
+    # One request answers every waiter.
+    assert backend.requests == ["a"]
+    backend.answer ("a", "a.local", "10.0.0.1")
+    assert answers == [(0, "a.local", "10.0.0.1"),
+                       (1, "a.local", "10.0.0.1"),
+                       (2, "a.local", "10.0.0.1")]
+
+def test_cache (monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr (dnssdresolve.time, 'time', lambda: now[0])
+    backend = FakeBackend ()
+    resolver = dnssdresolve.DNSSDServiceResolver (backend=backend, ttl=60)
+    answers = []
+    callback = lambda host, address: answers.append ((host, address))
+    resolver.resolve ("a", "_ipp._tcp", "local", callback)
+    backend.answer ("a", "a.local", "10.0.0.1")
+
+    # A cached answer is given straight away, before resolve returns.
+    resolver.resolve ("a", "_ipp._tcp", "local", callback)
+    assert answers == [("a.local", "10.0.0.1")] * 2
+    assert backend.requests == ["a"]
+
+    # Once it expires the service is resolved again.
+    now[0] += 61
+    resolver.resolve ("a", "_ipp._tcp", "local", callback)
+    assert backend.requests == ["a", "a"]
+    assert len (answers) == 2
+
+def test_errors_not_cached ():
+    backend = FakeBackend ()
+    resolver = dnssdresolve.DNSSDServiceResolver (backend=backend)
+    answers = []
+    callback = lambda host, address: answers.append ((host, address))
+    resolver.resolve ("a", "_ipp._tcp", "local", callback)
+    backend.answer ("a")
+    assert answers == [(None, None)]
+    resolver.resolve ("a", "_ipp._tcp", "local", callback)
+    assert backend.requests == ["a", "a"]
+
+def test_max_inflight ():
+    backend = FakeBackend ()
+    resolver = dnssdresolve.DNSSDServiceResolver (backend=backend,
+                                                  max_inflight=2)
+    answers = []
+    for name in "abcd":
+        resolver.resolve (name, "_ipp._tcp", "local",
+                          lambda host, address: answers.append (host))
+
+    assert backend.requests == ["a", "b"]
+
+    # Each answer, or failure, lets another request start.
+    backend.answer ("b", "b.local", "10.0.0.2")
+    assert backend.requests == ["a", "b", "c"]
+    backend.answer ("a")
+    assert backend.requests == ["a", "b", "c", "d"]
+    backend.answer ("c", "c.local", "10.0.0.3")
+    backend.answer ("d", "d.local", "10.0.0.4")
+    assert answers == ["b.local", None, "c.local", "d.local"]
+    assert backend.pending == []
+
+def test_host_names ():
+    class Device:
+        pass
+
+    backend = FakeBackend ()
+    resolver = dnssdresolve.DNSSDServiceResolver (backend=backend)
+    resolver.resolve ("Printer", "_ipp._tcp", "local", lambda *args: None)
+    backend.answer ("Printer", "printer.local", "10.0.0.5")
+
+    # Resolved from the cache, so done before resolve returns.
+    uri = "dnssd://Printer._ipp._tcp.local/"
+    devices = { uri: Device (), "socket://10.0.0.6": Device () }
+    replies = []
+    names = dnssdresolve.DNSSDHostNamesResolver (devices, resolver=resolver)
+    names.resolve (reply_handler=replies.append)
+    assert len (replies) == 1
+    assert replies[0][uri].hostname == "printer"
+    assert replies[0][uri].address == "10.0.0.5"
+    assert backend.requests == ["Printer"]
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import http.server
+import os
+import pytest
+import re
+import socketserver
+import threading
+try:
+    import cups
+    from troubleshoot import ErrorLogFetch
+except ImportError:
+    ErrorLogFetch = None
+
+pytestmark = pytest.mark.skipif (ErrorLogFetch is None,
+                                 reason="troubleshooter not available")
+
+OLD = b"I [19/Oct/2026:10:00:00 +0000] old entry\n"
+NEW = b"E [19/Oct/2026:10:05:00 +0000] new entry\n"
+
+class LogServer:
+    """
+    Serves an error log the way cupsd does: only with the right
+    credentials, and honouring Range requests unless told not to.
+    """
+    def __init__ (self, tmp_path, log, authorization, ranges=True):
+        self.log = log
+        self.requests = []
+        self.fetched = []
+        server = self
+
+        class Handler (http.server.BaseHTTPRequestHandler):
+            def log_message (self, *args):
+                pass
+
+            def address_string (self):
+                return "localhost"
+
+            def do_HEAD (self):
+                self.reply (head=True)
+
+            def do_GET (self):
+                self.reply ()
+
+            def reply (self, head=False):
+                server.requests.append ((self.command,
+                                         self.headers.get ('Range')))
+                if self.headers.get ('Authorization') != authorization:
+                    self.send_response (401)
+                    self.send_header ('Content-Length', '0')
+                    self.end_headers ()
+                    return
+
+                body = server.log
+                status = 200
+                match = re.match (r'bytes=(\d+)-$',
+                                  self.headers.get ('Range', ''))
+                if ranges and match:
+                    start = int (match.group (1))
+                    if start >= len (body):
+                        self.send_response (416)
+                        self.send_header ('Content-Length', '0')
+                        self.end_headers ()
+                        return
+
+                    body = body[start:]
+                    status = 206
+
+                self.send_response (status)
+                self.send_header ('Content-Length', str (len (body)))
+                self.end_headers ()
+                if not head:
+                    self.wfile.write (body)
+
+        self.path = str (tmp_path / "cups.sock")
+        self.httpd = socketserver.ThreadingUnixStreamServer (self.path,
+                                                             Handler)
+        thread = threading.Thread (target=self.httpd.serve_forever,
+                                   daemon=True)
+        thread.start ()
+
+    def close (self):
+        self.httpd.shutdown ()
+        self.httpd.server_close ()
+
+class Connection:
+    """Stands in for an authconn.Connection on the domain socket."""
+    def __init__ (self, server, password=''):
+        self._server = server.path
+        self._port = 631
+        self._encryption = cups.HTTP_ENCRYPT_IF_REQUESTED
+        self._use_user = 'alice'
+        self._use_password = password
+        self._log_server = server
+
+    def getFile (self, resource, fd=None):
+        self._log_server.fetched.append (resource)
+        os.write (fd, self._log_server.log)
+
+@pytest.fixture
+def serve (tmp_path):
+    servers = []
+    def serve (log, authorization='PeerCred alice', ranges=True):
+        server = LogServer (tmp_path, log, authorization, ranges=ranges)
+        servers.append (server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.close ()
+
+def test_log_tail ():
+    tail = ErrorLogFetch._LogTail (4)
+    for data in [b"ab", b"cdef", b"gh"]:
+        tail.feed (data)
+    assert not tail.rotated ()
+    assert tail.data () == b"efgh"
+
+    tail = ErrorLogFetch._LogTail (4)
+    tail.skip (4)
+    tail.feed (b"ef")
+    assert tail.data () == b"ef"
+
+    # Shorter than before: the whole of the new log is wanted.
+    tail = ErrorLogFetch._LogTail (10)
+    tail.feed (b"abc")
+    assert tail.rotated ()
+    assert tail.data () == b"abc"
+
+def test_partial_content (serve):
+    server = serve (OLD + NEW)
+    lines = ErrorLogFetch.fetch_error_log_tail (Connection (server), len (OLD))
+    assert lines == [NEW.decode ().strip ()]
+    assert server.requests == [('GET', 'bytes=%d-' % len (OLD))]
+    assert server.fetched == []
+    assert ErrorLogFetch.error_log_size (Connection (server)) == \
+        len (OLD + NEW)
+
+def test_whole_log (serve):
+    # The server ignores the Range header.
+    server = serve (OLD + NEW, ranges=False)
+    lines = ErrorLogFetch.fetch_error_log_tail (Connection (server), len (OLD))
+    assert lines == [NEW.decode ().strip ()]
+    assert server.fetched == []
+
+def test_basic_auth (serve):
+    server = serve (OLD + NEW, authorization='Basic YWxpY2U6c2VjcmV0')
+    lines = ErrorLogFetch.fetch_error_log_tail (Connection (server,
+                                                            password='secret'),
+                                                len (OLD))
+    assert lines == [NEW.decode ().strip ()]
+    assert server.fetched == []
+
+def test_unauthorized (serve):
+    # Falls back to fetching all of it with getFile.
+    server = serve (OLD + NEW, authorization='PeerCred root')
+    lines = ErrorLogFetch.fetch_error_log_tail (Connection (server), len (OLD))
+    assert lines == [NEW.decode ().strip ()]
+    assert server.fetched == [ErrorLogFetch.ERROR_LOG]
+
+def test_rotated (serve, tmp_path, monkeypatch):
+    rotated = tmp_path / "error_log.O"
+    rotated.write_bytes (OLD + OLD)
+    monkeypatch.setattr (ErrorLogFetch, 'ROTATED_ERROR_LOG', str (rotated))
+    # The new log is shorter than the offset, so the requested range
+    # is past its end.
+    server = serve (NEW[:20] + b"\n")
+    lines = ErrorLogFetch.fetch_error_log_tail (Connection (server), len (OLD))
+    assert lines == [OLD.decode ().strip (), NEW[:20].decode ()]
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+try:
+    from troubleshoot import ErrorLogParse
+except ImportError:
+    ErrorLogParse = None
+
+# In the style of cupsd with LogLevel debug.
+FILTER_CRASH_LOG = """\
+I [19/Oct/2026:10:14:02 +0000] [Job 41] Queued on "Office" by "alice".
+D [19/Oct/2026:10:14:02 +0000] [Job 41] time-at-processing=1792404842
+D [19/Oct/2026:10:14:02 +0000] [Job 41] Started filter /usr/lib/cups/filter/pdftopdf (PID 5120)
+D [19/Oct/2026:10:14:02 +0000] [Job 41] Started filter /usr/lib/cups/filter/foomatic-rip (PID 5121)
+D [19/Oct/2026:10:14:02 +0000] [Job 41] Started backend /usr/lib/cups/backend/socket (PID 5122)
+E [19/Oct/2026:10:14:03 +0000] [Job 41] PID 5121 (/usr/lib/cups/filter/foomatic-rip) crashed on signal 11.
+D [19/Oct/2026:10:14:03 +0000] [Job 41] PID 5122 (/usr/lib/cups/backend/socket) exited with no errors.
+I [19/Oct/2026:10:14:03 +0000] [Job 41] Job stopped due to filter errors; please consult the error_log file for details.
+D [19/Oct/2026:10:14:03 +0000] [Client 17] Returning HTTP Unauthorized for CUPS-Get-Devices (/admin) from localhost
+""".splitlines ()
+
+BACKEND_LOG = """\
+I [19/Oct/2026:11:02:40 +0000] [Job 42] Queued on "Lab" by "bob".
+D [19/Oct/2026:11:02:41 +0000] [Job 42] Started backend /usr/lib/cups/backend/ipp (PID 6001)
+E [19/Oct/2026:11:02:45 +0000] [Job 42] Unable to get printer status (Unauthorized)
+D [19/Oct/2026:11:02:45 +0000] [Job 42] Backend returned status 2 (authentication required)
+E [19/Oct/2026:11:02:45 +0000] [Job 42] PID 6001 (/usr/lib/cups/backend/ipp) stopped with status 2.
+E [19/Oct/2026:11:03:10 +0000] [cups-driverd] Unable to open PPD file "lsb/usr/acme/laser.ppd" - No such file or directory
+W [19/Oct/2026:11:03:11 +0000] Printer drivers are deprecated and will stop working in a future version of CUPS.
+""".splitlines ()
+
+@pytest.mark.skipif(ErrorLogParse is None, reason="troubleshooter not available")
+def test_filter_crash ():
+    parsed = ErrorLogParse.parse_error_log (FILTER_CRASH_LOG)
+    assert parsed.error_count () == 1
+    assert parsed.failures == [(ErrorLogParse.FILTER_CRASHED, 5)]
+    assert parsed.by_job[41] == list (range (8))
+    assert parsed.by_printer['Office'] == list (range (8))
+    entry = parsed.entry (5)
+    assert (entry.level, entry.job, entry.timestamp) == \
+        ('E', 41, '19/Oct/2026:10:14:03 +0000')
+    assert parsed.entry (8).context == 'Client 17'
+
+    text = parsed.text ()
+    assert text.index ("Filter crashed: 1 (job 41 on Office)") < \
+        text.index (FILTER_CRASH_LOG[0])
+
+@pytest.mark.skipif(ErrorLogParse is None, reason="troubleshooter not available")
+def test_backend_failures ():
+    parsed = ErrorLogParse.parse_error_log (BACKEND_LOG)
+    assert parsed.error_count () == 3
+    assert parsed.level_counts['W'] == 1
+    kinds = parsed.failures_by_kind ()
+    # Backend status 2 is CUPS_BACKEND_AUTH_REQUIRED.
+    assert kinds[ErrorLogParse.AUTHENTICATION_REQUIRED] == [2, 3]
+    assert kinds[ErrorLogParse.BACKEND_FAILED] == [4]
+    assert kinds[ErrorLogParse.PPD_MISSING] == [5]
+    assert parsed.entry (5).context == 'cups-driverd'
+    assert parsed.entry (5).job is None
+
+@pytest.mark.skipif(ErrorLogParse is None, reason="troubleshooter not available")
+def test_large_log ():
+    # Mostly routine debugging messages, as in a real log.
+    routine = FILTER_CRASH_LOG[1:4] * 25
+    lines = (routine + FILTER_CRASH_LOG + BACKEND_LOG) * 3500
+    parsed = ErrorLogParse.parse_error_log (lines)
+    parsed.text ()
+    assert len (parsed) == len (lines)
+    assert len (parsed.failures) == 5 * 3500
+    assert len (parsed.by_printer['Lab']) == 5 * 3500
+
+@pytest.mark.skipif(ErrorLogParse is None, reason="troubleshooter not available")
+def test_embedded_newline ():
+    # Journal messages can span several lines.
+    parsed = ErrorLogParse.parse_error_log (['E [x] a\nb', 'plain line'])
+    assert len (parsed) == 2
+    assert parsed.entry (0).level == 'E'
+    assert parsed.entry (0).message == 'a\nb'
+    assert parsed.entry (1).message == 'plain line'
+
+@pytest.mark.skipif(ErrorLogParse is None, reason="troubleshooter not available")
+def test_job_printer ():
+    lines = [
+        'D [19/Oct/2026:12:00:00 +0000] [Job 5] Unknown option "ColorModel"',
+        'D [19/Oct/2026:12:00:00 +0000] [Job 5] PPD version "2.0"',
+        'I [19/Oct/2026:12:00:01 +0000] [Job 5] Queued on "Office" by "carol".',
+    ]
+    parsed = ErrorLogParse.parse_error_log (lines)
+    assert parsed.job_printer == { 5: 'Office' }
+    assert 'ColorModel' not in parsed.by_printer
+    assert '2.0' not in parsed.by_printer
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+try:
+    import cups
+    import jobviewer
+except ImportError:
+    jobviewer = None
+
+pytestmark = pytest.mark.skipif (jobviewer is None,
+                                 reason="jobviewer not available")
+
+class FakeConnection:
+    """Stands in for cups.Connection, for a server that is down."""
+    connects = 0
+    printers = None
+
+    def __init__ (self, **kwds):
+        FakeConnection.connects += 1
+        if FakeConnection.printers is None:
+            raise RuntimeError ("failed to connect")
+
+    def getPrinters (self):
+        return FakeConnection.printers
+
+    def getPrinterAttributes (self, name=None, uri=None,
+                              requested_attributes=None):
+        for printer, attrs in FakeConnection.printers.items ():
+            if printer == name or uri in attrs['printer-uri-supported']:
+                return attrs
+
+        raise cups.IPPError (0, "not found")
+
+def test_populate_back_off (monkeypatch):
+    FakeConnection.connects = 0
+    FakeConnection.printers = None
+    monkeypatch.setattr (jobviewer.cups, 'Connection', FakeConnection)
+    now = [1000.0]
+    monkeypatch.setattr (jobviewer.time, 'time', lambda: now[0])
+    index = jobviewer.PrinterURIIndex ()
+    uri = "ipp://localhost/printers/p"
+    with pytest.raises (KeyError):
+        index.lookup (uri)
+
+    # Lookups while the server is down do not ask for every printer
+    # again.
+    connects = FakeConnection.connects
+    with pytest.raises (KeyError):
+        index.lookup (uri)
+    assert index.all_printer_names () == set ()
+    assert FakeConnection.connects == connects + 1
+
+    # Once the server is back, it is asked again after a while...
+    FakeConnection.printers = { 'p': { 'printer-uri-supported': uri,
+                                       'printer-name': 'p' } }
+    now[0] += index.POPULATE_RETRY
+    assert index.all_printer_names () == set (['p'])
+    assert index.populated
+
+def test_populate_after_event (monkeypatch):
+    FakeConnection.printers = None
+    monkeypatch.setattr (jobviewer.cups, 'Connection', FakeConnection)
+    index = jobviewer.PrinterURIIndex ()
+    assert index.all_printer_names () == set ()
+
+    # ...or straight away when a printer event arrives.
+    FakeConnection.printers = { 'p': { 'printer-uri-supported':
+                                       "ipp://localhost/printers/p",
+                                       'printer-name': 'p' },
+                                'q': { 'printer-uri-supported':
+                                       "ipp://localhost/printers/q",
+                                       'printer-name': 'q' } }
+    index.add_printer ('q')
+    assert index.populated
+    assert index.lookup ("ipp://localhost/printers/p") == 'p'
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+import socket
+import time
+try:
+    from troubleshoot.CheckNetworkServerSanity import probe_network_server
+except ImportError:
+    probe_network_server = None
+
+pytestmark = pytest.mark.skipif (probe_network_server is None,
+                                 reason="troubleshoot not available")
+
+def probe (port, deadline, traceroute=False):
+    answers = { 'remote_server_name': '127.0.0.1',
+                'remote_server_port': port }
+    if not traceroute:
+        # Pretend it has already been run.
+        answers['remote_server_traceroute'] = None
+
+    start = time.monotonic ()
+    result = probe_network_server (answers, deadline=deadline)
+    return (result, time.monotonic () - start)
+
+@pytest.fixture
+def listener ():
+    # Accepts connections but never answers.
+    s = socket.socket ()
+    s.bind (('127.0.0.1', 0))
+    s.listen (5)
+    yield s.getsockname ()[1]
+    s.close ()
+
+@pytest.fixture
+def blackhole ():
+    # Once its accept queue is full, the kernel drops further SYNs
+    # for this socket, so connecting to it hangs.
+    s = socket.socket ()
+    s.bind (('127.0.0.1', 0))
+    s.listen (0)
+    port = s.getsockname ()[1]
+    fillers = []
+    for i in range (4):
+        c = socket.socket ()
+        c.setblocking (False)
+        c.connect_ex (('127.0.0.1', port))
+        fillers.append (c)
+
+    time.sleep (0.2)
+    yield port
+    for c in fillers:
+        c.close ()
+    s.close ()
+
+def test_refused ():
+    s = socket.socket ()
+    s.bind (('127.0.0.1', 0))
+    port = s.getsockname ()[1]
+    s.close ()
+    (answers, elapsed) = probe (port, deadline=10)
+    assert '127.0.0.1' in answers['remote_server_name_resolves']
+    assert answers['remote_server_try_connect'] == '127.0.0.1'
+    assert answers['remote_server_connect_ipp'] is False
+    assert elapsed < 5
+
+def test_silent_server (listener):
+    (answers, elapsed) = probe (listener, deadline=2, traceroute=True)
+    assert answers['remote_server_connect_ipp'] is True
+    # getPrinters never gets a reply, and the deadline stops waiting.
+    assert 'remote_server_cups' not in answers
+    # The server is reachable so traceroute is abandoned.
+    assert 'remote_server_traceroute' not in answers
+    assert elapsed < 4
+
+def test_blackholed_port (blackhole):
+    (answers, elapsed) = probe (blackhole, deadline=2)
+    assert answers['remote_server_try_connect'] == '127.0.0.1'
+    assert 'remote_server_connect_ipp' not in answers
+    assert elapsed < 4
@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import http.server
+import pytest
+import queue
+import threading
+import time
+import urllib.parse
+try:
+    import cups
+    from cupshelpers import openprinting
+except ImportError:
+    cups = None
+
+try:
+    import OpenPrintingRequest
+except ImportError:
+    OpenPrintingRequest = None
+
+PRINTERS_XML = b"""<printers>
+<printer><id>Acme-Laser_1</id><make>Acme</make><model>Laser 1</model></printer>
+<printer><id>Acme-Laser_2</id><make>Acme</make><model>Laser 2</model></printer>
+</printers>"""
+
+DRIVERS_XML = b"""<drivers>
+<driver id="driver/one">
+<name>one</name><url>http://example.com/one</url>
+<licenselink>http://%(host)s/license</licenselink>
+<ppds><ppd>http://example.com/one.ppd</ppd></ppds>
+</driver>
+<driver id="driver/two">
+<name>two</name><url>http://example.com/two</url>
+<licenselink>http://%(host)s/license</licenselink>
+<nonfreesoftware/>
+</driver>
+</drivers>"""
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET (self):
+        url = urllib.parse.urlparse (self.path)
+        self.server.paths.append (url.path)
+        query = urllib.parse.parse_qs (url.query)
+        if url.path == "/license":
+            body = b"Example license"
+        elif query.get ('type') == ['printers']:
+            body = PRINTERS_XML
+        elif query.get ('type') == ['drivers']:
+            host = "%s:%d" % self.server.server_address
+            body = DRIVERS_XML % { b'host': host.encode ('ascii') }
+        else:
+            self.send_error (404)
+            return
+
+        self.send_response (200)
+        self.send_header ("Content-Length", str (len (body)))
+        self.end_headers ()
+        self.wfile.write (body)
+
+    def log_message (self, *args):
+        pass
+
+@pytest.fixture
+def server ():
+    httpd = http.server.ThreadingHTTPServer (("127.0.0.1", 0), StandIn)
+    httpd.paths = []
+    thread = threading.Thread (target=httpd.serve_forever, daemon=True)
+    thread.start ()
+    yield httpd
+    httpd.shutdown ()
+    httpd.server_close ()
+
+def make_openprinting (server, tmp_path):
+    op = openprinting.OpenPrinting (language=('C',), cache_dir=str (tmp_path))
+    op.scheme = "http"
+    op.base_url = "%s:%d" % server.server_address
+    return op
+
+def wait (start):
+    results = queue.Queue ()
+    start (lambda status, user_data, result:
+           results.put ((status, result)))
+    return results.get (timeout=10)
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_search_printers_cached (server, tmp_path):
+    op = make_openprinting (server, tmp_path)
+    for i in range (2):
+        (status, printers) = wait (lambda cb: op.searchPrinters ("acme", cb))
+        assert status == 0
+        assert printers == { 'Acme-Laser_1': 'Acme Laser 1',
+                             'Acme-Laser_2': 'Acme Laser 2' }
+
+    # The second search came from the cache.
+    assert server.paths == ["/query.cgi"]
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_list_drivers_licenses (server, tmp_path):
+    op = make_openprinting (server, tmp_path)
+    (status, drivers) = wait (lambda cb: op.listDrivers ("Acme-Laser_1", cb))
+    assert status == 0
+    assert sorted (drivers.keys ()) == ['driver/one', 'driver/two']
+    assert drivers['driver/one']['licensetext'] == "Example license"
+    assert drivers['driver/two']['licensetext'] == "Example license"
+    assert drivers['driver/one']['ppds'] == ['http://example.com/one.ppd']
+    assert not drivers['driver/two']['freesoftware']
+
+    # The shared license link was only fetched once.
+    assert sorted (server.paths) == ["/license", "/query.cgi"]
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_query_error_not_cached (server, tmp_path):
+    op = make_openprinting (server, tmp_path)
+    for i in range (2):
+        (status, result) = wait (lambda cb: op.webQuery ({ 'type': 'bogus' },
+                                                         cb))
+        assert status == 1
+
+    assert len (server.paths) == 2
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_snapshot (server, tmp_path):
+    filename = str (tmp_path / "snapshot.json.gz")
+    openprinting.createSnapshot (filename, ["acme"],
+                                 op=make_openprinting (server, tmp_path))
+    assert sorted (server.paths) == ["/license"] + ["/query.cgi"] * 3
+
+    snapshot = openprinting.loadSnapshot (filename)
+    op = make_openprinting (server, tmp_path)
+    op.cache_ttl = 0
+    op.snapshot = snapshot
+    del server.paths[:]
+    (status, printers) = wait (lambda cb: op.searchPrinters ("laser 2", cb))
+    assert status == 0
+    assert printers == { 'Acme-Laser_2': 'Acme Laser 2' }
+    (status, printers) = wait (lambda cb: op.searchPrinters (
+        "MFG:ACME Inc;MDL:Laser 1;", cb))
+    assert printers == { 'Acme-Laser_1': 'Acme Laser 1' }
+
+    (status, drivers) = wait (lambda cb: op.listDrivers ("Acme-Laser_1", cb))
+    assert status == 0
+    assert sorted (drivers.keys ()) == ['driver/one']
+    assert drivers['driver/one']['licensetext'] == "Example license"
+
+    (status, drivers) = wait (lambda cb: op.listDrivers ("Other", cb))
+    assert (status, drivers) == (0, {})
+    assert server.paths == []
+
+    # These extra options are applied to the snapshot's answers.
+    (status, drivers) = wait (lambda cb: op.listDrivers (
+        "Acme-Laser_1", cb, extra_options={ 'onlyppdfiles': '1' }))
+    assert status == 0
+    assert sorted (drivers.keys ()) == ['driver/one']
+    assert server.paths == []
+
+    # Others are only asked about with network fallback.
+    (status, drivers) = wait (lambda cb: op.listDrivers (
+        "Acme-Laser_1", cb, extra_options={ 'onlymanufacturer': '1' }))
+    assert status == 0
+    assert server.paths == []
+    op.network_fallback = True
+    (status, drivers) = wait (lambda cb: op.listDrivers (
+        "Acme-Laser_1", cb, extra_options={ 'onlymanufacturer': '1' }))
+    assert status == 0
+    assert "/query.cgi" in server.paths
+
+PACKAGES_XML = """<drivers>
+<driver id="driver/ppd">
+<name>ppd</name><url>http://example.com/ppd</url>
+<ppds><ppd>http://example.com/ppd.ppd</ppd></ppds>
+</driver>
+<driver id="driver/rpm">
+<name>rpm</name><url>http://example.com/rpm</url>
+<packages><%(arch)s>
+<package file="rpm.rpm"><url>http://example.com/rpm.rpm</url><pkgsys>rpm</pkgsys></package>
+</%(arch)s></packages>
+</driver>
+<driver id="driver/deb">
+<name>deb</name><url>http://example.com/deb</url>
+<packages><%(arch)s>
+<package file="deb.deb"><url>http://example.com/deb.deb</url><pkgsys>deb</pkgsys></package>
+</%(arch)s></packages>
+</driver>
+<driver id="driver/none">
+<name>none</name><url>http://example.com/none</url>
+</driver>
+</drivers>"""
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_snapshot_download_options ():
+    arch = openprinting._architecture ()
+    snapshot = openprinting.Snapshot (
+        printers={ 'Acme-Laser_1': ('Acme', 'Laser 1') },
+        drivers={ 'Acme-Laser_1': PACKAGES_XML % { 'arch': arch } })
+    op = openprinting.OpenPrinting (language=('C',), snapshot=snapshot,
+                                    cache_ttl=0)
+    op.webQuery = None
+    (status, drivers) = wait (lambda cb: op.listDrivers (
+        "Acme-Laser_1", cb, extra_options={ 'onlydownload': '1',
+                                            'packagesystem': 'deb' }))
+    assert status == 0
+    assert sorted (drivers.keys ()) == ['driver/deb', 'driver/ppd']
+    assert list (drivers['driver/deb']['packages'][arch]) == ['deb.deb']
+
+@pytest.mark.skipif(OpenPrintingRequest is None,
+                    reason="OpenPrintingRequest not available")
+def test_request_from_snapshot (tmp_path, monkeypatch):
+    drivers = DRIVERS_XML % { b'host': b'example.com' }
+    snapshot = openprinting.Snapshot (
+        printers={ 'Acme-Laser_1': ('Acme', 'Laser 1'),
+                   'Acme-Laser_2': ('Acme', 'Laser 2') },
+        drivers={ 'Acme-Laser_1': drivers.decode ('ascii'),
+                  'Acme-Laser_2': '<drivers/>' },
+        licenses={ 'http://example.com/license': "Example license" })
+
+    def no_query (*args, **kwds):
+        raise AssertionError ("web query issued")
+    monkeypatch.setattr (openprinting.OpenPrinting, 'webQuery', no_query)
+
+    results = queue.Queue ()
+    request = OpenPrintingRequest.OpenPrintingRequest (
+        snapshot=snapshot, cache_dir=str (tmp_path))
+    request.connect ('finished', lambda obj, printers, drivers:
+                     results.put ((printers, drivers)))
+    request.connect ('error', lambda obj, status, error:
+                     results.put ((status, error)))
+    request.searchPrinters ("acme laser")
+    (printers, drivers) = results.get (timeout=10)
+    assert printers == [('Acme-Laser_1', 'Acme Laser 1')]
+    assert sorted (drivers['Acme-Laser_1'].keys ()) == ['driver/one']
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_snapshot_other_architecture (server, tmp_path):
+    snapshot = openprinting.Snapshot (
+        printers={ 'Acme-Laser_1': ('Acme', 'Laser 1') },
+        drivers={ 'Acme-Laser_1': '<drivers/>' },
+        architecture="other-architecture")
+    op = openprinting.OpenPrinting (language=('C',), snapshot=snapshot,
+                                    cache_ttl=0)
+    assert op.snapshot is None
+
+    # Its driver packages would be for the wrong machine, so the
+    # network is asked instead.
+    op.scheme = "http"
+    op.base_url = "%s:%d" % server.server_address
+    (status, drivers) = wait (lambda cb: op.listDrivers ("Acme-Laser_1", cb))
+    assert status == 0
+    assert sorted (drivers.keys ()) == ['driver/one', 'driver/two']
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_snapshot_lookup_speed ():
+    printers = {}
+    for i in range (30000):
+        printers["Make%d-Model_%d" % (i % 100, i)] = ("Make%d" % (i % 100),
+                                                      "Model %d" % i)
+
+    snapshot = openprinting.Snapshot (printers=printers)
+    start = time.time ()
+    for i in range (0, 30000, 300):
+        assert len (snapshot.searchPrinters ("make%d model %d" %
+                                             (i % 100, i))) == 1
+
+    assert snapshot.searchPrinters ("model 12345") == \
+        { 'Make45-Model_12345': 'Make45 Model 12345' }
+    assert (time.time () - start) / 101 < 0.01
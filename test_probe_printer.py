@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import pytest
+import socket
+import threading
+try:
+    import cups
+    import probe_printer
+except ImportError:
+    cups = None
+
+def listener (addr, port, reply=None, family=socket.AF_INET):
+    s = socket.socket (family, socket.SOCK_STREAM)
+    s.setsockopt (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind ((addr, port))
+    s.listen (16)
+
+    def serve ():
+        while True:
+            try:
+                (conn, peer) = s.accept ()
+            except OSError:
+                return
+
+            if reply is not None:
+                try:
+                    conn.settimeout (1)
+                    conn.recv (1024)
+                    conn.send (reply)
+                except OSError:
+                    pass
+
+            conn.close ()
+
+    t = threading.Thread (target=serve)
+    t.daemon = True
+    t.start ()
+    return s
+
+def free_port (addrs):
+    while True:
+        s = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+        s.bind ((addrs[0], 0))
+        port = s.getsockname ()[1]
+        s.close ()
+        try:
+            for addr in addrs:
+                t = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+                t.bind ((addr, port))
+                t.close ()
+        except OSError:
+            continue
+
+        return port
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_parse_address_range ():
+    assert len (probe_printer.parse_address_range ("10.0.0.0/22")) == 1022
+    assert probe_printer.parse_address_range ("10.0.0.254-10.0.1.1") == \
+        ["10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"]
+    assert probe_printer.parse_address_range ("10.1.2.3") == ["10.1.2.3"]
+    with pytest.raises (ValueError):
+        probe_printer.parse_address_range ("10.0.0.9-10.0.0.1")
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_find_range ():
+    # Stand-in printers on loopback aliases: a JetDirect port on
+    # one address and an LPD server with a 'PASSTHRU' queue on
+    # another.
+    jetdirect = listener ("127.0.0.2", free_port (["127.0.0.2"]))
+    jetdirect_port = jetdirect.getsockname ()[1]
+    lpd = listener ("127.0.0.3", free_port (["127.0.0.3"]), reply=b'\0')
+    lpd_port = lpd.getsockname ()[1]
+
+    found = []
+    done = threading.Event ()
+    def callback (device):
+        if device is None:
+            done.set ()
+        else:
+            found.append (device.uri)
+
+    finder = probe_printer.PrinterFinder ()
+    finder.find_range ("127.0.0.0/29", callback,
+                       ports={ jetdirect_port: 'jetdirect',
+                               lpd_port: 'lpd' },
+                       host_timeout=5, timeout=20)
+    assert done.wait (30)
+    jetdirect.close ()
+    lpd.close ()
+
+    assert "socket://127.0.0.2:%d" % jetdirect_port in found
+    assert "lpd://127.0.0.3:%d/PASSTHRU" % lpd_port in found
+    assert len (found) == 2
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_find_range_busy (monkeypatch):
+    # More hosts than workers, each with a slow SNMP agent: every
+    # host still gets its full time once a worker picks it up.
+    import time
+    def run_snmp_backend (host, timeout=None):
+        time.sleep (1)
+        return None
+
+    monkeypatch.setattr (probe_printer, 'run_snmp_backend', run_snmp_backend)
+    monkeypatch.setattr (probe_printer, '_snmp_service',
+                         probe_printer.SNMPIdentityService ())
+    addrs = ["127.0.1.%d" % n for n in range (1, 13)]
+    jetdirect_port = free_port (addrs)
+    jetdirect = [listener (addr, jetdirect_port) for addr in addrs]
+    lpd_port = free_port (addrs)
+    lpd = [listener (addr, lpd_port, reply=b'\0') for addr in addrs]
+
+    found = []
+    done = threading.Event ()
+    def callback (device):
+        if device is None:
+            done.set ()
+        else:
+            found.append (device.uri)
+
+    finder = probe_printer.PrinterFinder ()
+    finder.find_range ("127.0.1.1-127.0.1.12", callback,
+                       ports={ jetdirect_port: 'jetdirect',
+                               lpd_port: 'lpd' },
+                       max_hosts=2, host_timeout=1.5, timeout=30)
+    assert done.wait (40)
+    for s in jetdirect + lpd:
+        s.close ()
+
+    for addr in addrs:
+        assert "socket://%s:%d" % (addr, jetdirect_port) in found
+        assert len ([uri for uri in found
+                     if uri.startswith ("lpd://%s:%d/" % (addr, lpd_port))]) == 1
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_tcp_sweep_deadline ():
+    # Nothing listens on these addresses; the sweep must still
+    # honour its deadline.
+    import time
+    start = time.time ()
+    results = list (probe_printer.tcp_sweep (["192.0.2.%d" % n
+                                              for n in range (1, 255)],
+                                             [9100], timeout=5,
+                                             deadline=start + 1))
+    assert results == []
+    assert time.time () - start < 3
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_snmp_failures_not_cached (monkeypatch):
+    outputs = [None, 'network socket://10.0.0.5 "Acme Laser" "Acme"']
+    calls = []
+    def run_snmp_backend (host, timeout=None):
+        calls.append (host)
+        return outputs[len (calls) - 1]
+
+    monkeypatch.setattr (probe_printer, 'run_snmp_backend', run_snmp_backend)
+    service = probe_printer.SNMPIdentityService ()
+    assert service.lookup_sync ('10.0.0.5', timeout=5) is None
+    # The failure wasn't kept, so this runs the backend again...
+    assert service.lookup_sync ('10.0.0.5', timeout=5) == outputs[1]
+    # ...but a successful answer is.
+    assert service.lookup_sync ('10.0.0.5', timeout=5) == outputs[1]
+    assert len (calls) == 2
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_lpd_negative_cache ():
+    # Only queues the server actually rejects are remembered.
+    silent = listener ("127.0.0.4", free_port (["127.0.0.4"]))
+    host = "127.0.0.4:%d" % silent.getsockname ()[1]
+    assert probe_printer.LpdServer (host).probe (timeout=5) == []
+    assert host not in probe_printer.LpdServer._negative_cache
+    silent.close ()
+
+    rejecting = listener ("127.0.0.4", free_port (["127.0.0.4"]),
+                          reply=b'\1')
+    host = "127.0.0.4:%d" % rejecting.getsockname ()[1]
+    assert probe_printer.LpdServer (host).probe (timeout=5) == []
+    assert 'PASSTHRU' in probe_printer.LpdServer._negative_cache[host]
+    rejecting.close ()
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_lpd_ipv6 ():
+    try:
+        lpd = listener ("::1", 0, reply=b'\0', family=socket.AF_INET6)
+    except OSError:
+        pytest.skip ("no IPv6 loopback")
+
+    port = lpd.getsockname ()[1]
+    # Every queue name is accepted.
+    assert len (probe_printer.LpdServer ("::1", port).probe (timeout=5)) == 1
+    assert probe_printer.open_socket ("[::1]:%d" % port, 515) is not None
+    lpd.close ()
+
+@pytest.mark.skipif(cups is None, reason="cups module not available")
+def test_sweep_ipp_deadline (monkeypatch):
+    # A server that accepts the connection but never answers.
+    import time
+    release = threading.Event ()
+    class Connection:
+        def __init__ (self, host=None, port=None):
+            pass
+
+        def getPrinters (self):
+            release.wait (10)
+            return {}
+
+    monkeypatch.setattr (probe_printer.cups, 'Connection', Connection)
+    found = []
+    finder = probe_printer.PrinterFinder ()
+    finder._callback_lock = threading.Lock ()
+    finder.callback_fn = found.append
+    start = time.time ()
+    finder._sweep_ipp ("192.0.2.1", start + 0.5, 631)
+    release.set ()
+    assert time.time () - start < 3
+    assert found == []
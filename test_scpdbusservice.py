@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import importlib.util
+import os.path
+import pytest
+try:
+    import cups
+    spec = importlib.util.spec_from_file_location (
+        'scp_dbus_service',
+        os.path.join (os.path.dirname (__file__), 'scp-dbus-service.py'))
+    service = importlib.util.module_from_spec (spec)
+    spec.loader.exec_module (service)
+except ImportError:
+    service = None
+
+pytestmark = pytest.mark.skipif (service is None,
+                                 reason="scp-dbus-service not available")
+
+PPDS = { 'lsb/usr/acme/laser.ppd': { 'ppd-make-and-model': 'Acme Laser',
+                                     'ppd-natural-language': 'en',
+                                     'ppd-device-id': '' } }
+
+class FakeConnection:
+    """Stands in for asyncconn.Connection; replies when told to."""
+    def __init__ (self):
+        self.requests = []
+
+    def getPPDs2 (self, reply_handler=None, error_handler=None):
+        self.requests.append ((reply_handler, error_handler))
+
+    def reply (self, result):
+        (reply_handler, error_handler) = self.requests.pop (0)
+        reply_handler (self, result)
+
+    def error (self, exc):
+        (reply_handler, error_handler) = self.requests.pop (0)
+        error_handler (self, exc)
+
+def test_latency_histogram ():
+    histogram = service.LatencyHistogram ()
+    for seconds in [0.001, 0.01, 0.02, 0.3, 29, 31, 100]:
+        histogram.add (seconds)
+
+    counts = dict (histogram.get ())
+    assert counts[0.01] == 2
+    assert counts[0.025] == 1
+    assert counts[0.5] == 1
+    assert counts[30.0] == 1
+    assert counts[float ('inf')] == 2
+    assert sum (counts.values ()) == 7
+    assert len (counts) == len (service.LatencyHistogram.bounds) + 1
+
+def fetched_ppds ():
+    conn = FakeConnection ()
+    fetchedppds = service.FetchedPPDs (conn, 'en')
+    ready = []
+    fetchedppds.connect ('ready', lambda obj: ready.append (obj.get_ppds ()))
+    fetchedppds.run ()
+    conn.reply (dict (PPDS))
+    return (conn, fetchedppds, ready)
+
+def test_refresh ():
+    (conn, fetchedppds, ready) = fetched_ppds ()
+    first = fetchedppds.get_ppds ()
+    assert ready == [first]
+
+    # The old PPDs are used until the new ones arrive, and a
+    # second refresh meanwhile is not sent.
+    fetchedppds.refresh ()
+    fetchedppds.refresh ()
+    assert len (conn.requests) == 1
+    assert fetchedppds.is_ready ()
+    assert fetchedppds.get_ppds () is first
+
+    ppds = dict (PPDS)
+    ppds['lsb/usr/acme/inkjet.ppd'] = { 'ppd-make-and-model': 'Acme Inkjet',
+                                        'ppd-natural-language': 'en',
+                                        'ppd-device-id': '' }
+    conn.reply (ppds)
+    assert fetchedppds.get_ppds () is not first
+    assert fetchedppds.get_ppds ().getInfoFromPPDName (
+        'lsb/usr/acme/inkjet.ppd')['ppd-make-and-model'] == 'Acme Inkjet'
+    assert len (ready) == 2
+
+def test_refresh_error ():
+    (conn, fetchedppds, ready) = fetched_ppds ()
+    first = fetchedppds.get_ppds ()
+    errors = []
+    fetchedppds.connect ('error', lambda obj, exc: errors.append (exc))
+    fetchedppds.refresh ()
+    conn.error (RuntimeError ("cupsd went away"))
+
+    # Keep the PPDs already fetched, and allow another try.
+    assert errors == []
+    assert fetchedppds.get_ppds () is first
+    fetchedppds.refresh ()
+    assert len (conn.requests) == 1
+
+def test_driver_change (monkeypatch):
+    timeouts = []
+    def timeout_add_seconds (seconds, fn):
+        timeouts.append (fn)
+        return len (timeouts)
+
+    removed = []
+    monkeypatch.setattr (service.GLib, 'timeout_add_seconds',
+                         timeout_add_seconds)
+    monkeypatch.setattr (service.GLib, 'source_remove', removed.append)
+    (conn, fetchedppds, ready) = fetched_ppds ()
+    monitor = service.DriverChangeMonitor (fetchedppds, dirs=[])
+
+    class File:
+        def get_path (self):
+            return "/usr/share/ppd/acme/inkjet.ppd"
+
+    # Several changes together cause a single refresh.
+    for n in range (3):
+        monitor._changed (None, File (), None, None)
+
+    assert removed == [1, 2]
+    assert conn.requests == []
+    assert timeouts[-1] () == False
+    assert len (conn.requests) == 1
+    conn.reply (dict (PPDS))
+    assert len (ready) == 2
+    monitor.destroy ()
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import json
+import pytest
+import time
+try:
+    from gi.repository import GLib
+    import timedops
+except (ImportError, ValueError):
+    timedops = None
+
+try:
+    from troubleshoot import session
+except ImportError:
+    session = None
+
+pytestmark = pytest.mark.skipif (timedops is None,
+                                 reason="GLib not available")
+
+def wait_for (operations, timeout=None):
+    # No wait dialog, so no display is needed.
+    loop = GLib.MainLoop ()
+    got = []
+    def finished (results):
+        got.append (results)
+        loop.quit ()
+
+    op = timedops.TimedOperations (operations, timeout=timeout,
+                                   callback=finished)
+    GLib.timeout_add (10000, loop.quit)
+    loop.run ()
+    assert got, "callback not called"
+    return got[0]
+
+def test_concurrent ():
+    def slow (value):
+        time.sleep (0.5)
+        return value
+
+    start = time.monotonic ()
+    results = wait_for ([timedops.ThreadOperation (slow, (n,))
+                         for n in range (4)])
+    assert results == [(0, None), (1, None), (2, None), (3, None)]
+    # They ran at the same time.
+    assert time.monotonic () - start < 1.5
+
+def test_exception ():
+    def fail ():
+        raise ValueError ("no")
+
+    [(result, exc)] = wait_for ([timedops.ThreadOperation (fail)])
+    assert isinstance (exc, ValueError)
+
+def test_subprocess ():
+    [(result, exc)] = wait_for ([timedops.SubprocessOperation (
+        args=["echo", "hello"], stdout=timedops.subprocess.PIPE)])
+    assert exc is None
+    (stdout, stderr, status) = result
+    assert stdout == ["hello", ""]
+    assert status == 0
+
+def test_deadline ():
+    quick = timedops.ThreadOperation (lambda: 1)
+    sleeper = timedops.SubprocessOperation (args=["sleep", "30"])
+    start = time.monotonic ()
+    results = wait_for ([quick, sleeper], timeout=300)
+    assert time.monotonic () - start < 5
+    assert results[0] == (1, None)
+    assert isinstance (results[1][1], timedops.OperationTimedOut)
+    # The command was killed.
+    sleeper.subp.wait (timeout=5)
+
+def test_nothing ():
+    assert wait_for ([]) == []
+
+def test_run ():
+    # Without a callback, run() waits for the results.
+    ops = timedops.TimedOperations ([timedops.ThreadOperation (lambda: 1),
+                                     timedops.ThreadOperation (lambda: 2)])
+    assert ops.run () == [(1, None), (2, None)]
+
+def test_max_running ():
+    running = []
+    most = []
+    def work ():
+        running.append (1)
+        most.append (len (running))
+        time.sleep (0.1)
+        running.pop ()
+
+    ops = timedops.TimedOperations ([timedops.ThreadOperation (work)
+                                     for n in range (6)], max_running=2)
+    assert [exc for (result, exc) in ops.run ()] == [None] * 6
+    assert max (most) == 2
+
+def test_run_steps ():
+    def steps (first):
+        [(a, exc)] = yield dict (operations=[timedops.ThreadOperation (
+            lambda: first)])
+        [(b, exc)] = yield dict (operations=[timedops.ThreadOperation (
+            lambda: a + 1)])
+        return (a, b)
+
+    assert timedops.run_steps (steps (1)) == (1, 2)
+
+    # With a callback, it returns straight away and the steps run
+    # from the main loop.
+    loop = GLib.MainLoop ()
+    got = []
+    def done (outcome, exception):
+        got.append ((outcome, exception))
+        loop.quit ()
+
+    assert timedops.run_steps (steps (5), callback=done) is None
+    assert got == []
+    GLib.timeout_add (10000, loop.quit)
+    loop.run ()
+    assert got == [((5, 6), None)]
+
+def test_run_steps_exception ():
+    def steps ():
+        yield dict (operations=[])
+        raise ValueError ("no")
+
+    got = []
+    loop = GLib.MainLoop ()
+    def done (outcome, exception):
+        got.append ((outcome, exception))
+        loop.quit ()
+
+    timedops.run_steps (steps (), callback=done)
+    GLib.timeout_add (10000, loop.quit)
+    loop.run ()
+    [(outcome, exc)] = got
+    assert outcome is None
+    assert isinstance (exc, ValueError)
+
+@pytest.mark.skipif (session is None, reason="troubleshoot not available")
+def test_replay ():
+    recording = session.Session ()
+    timedops.set_session (recording)
+    try:
+        ops = timedops.TimedOperations ([timedops.ThreadOperation (len, ("ab",)),
+                                         timedops.ThreadOperation (int, ("x",))])
+        ops.run ()
+        assert timedops.record_value ('answers', dict, a=1) == { 'a': 1 }
+
+        replaying = session.Session (json.loads (json.dumps ({
+            'format': session.FORMAT,
+            'initial_answers': {},
+            'pages': recording.pages })))
+        timedops.set_session (replaying)
+
+        # Nothing is run when replaying.
+        def not_run (*args):
+            raise AssertionError ("operation was run")
+        ops = timedops.TimedOperations ([timedops.ThreadOperation (not_run),
+                                         timedops.ThreadOperation (not_run)],
+                                        name="len+int")
+        [(length, exc1), (result, exc2)] = ops.run ()
+        assert (length, exc1) == (2, None)
+        assert isinstance (exc2, ValueError)
+        assert timedops.record_value ('answers', not_run) == { 'a': 1 }
+    finally:
+        timedops.set_session (None)
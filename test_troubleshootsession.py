@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import gzip
+import json
+import pytest
+import socket
+try:
+    import cups
+    import troubleshoot
+    import timedops
+    from troubleshoot import session
+    from gi.repository import Gdk
+except ImportError:
+    session = None
+
+pytestmark = pytest.mark.skipif (session is None,
+                                 reason="troubleshoot not available")
+
+class CheckPrinterSanity:
+    pass
+
+class PrintTestPage:
+    pass
+
+def test_encode_decode ():
+    answers = { 'cups_queue': 'Office',
+                'remote_server_smb_shares': (-110, 'Timed out'),
+                'error_log_failures': { 41: ['filter-crash'] },
+                'packages': { 'cups', 'hplip' },
+                'ppd': b'*PPD-Adobe: "4.3"\n',
+                'error': socket.gaierror (-2, 'Name or service not known'),
+                '_authenticated_connection': object () }
+    encoded = json.loads (json.dumps (session.encode (answers)))
+    decoded = session.decode (encoded)
+    for key in ['cups_queue', 'remote_server_smb_shares',
+                'error_log_failures', 'packages', 'ppd']:
+        assert decoded[key] == answers[key]
+
+    assert isinstance (decoded['error'], socket.gaierror)
+    assert decoded['error'].args == answers['error'].args
+
+    # Connections can't be recorded, but replayed code can still use them.
+    conn = decoded['_authenticated_connection']
+    assert isinstance (conn, session.ReplayObject)
+    assert isinstance (conn.getPrinters, session.ReplayObject)
+
+def record (filename):
+    recording = session.Session ()
+    recording.set_initial_answers ({ 'error_log_timestamp': 'now' })
+    recording.start_page (0, CheckPrinterSanity ())
+    recording.record_operation ('getPrinters', { 'Office': {} }, None)
+    recording.record_operation ('cupstestppd', (['ok', ''], [''], 0), None)
+    recording.record_operation ('getPrinters', None,
+                                RuntimeError ('failed'))
+    recording.displayed (False)
+    recording.collected (0, CheckPrinterSanity (),
+                         { 'cups_queue_listed': True })
+    recording.start_page (1, PrintTestPage ())
+    recording.displayed (True)
+    recording.collected (1, PrintTestPage (),
+                         { 'test_page_successful': False })
+    recording.save (filename)
+
+def test_replay (tmp_path):
+    filename = str (tmp_path / "session.json.gz")
+    record (filename)
+    replay = session.load_session (filename)
+    assert replay.replaying
+    answers = {}
+    replay.set_initial_answers (answers)
+    assert answers == { 'error_log_timestamp': 'now' }
+
+    replay.start_page (0, CheckPrinterSanity ())
+    assert replay.next_operation ('getPrinters') == ({ 'Office': {} }, None)
+    assert replay.next_operation ('cupstestppd') == ((['ok', ''], [''], 0),
+                                                     None)
+    (result, exc) = replay.next_operation ('getPrinters')
+    assert isinstance (exc, RuntimeError)
+    assert replay.next_operation ('getPrinters') is None
+    replay.displayed (False)
+    assert replay.collected (0, CheckPrinterSanity (),
+                             { 'cups_queue_listed': True }) == \
+        { 'cups_queue_listed': True }
+
+    # The user's answers on displayed pages come from the recording.
+    replay.start_page (1, PrintTestPage ())
+    replay.displayed (True)
+    assert replay.collected (1, PrintTestPage (), {}) == \
+        { 'test_page_successful': False }
+
+    assert replay.differences () == []
+
+def test_replay_differences (tmp_path):
+    filename = str (tmp_path / "session.json.gz")
+    record (filename)
+    replay = session.load_session (filename)
+    replay.start_page (0, CheckPrinterSanity ())
+    replay.displayed (False)
+    replay.collected (0, CheckPrinterSanity (),
+                      { 'cups_queue_listed': False })
+    assert replay.differences () == [
+        "Page 0 (CheckPrinterSanity): answers differ",
+        "Page 1 (PrintTestPage): not reached" ]
+
+def test_unknown_format (tmp_path):
+    filename = str (tmp_path / "session.json.gz")
+    with gzip.open (filename, 'wt') as f:
+        json.dump ({ 'format': session.FORMAT + 1, 'pages': [] }, f)
+
+    with pytest.raises (ValueError):
+        session.load_session (filename)
+
+class Connection:
+    def getPrinters (self):
+        pass
+
+    def getPrinterAttributes (self, name):
+        pass
+
+def test_operation_names ():
+    # Operations on a replayed connection have the names recorded
+    # for the real one.
+    conn = session.decode (session.encode (Connection ()))
+    for method in ['getPrinters', 'getPrinterAttributes']:
+        recorded = timedops._operation_name (getattr (Connection (), method))
+        assert recorded == method
+        assert timedops._operation_name (getattr (conn, method)) == method
+
+def page (name):
+    # Only the class name of a page is recorded.
+    return type (name, (), {}) ()
+
+def record_pages (filename):
+    # What a run through these real pages recorded.
+    recording = session.Session ()
+    recording.set_initial_answers ({
+        'error_log_timestamp': 'now',
+        'cups_printer_ppd_defaults': { 'General': { 'PageSize': 'A4' } },
+        'test_page_job_status': [(True, 12, 'Office', 'Test page',
+                                  'completed', { 'PageSize': 'Letter' })],
+        'cups_queue_listed': True,
+        'cups_queue': 'Office' })
+    recording.collected (0, page ("Welcome"),
+                         { '_authenticated_connection': object () })
+    recording.record_operation ('get_connection', object (), None)
+
+    verification = { 'cups': [], 'hplip': ['missing /usr/bin/hp-setup'] }
+    recording.start_page (1, page ("VerifyPackages"))
+    recording.record_operation ('cached_verification',
+                                ('rpm', 1.0, verification), None)
+    recording.displayed (False)
+    recording.collected (1, page ("VerifyPackages"),
+                         { 'packages_verification': verification })
+
+    locale_settings = { 'user_locale_messages': 'en_US',
+                        'user_locale_ctype': 'en_US',
+                        'system_locale_lang': 'en_US' }
+    recording.start_page (2, page ("Locale"))
+    recording.record_operation ('locale_settings', locale_settings, None)
+    recording.displayed (True)
+    answers = locale_settings.copy ()
+    answers.update ({ 'printer_page_size': 'A4',
+                      'job_page_size': 'Letter' })
+    recording.collected (2, page ("Locale"), answers)
+
+    # Operations are recorded under the names TimedOperation gives
+    # them, here for a real connection's methods.
+    conn = Connection ()
+    printer = { 'device-uri': 'ipp://server/printers/office',
+                'printer-type': 0 }
+    attrs = { 'printer-state': 3 }
+    recording.start_page (3, page ("CheckPrinterSanity"))
+    recording.record_operation (timedops._operation_name (cups.Connection),
+                                conn, None)
+    recording.record_operation (timedops._operation_name (conn.getPrinters),
+                                { 'Office': printer }, None)
+    recording.record_operation (
+        timedops._operation_name (conn.getPrinterAttributes), attrs, None)
+    recording.displayed (False)
+    recording.collected (3, page ("CheckPrinterSanity"),
+                         { 'is_cups_class': False,
+                           'cups_printer_dict': printer,
+                           'local_cups_queue_attributes': attrs,
+                           'cups_device_uri_scheme': 'ipp',
+                           'remote_server_name': 'server',
+                           'remote_server_port': 631,
+                           'cups_printer_remote': False })
+
+    # The network probes finish from the main loop.
+    resolved = { 'remote_server_name_resolves': ['10.0.0.1'] }
+    probed = dict (resolved, remote_server_try_connect='server',
+                   remote_server_connect_ipp=True, remote_server_cups=True)
+    recording.start_page (4, page ("CheckNetworkServerSanity"))
+    recording.record_operation ('_probe_resolve', [(None, None)], None)
+    recording.record_operation ('probe_answers', resolved, None)
+    recording.record_operation ('_probe_ipp+_probe_smb+_probe_traceroute',
+                                [(None, None)] * 3, None)
+    recording.record_operation ('probe_answers', probed, None)
+    recording.displayed (False)
+    recording.collected (4, page ("CheckNetworkServerSanity"), probed)
+
+    recording.start_page (5, page ("Shrug"))
+    recording.displayed (True)
+    recording.save (filename)
+    return verification
+
+@pytest.mark.skipif (session is None or Gdk.Display.get_default () is None,
+                     reason="no display")
+def test_replay_pages (tmp_path, monkeypatch):
+    filename = str (tmp_path / "session.json.gz")
+    verification = record_pages (filename)
+
+    # Replaying must not run anything.
+    def not_replayed (*args, **kwds):
+        raise AssertionError ("operation was run")
+    monkeypatch.setattr (timedops, 'OperationThread', not_replayed)
+    monkeypatch.setattr (timedops.Operation, 'start', not_replayed)
+    monkeypatch.setattr (troubleshoot, 'QUESTIONS',
+                         ["Welcome", "VerifyPackages", "Locale",
+                          "CheckPrinterSanity", "CheckNetworkServerSanity",
+                          "Shrug"])
+
+    replayed = session.load_session (filename)
+    troubleshooter = troubleshoot.run (session=replayed)
+    troubleshooter.replay ()
+    assert troubleshooter.current_page == 5
+    assert troubleshooter.answers['packages_verification'] == verification
+    assert troubleshooter.answers['job_page_size'] == 'Letter'
+    assert troubleshooter.answers['remote_server_name'] == 'server'
+    assert troubleshooter.answers['local_cups_queue_attributes'] == \
+        { 'printer-state': 3 }
+    assert troubleshooter.answers['remote_server_cups'] is True
+    troubleshooter.quit ()
+    assert replayed.differences () == []
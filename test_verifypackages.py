@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+import os
+import pytest
+import sys
+try:
+    from troubleshoot import VerifyPackages
+except ImportError:
+    VerifyPackages = None
+
+pytestmark = pytest.mark.skipif (VerifyPackages is None,
+                                 reason="troubleshoot not available")
+
+def make_verifier (tmp_path):
+    database = tmp_path / "status"
+    database.write_text ("")
+    log = tmp_path / "log"
+
+    class FakeVerifier(VerifyPackages.PackageVerifier):
+        name = "fake"
+        program = sys.executable
+        packages = ["cups", "hplip", "missing"]
+
+        def args (self, package):
+            script = ("import sys\n"
+                      "open (%r, 'a').write (sys.argv[1] + '\\n')\n"
+                      "if sys.argv[1] == 'missing':\n"
+                      "    print ('package missing is not installed')\n"
+                      % str (log))
+            return [self.program, "-c", script, package]
+
+    verifier = FakeVerifier ()
+    verifier.database = [str (database)]
+    return (verifier, database, log)
+
+def test_verify_and_cache (tmp_path):
+    (verifier, database, log) = make_verifier (tmp_path)
+    cache_file = str (tmp_path / "cache" / "verification.json")
+    expected = { 'cups': [],
+                 'hplip': [],
+                 'missing': ['package missing is not installed'] }
+
+    assert VerifyPackages.verify_packages (verifier, cache_file) == expected
+    assert sorted (log.read_text ().split ()) == ['cups', 'hplip', 'missing']
+
+    # Nothing has changed, so nothing is run again.
+    assert VerifyPackages.verify_packages (verifier, cache_file) == expected
+    assert len (log.read_text ().split ()) == 3
+
+    # Changing the package database invalidates the cache.
+    mtime = os.stat (database).st_mtime
+    os.utime (database, (mtime + 10, mtime + 10))
+    assert VerifyPackages.verify_packages (verifier, cache_file) == expected
+    assert len (log.read_text ().split ()) == 6
+
+def test_verify_callback (tmp_path):
+    from gi.repository import GLib
+    (verifier, database, log) = make_verifier (tmp_path)
+    cache_file = str (tmp_path / "cache" / "verification.json")
+    loop = GLib.MainLoop ()
+    got = []
+    def verified (results, exception):
+        got.append ((results, exception))
+        loop.quit ()
+
+    # Returns at once; the results arrive from the main loop.
+    VerifyPackages.verify_packages (verifier, cache_file, callback=verified)
+    assert got == []
+    GLib.timeout_add (10000, loop.quit)
+    loop.run ()
+    assert got == [({ 'cups': [],
+                      'hplip': [],
+                      'missing': ['package missing is not installed'] },
+                    None)]
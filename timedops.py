@@ -18,11 +18,14 @@
 ## along with this program; if not, write to the Free Software
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import concurrent.futures
 import dbus.mainloop.glib
+import functools
 from gi.repository import GObject
 from gi.repository import GLib
 from gi.repository import Gdk
 from gi.repository import Gtk
+import os
 import subprocess
 import threading
 import config
@@ -39,6 +42,78 @@ dbus.mainloop.glib.threads_init ()
 class OperationCanceled(RuntimeError):
     pass
 
+class OperationTimedOut(OperationCanceled):
+    pass
+
+# The troubleshooter session, if any, that records the outcome of
+# each TimedOperation and TimedSubprocess, or replays them instead of
+# running anything.
+_session = None
+
+def set_session (session):
+    global _session
+    _session = session
+
+def replaying ():
+    """
+    Whether operations are being replayed from a recorded session
+    rather than run.
+    """
+    return _session is not None and _session.replaying
+
+def _replayed (name):
+    if not replaying ():
+        return None
+
+    debugprint ("Replaying %s" % name)
+    replayed = _session.next_operation (name)
+    if replayed is None:
+        # This didn't happen when the session was recorded.
+        replayed = (None, OperationCanceled ())
+
+    return replayed
+
+def _record (name, result, exception=None):
+    if _session is not None:
+        _session.record_operation (name, result, exception)
+
+def _operation_name (target):
+    # The name must be the same each time the operation is run, so
+    # that a replay finds what was recorded.  Bound methods are named
+    # after their function, and repr() is never used as it includes
+    # the object's address.
+    while isinstance (target, functools.partial):
+        name = getattr (target, '__name__', None)
+        if name:
+            return name
+
+        target = target.func
+
+    target = getattr (target, '__func__', target)
+    return getattr (target, '__name__', None) or type (target).__name__
+
+def record_value (name, fn, *args, **kwds):
+    """
+    Call fn (*args, **kwds) and return its result, recording it in
+    the troubleshooter session if there is one.  When replaying,
+    return the recorded result instead of calling fn.
+    """
+    replayed = _replayed (name)
+    if replayed is not None:
+        (result, exception) = replayed
+        if exception is not None:
+            raise exception
+        return result
+
+    try:
+        result = fn (*args, **kwds)
+    except Exception as e:
+        _record (name, None, e)
+        raise
+
+    _record (name, result)
+    return result
+
 class Timed:
     def run (self):
         pass
@@ -49,6 +124,11 @@ class Timed:
 class TimedSubprocess(Timed):
     def __init__ (self, timeout=60000, parent=None, show_dialog=True,
                   **args):
+        self.name = os.path.basename (args['args'][0])
+        self.replayed = _replayed (self.name)
+        if self.replayed is not None:
+            return
+
         self.subp = subprocess.Popen (**args)
         self.output = dict()
         self.io_source = []
@@ -69,6 +149,12 @@ class TimedSubprocess(Timed):
         self.wait_window = None
 
     def run (self):
+        if self.replayed is not None:
+            (result, exception) = self.replayed
+            if exception is not None:
+                raise exception
+            return result
+
         if self.show_dialog:
             self.wait_source = GLib.timeout_add_seconds (
                 1,
@@ -85,9 +171,11 @@ class TimedSubprocess(Timed):
             GLib.source_remove (source)
         if self.wait_window is not None:
             self.wait_window.destroy ()
-        return (self.output.get (self.subp.stdout, '').split ('\n'),
-                self.output.get (self.subp.stderr, '').split ('\n'),
-                self.subp.poll ())
+        result = (self.output.get (self.subp.stdout, '').split ('\n'),
+                  self.output.get (self.subp.stderr, '').split ('\n'),
+                  self.subp.poll ())
+        _record (self.name, result)
+        return result
 
     def do_timeout (self):
         self.timeout_source = None
@@ -174,6 +262,14 @@ class TimedOperation(Timed):
         self.show_dialog = show_dialog
         self.callback = callback
         self.context = context
+        self.name = _operation_name (target)
+        self.replayed = _replayed (self.name)
+        if self.replayed is not None:
+            self.use_callback = callback is not None
+            if self.use_callback:
+                GLib.idle_add (self._replay_callback)
+            return
+
         self.thread = OperationThread (target=target,
                                        args=args,
                                        kwargs=kwargs)
@@ -187,6 +283,12 @@ class TimedOperation(Timed):
         if self.use_callback:
             raise RuntimeError
 
+        if self.replayed is not None:
+            (result, exception) = self.replayed
+            if exception is not None:
+                raise exception
+            return result
+
         if self.show_dialog:
             wait = Gtk.MessageDialog (parent=self.parent,
                                       modal=True, destroy_with_parent=True,
@@ -209,7 +311,24 @@ class TimedOperation(Timed):
         if self.show_dialog:
             wait.destroy ()
 
-        return self.thread.collect_result ()
+        try:
+            result = self.thread.collect_result ()
+        except Exception as e:
+            _record (self.name, None, e)
+            raise
+
+        _record (self.name, result)
+        return result
+
+    def _replay_callback (self):
+        if self.callback is not None:
+            (result, exception) = self.replayed
+            if self.context is not None:
+                self.callback (result, exception, self.context)
+            else:
+                self.callback (result, exception)
+
+        return False
 
     def _check_thread (self):
         if self.thread.is_alive ():
@@ -242,3 +361,366 @@ class TimedOperation(Timed):
             Gtk.main_quit ()
 
         return False
+
+######
+###### Non-blocking operations.  Each operation's outcome is delivered
+###### through a concurrent.futures.Future, and TimedOperations runs a
+###### group of them at once, calling back from the main loop when
+###### they have all finished.  Only its run() method waits, and then
+###### with one main loop for the whole group.
+######
+
+class Operation:
+    """
+    Something to run in the background.  It is started by
+    TimedOperations, and its outcome is then available from the
+    concurrent.futures.Future in the future attribute.
+    """
+    name = None
+
+    def __init__ (self):
+        self.future = concurrent.futures.Future ()
+        self.started = False
+
+    def start (self):
+        self.started = True
+        self.future.set_running_or_notify_cancel ()
+
+    def _finish (self, result=None, exception=None):
+        try:
+            if exception is None:
+                self.future.set_result (result)
+            else:
+                self.future.set_exception (exception)
+        except concurrent.futures.InvalidStateError:
+            # Already canceled.
+            pass
+
+    def cancel (self, exception=None):
+        """
+        Abandon the operation.  Its future raises OperationCanceled.
+        """
+        if exception is None:
+            exception = OperationCanceled ()
+
+        if not self.started:
+            self.future.set_running_or_notify_cancel ()
+            self.started = True
+
+        self._finish (exception=exception)
+
+class ThreadOperation(Operation):
+    """
+    Call a function in a separate thread.
+    """
+    def __init__ (self, target, args=(), kwargs={}):
+        Operation.__init__ (self)
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.name = _operation_name (target)
+
+    def start (self):
+        Operation.start (self)
+        thread = threading.Thread (target=self._run)
+        thread.daemon = True
+        thread.start ()
+
+    def _run (self):
+        try:
+            debugprint ("Calling %s" % self.target)
+            result = self.target (*self.args, **self.kwargs)
+            debugprint ("Done")
+        except Exception as e:
+            debugprint ("Caught exception %s" % e)
+            self._finish (exception=e)
+            return
+
+        self._finish (result)
+
+class SubprocessOperation(Operation):
+    """
+    Run a command.  The result is the same as for
+    TimedSubprocess.run: (stdout lines, stderr lines, exit status).
+    Canceling the operation kills the command.
+    """
+    def __init__ (self, **args):
+        Operation.__init__ (self)
+        self.popen_args = args
+        self.subp = None
+        self.name = os.path.basename (args['args'][0])
+
+    def start (self):
+        Operation.start (self)
+        try:
+            self.subp = subprocess.Popen (**self.popen_args)
+        except Exception as e:
+            self._finish (exception=e)
+            return
+
+        thread = threading.Thread (target=self._run)
+        thread.daemon = True
+        thread.start ()
+
+    def _run (self):
+        try:
+            (stdout, stderr) = self.subp.communicate ()
+        except Exception as e:
+            self._finish (exception=e)
+            return
+
+        self._finish (((stdout or b'').decode ("utf-8").split ('\n'),
+                       (stderr or b'').decode ("utf-8").split ('\n'),
+                       self.subp.returncode))
+
+    def cancel (self, exception=None):
+        Operation.cancel (self, exception)
+        if self.subp is not None and self.subp.poll () is None:
+            debugprint ("Command canceled")
+            self.subp.kill ()
+
+class TimedOperations(Timed):
+    """
+    Run several operations at the same time, with one deadline and
+    one wait dialog.
+
+    When all the operations have finished, or the deadline has passed,
+    or the wait dialog is canceled, the callback is called from the
+    main loop with a list of (result, exception) in the same order as
+    the operations.  Without a callback, run() waits for the list and
+    returns it, running a main loop of its own to do so; code called
+    from the main loop should use a callback (see L{run_steps}).  Operations still running by then are canceled, and
+    their exception is OperationTimedOut or OperationCanceled.
+
+    Like TimedOperation, the outcome is recorded in the troubleshooter
+    session, if there is one, and when replaying the operations are
+    not started.
+    """
+    def __init__ (self, operations, timeout=None, parent=None,
+                  show_dialog=False, callback=None, context=None,
+                  max_running=None, name=None):
+        """
+        @param operations: operations to run
+        @type operations: list of L{Operation}
+        @param timeout: deadline in milliseconds, or None for none
+        @param callback: fn (results) or fn (results, context)
+        @param max_running: most operations to run at once, or None
+        for no limit
+        @param name: name to record the outcome under, by default
+        made from the operations' names
+        """
+        self.operations = list (operations)
+        self.parent = parent
+        self.callback = callback
+        self.context = context
+        self.max_running = max_running
+        self.wait_window = None
+        self.wait_source = None
+        self.timeout_source = None
+        self.finished = False
+        self.results = None
+        self._loop = None
+        if name is None:
+            name = "+".join ([op.name or "" for op in self.operations])
+
+        self.name = name
+        replayed = _replayed (self.name)
+        if replayed is not None:
+            (results, exception) = replayed
+            if exception is not None:
+                results = [(None, exception)] * len (self.operations)
+
+            self.finished = True
+            self.results = [tuple (x) for x in results]
+            if callback is not None:
+                GLib.idle_add (self._callback)
+            return
+
+        if show_dialog:
+            self.wait_source = GLib.timeout_add_seconds (
+                1,
+                self.show_wait_window)
+
+        if timeout is not None:
+            self.timeout_source = GLib.timeout_add (timeout, self.do_timeout)
+
+        for op in self.operations:
+            op.future.add_done_callback (self._operation_done)
+
+        self._start_more ()
+        if not self.operations:
+            GLib.idle_add (self._check)
+
+    def run (self):
+        """
+        Wait for the operations to finish.
+
+        @returns: list of (result, exception)
+        """
+        if self.callback is not None:
+            raise RuntimeError
+
+        if not self.finished:
+            self._loop = GLib.MainLoop ()
+            self._loop.run ()
+            self._loop = None
+
+        return self.results
+
+    def _start_more (self):
+        waiting = [op for op in self.operations if not op.started]
+        if self.max_running is not None:
+            running = len ([op for op in self._pending () if op.started])
+            waiting = waiting[:max (0, self.max_running - running)]
+
+        for op in waiting:
+            op.start ()
+
+    def _operation_done (self, future):
+        # This may be called in the operation's thread.
+        GLib.idle_add (self._check)
+
+    def _pending (self):
+        return [op for op in self.operations if not op.future.done ()]
+
+    def _check (self):
+        if self.finished:
+            return False
+
+        self._start_more ()
+        pending = self._pending ()
+        if self.wait_window is not None and self.operations:
+            done = len (self.operations) - len (pending)
+            self.progress.set_fraction (done / len (self.operations))
+
+        if not pending:
+            self._finish ()
+
+        return False
+
+    def _finish (self):
+        if self.finished:
+            return
+
+        self.finished = True
+        for source in [self.wait_source, self.timeout_source]:
+            if source:
+                GLib.source_remove (source)
+
+        self.wait_source = self.timeout_source = None
+        if self.wait_window is not None:
+            self.wait_window.destroy ()
+            self.wait_window = None
+
+        results = []
+        for op in self.operations:
+            exception = op.future.exception ()
+            if exception is None:
+                results.append ((op.future.result (), None))
+            else:
+                results.append ((None, exception))
+
+        self.results = results
+        _record (self.name, results)
+        if self._loop is not None:
+            self._loop.quit ()
+
+        self._callback ()
+
+    def _callback (self):
+        if self.callback is not None:
+            if self.context is not None:
+                self.callback (self.results, self.context)
+            else:
+                self.callback (self.results)
+
+        return False
+
+    def _cancel_pending (self, exception):
+        for op in self._pending ():
+            op.cancel (exception)
+
+    def do_timeout (self):
+        debugprint ("Operations timed out")
+        self.timeout_source = None
+        self._cancel_pending (OperationTimedOut ())
+        self._finish ()
+        return False
+
+    def show_wait_window (self):
+        self.wait_source = None
+        Gdk.threads_enter ()
+        wait = Gtk.MessageDialog (parent=self.parent,
+                                  modal=True, destroy_with_parent=True,
+                                  message_type=Gtk.MessageType.INFO,
+                                  buttons=Gtk.ButtonsType.CANCEL,
+                                  text=_("Please wait"))
+        wait.connect ("delete_event", lambda *args: False)
+        wait.connect ("response", self.wait_window_response)
+        if self.parent:
+            wait.set_transient_for (self.parent)
+        wait.set_position (Gtk.WindowPosition.CENTER_ON_PARENT)
+        wait.format_secondary_text (_("Gathering information"))
+        self.progress = Gtk.ProgressBar ()
+        wait.get_message_area ().pack_start (self.progress, False, False, 0)
+        wait.show_all ()
+        self.wait_window = wait
+        Gdk.threads_leave ()
+        self._check ()
+        return False
+
+    def wait_window_response (self, dialog, response):
+        if response == Gtk.ResponseType.CANCEL:
+            self.cancel ()
+
+    def cancel (self):
+        debugprint ("Operations canceled")
+        self._cancel_pending (OperationCanceled ())
+        self._finish ()
+        return False
+
+def run_steps (steps, callback=None, started=None, **kwds):
+    """
+    Run a series of L{TimedOperations}, each depending on the outcome
+    of the ones before.
+
+    steps is a generator.  It yields the keyword arguments for each
+    TimedOperations in turn, is sent that group's results, and
+    finally returns the outcome.  Any other keyword arguments, such
+    as parent, are passed to every TimedOperations.
+
+    With a callback, this returns at once and the steps are run from
+    the main loop, calling callback (outcome, exception) when done.
+    Without one, it waits for them and returns the outcome.
+
+    @param started: called with each TimedOperations as it starts,
+    e.g. so that it can be canceled
+    """
+    if callback is None:
+        results = None
+        try:
+            while True:
+                ops = TimedOperations (**dict (kwds, **steps.send (results)))
+                if started:
+                    started (ops)
+
+                results = ops.run ()
+        except StopIteration as e:
+            return e.value
+
+    def step (results):
+        try:
+            args = steps.send (results)
+        except StopIteration as e:
+            callback (e.value, None)
+            return
+        except Exception as e:
+            debugprint ("Steps failed: %s" % repr (e))
+            callback (None, e)
+            return
+
+        ops = TimedOperations (callback=step, **dict (kwds, **args))
+        if started:
+            started (ops)
+
+    step (None)
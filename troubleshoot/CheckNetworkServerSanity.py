@@ -27,7 +27,10 @@ import os
 import smburi
 import socket
 import subprocess
-from timedops import TimedSubprocess, TimedOperation
+import threading
+import time
+from timedops import (ThreadOperation, OperationCanceled, record_value,
+                      run_steps)
 from .base import *
 
 try:
@@ -35,170 +38,288 @@ try:
 except:
     pass
 
+# Seconds allowed for all of the network probes together.
+PROBE_DEADLINE = 20
+
+class _ProbeRun:
+    """
+    Answers found by probes running at the same time.  Each probe
+    reports its answers as it finds them, so that those found before
+    the deadline are kept.
+    """
+    def __init__ (self):
+        self.answers = {}
+        self.lock = threading.Lock ()
+        self.traceroute = None
+        self.traceroute_wanted = True
+        self.traceroute_done = threading.Event ()
+
+    def report (self, key, value):
+        with self.lock:
+            self.answers[key] = value
+
+        # A traceroute is only interesting if the server can't be
+        # reached.
+        if self.reachable ():
+            self.stop_traceroute (wanted=False)
+
+    def collect (self):
+        with self.lock:
+            return dict (self.answers)
+
+    def reachable (self):
+        with self.lock:
+            return bool (self.answers.get ('remote_server_connect_ipp') or
+                         self.answers.get ('remote_server_smb'))
+
+    def stop_traceroute (self, wanted):
+        with self.lock:
+            self.traceroute_wanted = self.traceroute_wanted and wanted
+            proc = self.traceroute
+
+        if proc is not None and proc.poll () is None:
+            proc.kill ()
+
+def _probe_resolve (run, server_name, server_port):
+    try:
+        ai = socket.getaddrinfo (server_name, server_port)
+        resolves = [family_socktype_proto_canonname_sockaddr[4][0] for
+                    family_socktype_proto_canonname_sockaddr in ai]
+    except socket.gaierror:
+        resolves = False
+
+    run.report ('remote_server_name_resolves', resolves)
+
+def _probe_ipp (run, server_name, server_port, encryption, uri):
+    try:
+        c = cups.Connection (host=server_name, port=server_port,
+                             encryption=encryption)
+        ipp_connect = True
+    except RuntimeError:
+        ipp_connect = False
+
+    run.report ('remote_server_connect_ipp', ipp_connect)
+    if not ipp_connect:
+        return
+
+    try:
+        c.getPrinters ()
+        cups_server = True
+    except:
+        cups_server = False
+
+    run.report ('remote_server_cups', cups_server)
+    if cups_server and uri:
+        try:
+            attr = c.getPrinterAttributes (uri=uri)
+            run.report ('remote_cups_queue_attributes', attr)
+        except:
+            pass
+
+def _probe_smb (run, name, printer_dict):
+    # Try to see if we can connect using smbc.
+    context = None
+    try:
+        context = smbc.Context ()
+        dir = context.opendir ("smb://%s/" % name)
+        shares = dir.getdents ()
+        run.report ('remote_server_smb_shares', shares)
+        run.report ('remote_server_smb', True)
+    except NameError:
+        # No smbc support
+        pass
+    except RuntimeError as e:
+        (e, s) = e.args
+        run.report ('remote_server_smb_shares', (e, s))
+
+    if context is not None and printer_dict is not None:
+        uri = printer_dict.get ('device-uri', '')
+        u = smburi.SMBURI (uri)
+        (group, host, share, user, password) = u.separate ()
+        accessible = False
+        try:
+            f = context.open ("smb://%s/%s" % (host, share), os.O_RDWR, 0o777)
+            accessible = True
+        except RuntimeError as e:
+            (e, s) = e.args
+            accessible = (e, s)
+
+        run.report ('remote_server_smb_share_anon_access', accessible)
+
+def _probe_traceroute (run, server_name):
+    try:
+        with run.lock:
+            if not run.traceroute_wanted:
+                return
+
+            proc = subprocess.Popen (['traceroute', '-w', '1', server_name],
+                                     close_fds=True,
+                                     stdin=subprocess.DEVNULL,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+            run.traceroute = proc
+
+        (stdout, stderr) = proc.communicate ()
+        with run.lock:
+            if run.traceroute_wanted:
+                run.answers['remote_server_traceroute'] = \
+                    (stdout.decode ("utf-8").split ('\n'),
+                     stderr.decode ("utf-8").split ('\n'),
+                     proc.returncode)
+
+            run.traceroute = None
+    finally:
+        run.traceroute_done.set ()
+
+def _finished (results):
+    # Whether all the probes finished in time.
+    for (result, exc) in results:
+        if isinstance (exc, OperationCanceled):
+            return False
+
+    return True
+
+def _probe_steps (run, answers, end):
+    def probe (operations, timeout=None):
+        if timeout is None:
+            timeout = max (0, end - time.monotonic ())
+
+        return dict (operations=operations, timeout=int (timeout * 1000))
+
+    def found ():
+        # The answers are part of a recorded session, as a replay
+        # does not run the probes.
+        return record_value ('probe_answers', run.collect)
+
+    server_name = answers['remote_server_name']
+    server_port = answers.get('remote_server_port', 631)
+    try_connect = False
+    if server_name:
+        # Try resolving the hostname.
+        finished = _finished ((yield probe ([ThreadOperation (
+            _probe_resolve, (run, server_name, server_port))])))
+        result = found ()
+        if not finished:
+            return result
+
+        resolves = result.get ('remote_server_name_resolves')
+        if resolves:
+            try_connect = True
+
+        ipaddr = answers.get ('remote_server_ip_address', '')
+        if resolves:
+            if ipaddr:
+                try:
+                    resolves.index (ipaddr)
+                except ValueError:
+                    # The IP address given doesn't match the server name.
+                    # Use the IP address instead of the name.
+                    server_name = ipaddr
+                    try_connect = True
+        elif ipaddr:
+            server_name = ipaddr
+            try_connect = True
+    else:
+        server_name = answers['remote_server_ip_address']
+        # Validate it.
+        finished = _finished ((yield probe ([ThreadOperation (
+            _probe_resolve, (run, server_name, server_port))])))
+        if not finished:
+            return found ()
+
+        try_connect = True
+
+    run.report ('remote_server_try_connect', server_name)
+    if not try_connect:
+        return found ()
+
+    operations = []
+    if answers.get ('cups_device_uri_scheme', 'ipp') in ['ipp',
+                                                         'http',
+                                                         'https']:
+        if answers.get ('cups_device_uri_scheme') == 'https':
+            encryption = cups.HTTP_ENCRYPT_REQUIRED
+        else:
+            encryption = cups.HTTP_ENCRYPT_IF_REQUESTED
+
+        cups_printer_dict = answers.get ('cups_printer_dict', {})
+        uri = cups_printer_dict.get ('device-uri', None)
+        operations.append (ThreadOperation (_probe_ipp,
+                                            (run, server_name, server_port,
+                                             encryption, uri)))
+
+    operations.append (ThreadOperation (_probe_smb,
+                                        (run, server_name,
+                                         answers.get ('cups_printer_dict'))))
+
+    # Try traceroute if we haven't already.
+    traceroute = 'remote_server_traceroute' not in answers
+    if traceroute:
+        operations.append (ThreadOperation (_probe_traceroute,
+                                            (run, server_name)))
+
+    if not _finished ((yield probe (operations))) and traceroute:
+        # Out of time.  Stop the traceroute but keep what it found.
+        run.stop_traceroute (wanted=True)
+        yield probe ([ThreadOperation (run.traceroute_done.wait, (1,))],
+                     timeout=2)
+
+    return found ()
+
+def probe_network_server (answers, deadline=PROBE_DEADLINE, parent=None,
+                          show_dialog=False, started=None, callback=None):
+    """
+    Find out what we can about a network server: whether its name
+    resolves, and whether it answers IPP and SMB requests.  The
+    probes run at the same time and all of them together are given
+    at most deadline seconds.  A traceroute runs alongside them but
+    is abandoned if the server turns out to be reachable.
+
+    @param started: called with each L{TimedOperations} as it starts,
+    e.g. so that it can be canceled
+    @param callback: if given, called from the main loop as
+    callback (answers, exception) instead of waiting for the answers
+    @returns: the answers found when the probes finish or the
+    deadline passes
+    """
+    end = time.monotonic () + deadline
+    return run_steps (_probe_steps (_ProbeRun (), answers, end),
+                      callback=callback, started=started,
+                      parent=parent, show_dialog=show_dialog)
+
 class CheckNetworkServerSanity(Question):
     def __init__ (self, troubleshooter):
         Question.__init__ (self, troubleshooter, "Check network server sanity")
         troubleshooter.new_page (Gtk.Label (), self)
 
-    def display (self):
+    def display_async (self, callback):
         # Collect useful information.
 
         self.answers = {}
+        self.op = None
         answers = self.troubleshooter.answers
         if ('remote_server_name' not in answers and
             'remote_server_ip_address' not in answers):
-            return False
+            callback (False)
+            return
 
-        parent = self.troubleshooter.get_window ()
+        def started (op):
+            self.op = op
 
-        server_name = answers['remote_server_name']
-        server_port = answers.get('remote_server_port', 631)
-        try_connect = False
-        if server_name:
-            # Try resolving the hostname.
-            try:
-                ai = socket.getaddrinfo (server_name, server_port)
-                resolves = [family_socktype_proto_canonname_sockaddr[4][0] for
-                             family_socktype_proto_canonname_sockaddr in ai]
-                try_connect = True
-            except socket.gaierror:
-                resolves = False
-
-            self.answers['remote_server_name_resolves'] = resolves
-
-            ipaddr = answers.get ('remote_server_ip_address', '')
-            if resolves:
-                if ipaddr:
-                    try:
-                        resolves.index (ipaddr)
-                    except ValueError:
-                        # The IP address given doesn't match the server name.
-                        # Use the IP address instead of the name.
-                        server_name = ipaddr
-                        try_connect = True
-            elif ipaddr:
-                server_name = ipaddr
-                try_connect = True
-        else:
-            server_name = answers['remote_server_ip_address']
-            # Validate it.
-            try:
-                ai = socket.getaddrinfo (server_name, server_port)
-                resolves = [family_socktype_proto_canonname_sockaddr1[4][0] for
-                             family_socktype_proto_canonname_sockaddr1 in ai]
-            except socket.gaierror:
-                resolves = False
-
-            self.answers['remote_server_name_resolves'] = resolves
-            try_connect = True
+        def probed (found, exception):
+            self.op = None
+            if exception is None:
+                self.answers = found
 
-        self.answers['remote_server_try_connect'] = server_name
-
-        if (try_connect and
-            answers.get ('cups_device_uri_scheme', 'ipp') in ['ipp',
-                                                              'http',
-                                                              'https']):
-            if answers.get ('cups_device_uri_scheme') == 'https':
-                encryption = cups.HTTP_ENCRYPT_REQUIRED
-            else:
-                encryption = cups.HTTP_ENCRYPT_IF_REQUESTED
-
-            try:
-                self.op = TimedOperation (cups.Connection,
-                                          kwargs={"host": server_name,
-                                                  "port": server_port,
-                                                  "encryption": encryption},
-                                          parent=parent)
-                c = self.op.run ()
-                ipp_connect = True
-            except RuntimeError:
-                ipp_connect = False
-
-            self.answers['remote_server_connect_ipp'] = ipp_connect
-
-            if ipp_connect:
-                try:
-                    self.op = TimedOperation (c.getPrinters, parent=parent)
-                    self.op.run ()
-                    cups_server = True
-                except:
-                    cups_server = False
-
-                self.answers['remote_server_cups'] = cups_server
-
-                if cups_server:
-                    cups_printer_dict = answers.get ('cups_printer_dict', {})
-                    uri = cups_printer_dict.get ('device-uri', None)
-                    if uri:
-                        try:
-                            self.op = TimedOperation (c.getPrinterAttributes,
-                                                      kwargs={"uri": uri},
-                                                      parent=parent)
-                            attr = self.op.run ()
-                            self.answers['remote_cups_queue_attributes'] = attr
-                        except:
-                            pass
-
-        if try_connect:
-            # Try to see if we can connect using smbc.
-            context = None
-            try:
-                context = smbc.Context ()
-                name = self.answers['remote_server_try_connect']
-                self.op = TimedOperation (context.opendir,
-                                          args=("smb://%s/" % name,),
-                                          parent=parent)
-                dir = self.op.run ()
-                self.op = TimedOperation (dir.getdents, parent=parent)
-                shares = self.op.run ()
-                self.answers['remote_server_smb'] = True
-                self.answers['remote_server_smb_shares'] = shares
-            except NameError:
-                # No smbc support
-                pass
-            except RuntimeError as e:
-                (e, s) = e.args
-                self.answers['remote_server_smb_shares'] = (e, s)
-
-            if context is not None and 'cups_printer_dict' in answers:
-                uri = answers['cups_printer_dict'].get ('device-uri', '')
-                u = smburi.SMBURI (uri)
-                (group, host, share, user, password) = u.separate ()
-                accessible = False
-                try:
-                    self.op = TimedOperation (context.open,
-                                              args=("smb://%s/%s" % (host,
-                                                                     share),
-                                                    os.O_RDWR,
-                                                    0o777),
-                                              parent=parent)
-                    f  = self.op.run ()
-                    accessible = True
-                except RuntimeError as e:
-                    (e, s) = e.args
-                    accessible = (e, s)
-
-                self.answers['remote_server_smb_share_anon_access'] = accessible
-
-        # Try traceroute if we haven't already.
-        if (try_connect and
-            'remote_server_traceroute' not in answers):
-            try:
-                self.op = TimedSubprocess (parent=parent, close_fds=True,
-                                           args=['traceroute', '-w', '1',
-                                                 server_name],
-                                           stdin=subprocess.DEVNULL,
-                                           stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE)
-                self.answers['remote_server_traceroute'] = self.op.run ()
-            except:
-                # Problem executing command.
-                pass
-
-        return False
+            callback (False)
+
+        parent = self.troubleshooter.get_window ()
+        probe_network_server (answers, parent=parent, show_dialog=True,
+                              started=started, callback=probed)
 
     def collect_answer (self):
         return self.answers
 
     def cancel_operation (self):
-        self.op.cancel ()
+        if self.op is not None:
+            self.op.cancel ()
@@ -27,6 +27,7 @@ import cupshelpers
 import installpackage
 import os
 import subprocess
+import tempfile
 from timedops import TimedOperation, TimedSubprocess
 from .base import *
 from functools import reduce
@@ -64,18 +65,32 @@ class CheckPPDSanity(Question):
 
         parent = self.troubleshooter.get_window ()
         name = answers['cups_queue']
+        def get_ppd (c, name):
+            # Return the contents rather than a temporary file name,
+            # so that they are kept if the session is recorded.
+            filename = c.getPPD (name)
+            try:
+                with open (filename, 'rb') as f:
+                    return f.read ()
+            finally:
+                os.unlink (filename)
+
         tmpf = None
         try:
             cups.setServer ('')
             self.op = TimedOperation (cups.Connection, parent=parent)
             c = self.op.run ()
-            self.op = TimedOperation (c.getPPD, args=(name,), parent=parent)
-            tmpf = self.op.run ()
+            self.op = TimedOperation (get_ppd, args=(c, name), parent=parent)
+            contents = self.op.run ()
         except RuntimeError:
             return False
         except cups.IPPError:
             return False
 
+        (fd, tmpf) = tempfile.mkstemp ()
+        with os.fdopen (fd, 'wb') as f:
+            f.write (contents)
+
         self.install_button.hide ()
         title = None
         text = None
@@ -25,7 +25,7 @@ import subprocess
 from .base import *
 import os
 import shlex
-from timedops import TimedSubprocess
+from timedops import TimedSubprocess, record_value
 
 class CheckSELinux(Question):
     def __init__ (self, troubleshooter):
@@ -37,14 +37,17 @@ class CheckSELinux(Question):
         #answers = self.troubleshooter.answers
 
         RESTORECON = "/sbin/restorecon"
-        if not os.access (RESTORECON, os.X_OK):
-            return False
+        def selinux_enabled ():
+            if not os.access (RESTORECON, os.X_OK):
+                return False
 
-        try:
-            import selinux
-        except ImportError:
-            return False
-        if not selinux.is_selinux_enabled():
+            try:
+                import selinux
+            except ImportError:
+                return False
+            return bool (selinux.is_selinux_enabled())
+
+        if not record_value ('selinux_enabled', selinux_enabled):
             return False
 
         paths = ["/etc/cups/", "/usr/lib/cups/", "/usr/share/cups/"]
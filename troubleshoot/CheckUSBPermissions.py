@@ -23,7 +23,7 @@
 import glob
 import os
 import subprocess
-from timedops import TimedSubprocess
+from timedops import TimedSubprocess, record_value
 import urllib.parse
 from .base import *
 from gi.repository import Gtk
@@ -52,18 +52,20 @@ class CheckUSBPermissions(Question):
             return False
 
         LSUSB = "/sbin/lsusb"
-        if not os.access (LSUSB, os.X_OK):
-            return False
-
         GETFACL = "/usr/bin/getfacl"
-        if not os.access (GETFACL, os.X_OK):
+        def have_tools ():
+            return (os.access (LSUSB, os.X_OK) and
+                    os.access (GETFACL, os.X_OK))
+
+        if not record_value ('have_tools', have_tools):
             return False
 
+        parent = self.troubleshooter.get_window ()
+
         new_environ = os.environ.copy()
         new_environ['LC_ALL'] = "C"
 
         # Run lsusb
-        parent = self.troubleshooter.get_window ()
         try:
             self.op = TimedSubprocess (parent=parent,
                                        args=[LSUSB, "-v"],
@@ -134,7 +136,8 @@ class CheckUSBPermissions(Question):
         infos = {}
         paths = []
         if not scheme.startswith ('hp'):
-            paths.extend (glob.glob ("/dev/usb/lp?"))
+            paths.extend (record_value ('glob', glob.glob, "/dev/usb/lp?"))
+
         for mfr_id, mdls in dev_by_id.items ():
             for mdl_id, devs in mdls.items ():
                 for dev in devs:
@@ -22,17 +22,10 @@
 from gi.repository import Gtk
 
 import cups
-import os
-from tempfile import NamedTemporaryFile
-import datetime
 import time
-from timedops import TimedOperation, OperationCanceled
+from timedops import TimedOperation, OperationCanceled, record_value
 from .base import *
-
-try:
-    from systemd import journal
-except:
-    journal = False
+from .ErrorLogFetch import error_log_size, journal_checkpoint
 
 class ErrorLogCheckpoint(Question):
     def __init__ (self, troubleshooter):
@@ -134,13 +127,13 @@ class ErrorLogCheckpoint(Question):
         if 'error_log_checkpoint' in self.answers:
             return self.answers
 
-        tmpf = NamedTemporaryFile()
+        # Only the size is needed, so avoid keeping a copy of the log.
+        size = 0
         try:
-            self.op = TimedOperation (self.authconn.getFile,
-                                        args=["/admin/log/error_log"],
-                                        kwargs={'file': tmpf},
-                                        parent=parent)
-            self.op.run ()
+            self.op = TimedOperation (error_log_size,
+                                      args=(self.authconn,),
+                                      parent=parent)
+            size = self.op.run ()
         except (RuntimeError, cups.IPPError) as e:
             self.answers['error_log_checkpoint_exc'] = e
         except cups.HTTPError as e:
@@ -152,22 +145,20 @@ class ErrorLogCheckpoint(Question):
             self.authconn = factory.get_connection ()
             self.answers['_authenticated_connection'] = self.authconn
 
-        try:
-            statbuf = os.stat (tmpf.name)
-        except OSError:
-            statbuf = [0, 0, 0, 0, 0, 0, 0]
+        self.answers['error_log_checkpoint'] = size
+        self.persistent_answers['error_log_checkpoint'] = size
 
-        self.answers['error_log_checkpoint'] = statbuf[6]
-        self.persistent_answers['error_log_checkpoint'] = statbuf[6]
-
-        if journal:
-            j = journal.Reader ()
-            j.seek_tail ()
-            cursor = j.get_previous ()['__CURSOR']
+        try:
+            checkpoint = record_value ('journal_checkpoint',
+                                       journal_checkpoint)
+        except Exception as e:
+            debugprint ("Cannot read journal: %s" % e)
+            checkpoint = None
+
+        if checkpoint is not None:
+            (cursor, timestamp) = checkpoint
             self.answers['error_log_cursor'] = cursor
             self.persistent_answers['error_log_cursor'] = cursor
-            now = datetime.datetime.fromtimestamp (time.time ())
-            timestamp = now.strftime ("%F %T")
             self.answers['error_log_timestamp'] = timestamp
             self.persistent_answers['error_log_timestamp'] = timestamp
 
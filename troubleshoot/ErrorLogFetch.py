@@ -22,12 +22,15 @@
 
 from gi.repository import Gtk
 
+import base64
 import cups
+import http.client
 import os
-from tempfile import NamedTemporaryFile
+import socket
+import threading
 import datetime
 import time
-from timedops import TimedOperation
+from timedops import TimedOperation, record_value
 from .base import *
 
 try:
@@ -35,6 +38,241 @@ try:
 except:
     journal = False
 
+ERROR_LOG = '/admin/log/error_log'
+
+# Where a local scheduler keeps the previous log after rotating it.
+ROTATED_ERROR_LOG = '/var/log/cups/error_log.O'
+
+_CHUNK_SIZE = 64 * 1024
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__ (self, path, timeout):
+        http.client.HTTPConnection.__init__ (self, 'localhost',
+                                             timeout=timeout)
+        self.path = path
+
+    def connect (self):
+        self.sock = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout (self.timeout)
+        self.sock.connect (self.path)
+
+def _server (connection):
+    server = getattr (connection, '_server', None) or cups.getServer ()
+    port = getattr (connection, '_port', None) or cups.getPort ()
+    return (server, port)
+
+def _is_local (connection):
+    (server, port) = _server (connection)
+    return server[0] == '/' or server == 'localhost'
+
+def _auth_headers (connection, server):
+    """
+    Credentials for reading the error log, which the scheduler only
+    lets administrators see.  A password the connection has already
+    authenticated with is used if there is one; otherwise, on the
+    domain socket, the scheduler is asked to identify us from the
+    socket itself.
+    """
+    user = getattr (connection, '_use_user', None) or cups.getUser ()
+    password = getattr (connection, '_use_password', None)
+    if password:
+        token = base64.b64encode (("%s:%s" % (user, password)).encode ('utf-8'))
+        return { 'Authorization': 'Basic %s' % token.decode ('ascii') }
+
+    if server[0] == '/':
+        return { 'Authorization': 'PeerCred %s' % user }
+
+    return {}
+
+def _http_request (connection, method, headers):
+    """
+    Make a request for the error log directly, for things pycups
+    cannot ask for.  Returns the response, or None if the request
+    could not be made (for instance, the server requires
+    encryption).
+    """
+    encryption = getattr (connection, '_encryption', None)
+    if encryption is None:
+        encryption = cups.getEncryption ()
+    if encryption == cups.HTTP_ENCRYPT_ALWAYS:
+        return None
+
+    (server, port) = _server (connection)
+    headers = dict (headers)
+    headers.update (_auth_headers (connection, server))
+    try:
+        if server[0] == '/':
+            conn = _UnixHTTPConnection (server, timeout=30)
+        else:
+            conn = http.client.HTTPConnection (server, port, timeout=30)
+
+        conn.request (method, ERROR_LOG, headers=headers)
+        return conn.getresponse ()
+    except (OSError, http.client.HTTPException) as e:
+        debugprint ("%s %s failed: %s" % (method, ERROR_LOG, e))
+        return None
+
+def _stream_getfile (connection, consume):
+    """
+    Fetch the whole error log using getFile, passing it to consume()
+    in chunks as it arrives rather than storing it.
+    """
+    (r, w) = os.pipe ()
+    def reader ():
+        with os.fdopen (r, 'rb') as f:
+            for data in iter (lambda: f.read (_CHUNK_SIZE), b''):
+                consume (data)
+
+    thread = threading.Thread (target=reader, daemon=True)
+    thread.start ()
+    try:
+        connection.getFile (ERROR_LOG, fd=w)
+    finally:
+        os.close (w)
+        thread.join ()
+
+def error_log_size (connection):
+    """
+    Find the current size of the error log, without keeping its
+    contents.
+    """
+    response = _http_request (connection, 'HEAD', {})
+    if response is not None:
+        length = response.getheader ('Content-Length')
+        response.close ()
+        if response.status == http.client.OK and length is not None:
+            return int (length)
+
+    size = [0]
+    def count (data):
+        size[0] += len (data)
+
+    _stream_getfile (connection, count)
+    return size[0]
+
+class _LogTail:
+    """
+    Keep the part of a streamed log past an offset.  The part before
+    the offset is only kept until the offset is reached: if the log is
+    shorter than that it has been rotated, and all of it is new.
+    """
+    def __init__ (self, offset):
+        self.offset = offset
+        self.size = 0
+        self.head = []
+        self.tail = []
+
+    def skip (self, size):
+        self.size = size
+        self.head = None
+
+    def feed (self, data):
+        start = self.size
+        self.size += len (data)
+        if self.size <= self.offset:
+            self.head.append (data)
+            return
+
+        if start < self.offset:
+            self.head = None
+            data = data[self.offset - start:]
+
+        self.tail.append (data)
+
+    def rotated (self):
+        return self.size < self.offset
+
+    def data (self):
+        if self.rotated ():
+            return b''.join (self.head)
+
+        return b''.join (self.tail)
+
+def fetch_error_log_tail (connection, offset):
+    """
+    Fetch the error log entries written since it was offset bytes
+    long.  Only that part is requested if the server allows it;
+    otherwise the log is streamed and the first offset bytes
+    discarded.
+
+    If the log is now shorter than offset it has been rotated: the
+    whole of the new log is returned, preceded by the end of the
+    rotated log if the server is local and it is readable.
+
+    Returns a list of lines.
+    """
+    tail = _LogTail (offset)
+    response = _http_request (connection, 'GET',
+                              { 'Range': 'bytes=%d-' % offset })
+    if (response is not None and
+        response.status in [http.client.OK, http.client.PARTIAL_CONTENT]):
+        debugprint ("Error log: HTTP %d" % response.status)
+        if response.status == http.client.PARTIAL_CONTENT:
+            tail.skip (offset)
+
+        for data in iter (lambda: response.read (_CHUNK_SIZE), b''):
+            tail.feed (data)
+        response.close ()
+    else:
+        if response is not None:
+            response.close ()
+        _stream_getfile (connection, tail.feed)
+
+    data = tail.data ()
+    if tail.rotated ():
+        debugprint ("Error log rotated (%d < %d)" % (tail.size, offset))
+        if _is_local (connection):
+            try:
+                with open (ROTATED_ERROR_LOG, 'rb') as f:
+                    f.seek (0, os.SEEK_END)
+                    if f.tell () >= offset:
+                        f.seek (offset)
+                        data = f.read () + data
+            except OSError as e:
+                debugprint ("%s: %s" % (ROTATED_ERROR_LOG, e))
+
+    return data.decode ('utf-8', errors='replace').splitlines ()
+
+def journal_checkpoint ():
+    """
+    Note where the system journal currently ends.
+
+    Returns (cursor, timestamp), or None if the journal is not
+    available.
+    """
+    if not journal:
+        return None
+
+    j = journal.Reader ()
+    j.seek_tail ()
+    cursor = j.get_previous ()['__CURSOR']
+    now = datetime.datetime.fromtimestamp (time.time ())
+    return (cursor, now.strftime ("%F %T"))
+
+def fetch_journal (cursor):
+    """
+    Fetch the scheduler's journal entries since cursor.
+
+    Returns a list of lines, or None if the journal is not available.
+    """
+    if not journal:
+        return None
+
+    def journal_format (x):
+        try:
+            priority = "XACEWNIDd"[x['PRIORITY']]
+        except (IndexError, TypeError):
+            priority = " "
+
+        return (priority + " " +
+                x['__REALTIME_TIMESTAMP'].strftime("[%m/%b/%Y:%T]") +
+                " " + x['MESSAGE'])
+
+    r = journal.Reader ()
+    r.seek_cursor (cursor)
+    r.add_match (_SYSTEMD_UNIT="cups.service")
+    return [journal_format (x) for x in r]
+
 class ErrorLogFetch(Question):
     def __init__ (self, troubleshooter):
         Question.__init__ (self, troubleshooter, "Error log fetch")
@@ -62,26 +300,16 @@ class ErrorLogFetch(Question):
             checkpoint = None
             cursor = None
 
-        def fetch_log (c):
+        def fetch_log (c, offset):
             prompt = c._get_prompt_allowed ()
             c._set_prompt_allowed (False)
             c._connect ()
-            with NamedTemporaryFile (delete=False) as tmpf:
-                success = False
-                try:
-                    c.getFile ('/admin/log/error_log', file = tmpf)
-                    success = True
-                except cups.HTTPError:
-                    try:
-                        os.remove (tmpf.name)
-                    except OSError:
-                        pass
-
+            try:
+                return fetch_error_log_tail (c, offset)
+            except cups.HTTPError:
+                return None
+            finally:
                 c._set_prompt_allowed (prompt)
-                if success:
-                    return tmpf.file
-
-            return None
 
         now = datetime.datetime.fromtimestamp (time.time ()).strftime ("%F %T")
         self.authconn = self.troubleshooter.answers['_authenticated_connection']
@@ -122,32 +350,23 @@ class ErrorLogFetch(Question):
                 pass
 
         self.answers = {}
-        if journal and cursor is not None:
-            def journal_format (x):
-                try:
-                    priority = "XACEWNIDd"[x['PRIORITY']]
-                except (IndexError, TypeError):
-                    priority = " "
-
-                return (priority + " " +
-                        x['__REALTIME_TIMESTAMP'].strftime("[%m/%b/%Y:%T]") +
-                        " " + x['MESSAGE'])
-
-            r = journal.Reader ()
-            r.seek_cursor (cursor)
-            r.add_match (_SYSTEMD_UNIT="cups.service")
-            self.answers['journal'] = [journal_format (x) for x in r]
+        if cursor is not None:
+            try:
+                entries = record_value ('fetch_journal', fetch_journal,
+                                        cursor)
+            except Exception as e:
+                debugprint ("Cannot read journal: %s" % e)
+                entries = None
+
+            if entries is not None:
+                self.answers['journal'] = entries
 
         if checkpoint is not None:
             self.op = TimedOperation (fetch_log,
-                                      (self.authconn,),
+                                      (self.authconn, checkpoint),
                                       parent=parent)
-            tmpfname = self.op.run ()
-            if tmpfname is not None:
-                f = open (tmpfname)
-                f.seek (checkpoint)
-                lines = f.readlines ()
-                os.remove (tmpfname)
+            lines = self.op.run ()
+            if lines is not None:
                 self.answers = { 'error_log': [x.strip () for x in lines] }
 
         if (len (self.answers.get ('journal', [])) +
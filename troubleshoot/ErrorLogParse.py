@@ -21,11 +21,221 @@
 
 from gi.repository import Gtk
 
+import collections
+import re
 from .base import *
-from functools import reduce
-class ErrorLogParse(Question):
+N_ = lambda x: x
+
+# Log levels, most severe first.
+ERROR_LEVELS = "XACE"
+LEVELS = "XACEWNIDd"
+CLASSIFY_LEVELS = frozenset ("XACEW")
+
+# Classes of failure recognised in the log.
+FILTER_CRASHED = "filter-crashed"
+BACKEND_FAILED = "backend-failed"
+AUTHENTICATION_REQUIRED = "authentication-required"
+PPD_MISSING = "ppd-missing"
+
+FAILURE_DESCRIPTIONS = {
+    FILTER_CRASHED: N_("Filter crashed"),
+    BACKEND_FAILED: N_("Backend failed"),
+    AUTHENTICATION_REQUIRED: N_("Authentication required"),
+    PPD_MISSING: N_("PPD file missing"),
+}
+
+LogEntry = collections.namedtuple ('LogEntry',
+                                   ['level', 'timestamp', 'job', 'context',
+                                    'printer', 'message'])
+
+# "E [19/Oct/2026:10:00:00 +0000] [Job 12] message", where the
+# bracketed context is optional.  Journal entries have the same shape.
+# Anything else is taken as a message on its own.  This is applied to
+# the whole log at once, one match per line, which is much quicker
+# than matching each line separately.
+_LINES_RE = re.compile (r'^([XACEWNIDd ]) \[([^]\n]*)\] '
+                        r'(?:\[(?:Job (\d+)|([^]\n]*))\] )?(.*)$'
+                        r'|^(.*)$', re.MULTILINE)
+# The same, for a single entry that may span several lines.
+_ENTRY_RE = re.compile (_LINES_RE.pattern, re.DOTALL)
+_PRINTER_RE = re.compile (r'\b(?:[Pp]rinter|[Qq]ueue|[Cc]lass|on) "([^"]+)"')
+# The entry that says which printer a job is for.
+_QUEUED_RE = re.compile (r'Queued on "([^"]+)"')
+_FAILURE_RE = re.compile (
+    r'PID \d+ \((?P<crashed>[^)]*)\) crashed on signal (?P<signal>\d+)'
+    r'|PID \d+ \((?P<stopped>[^)]*/backend/[^)]*)\) stopped with status'
+    r'|Backend returned status (?P<status>\d+)'
+    r'|(?P<auth>[Aa]uthentication (?:is )?required|auth-info-required'
+    r'|\(Unauthorized\))'
+    r'|(?P<ppd>Unable to open PPD file|PPD file [^ ]* not found'
+    r'|[Nn]o PPD file|Missing PPD file)')
+
+def _classify (message):
+    match = _FAILURE_RE.search (message)
+    if match is None:
+        return None
+
+    crashed = match.group ('crashed')
+    if crashed is not None:
+        if '/backend/' in crashed:
+            return BACKEND_FAILED
+        return FILTER_CRASHED
+
+    if match.group ('stopped') is not None:
+        return BACKEND_FAILED
+
+    status = match.group ('status')
+    if status is not None:
+        if status == '0':
+            return None
+        if status == '2':
+            # CUPS_BACKEND_AUTH_REQUIRED
+            return AUTHENTICATION_REQUIRED
+        return BACKEND_FAILED
+
+    if match.group ('auth') is not None:
+        return AUTHENTICATION_REQUIRED
+
+    return PPD_MISSING
+
+class ParsedErrorLog:
+    """
+    An error log split into entries, indexed by job and by printer,
+    with known failures picked out.  Entries and indices refer to
+    lines by their index in the log.
+    """
+    def __init__ (self, lines):
+        self.lines = lines
+        self.raw_text = "\n".join (lines)
+        records = _LINES_RE.findall (self.raw_text)
+        if len (records) != len (lines):
+            # Some line contained a newline of its own.
+            records = [tuple ([group or ''
+                               for group in _ENTRY_RE.match (line).groups ()])
+                       for line in lines]
+
+        self._records = records
+        self.failures = []
+        self.level_counts = collections.Counter ([record[0]
+                                                  for record in records])
+        del self.level_counts['']
+        by_job = collections.defaultdict (list)
+        by_printer = {}
+        job_printer = {}
+        for index, (level, timestamp, job, context, message,
+                    other) in enumerate (records):
+            if job:
+                by_job[job].append (index)
+
+            if '"' in message:
+                match = _PRINTER_RE.search (message)
+                if match is not None:
+                    printer = match.group (1)
+                    by_printer.setdefault (printer, []).append (index)
+                    if job:
+                        queued = _QUEUED_RE.match (message)
+                        if queued is not None:
+                            job_printer.setdefault (job, queued.group (1))
+
+            # Failures are logged as errors or warnings, apart from
+            # backend exit codes.
+            if level in CLASSIFY_LEVELS or message[:7] == 'Backend':
+                failure = _classify (message)
+                if failure is not None:
+                    self.failures.append ((failure, index))
+
+        # Attribute each job's other entries to its printer.
+        for job, printer in job_printer.items ():
+            indices = set (by_printer[printer])
+            indices.update (by_job[job])
+            by_printer[printer] = sorted (indices)
+
+        self.by_job = { int (job): indices
+                        for job, indices in by_job.items () }
+        self.by_printer = by_printer
+        self.job_printer = { int (job): printer
+                             for job, printer in job_printer.items () }
 
-    ## This could be a LOT smarter.
+    def __len__ (self):
+        return len (self._records)
+
+    def entry (self, index):
+        """
+        Returns the LogEntry for a line.
+        """
+        (level, timestamp, job, context, message,
+         other) = self._records[index]
+        if not timestamp:
+            return LogEntry (None, None, None, None, None, other)
+
+        printer = None
+        if job:
+            job = int (job)
+            printer = self.job_printer.get (job)
+        else:
+            job = None
+
+        if printer is None:
+            match = _PRINTER_RE.search (message)
+            if match is not None:
+                printer = match.group (1)
+
+        return LogEntry (level, timestamp, job, context or None, printer,
+                         message)
+
+    def error_count (self):
+        return sum ([self.level_counts[level] for level in ERROR_LEVELS])
+
+    def failures_by_kind (self):
+        """
+        Returns a dict of failure kind: list of entry indices.
+        """
+        kinds = {}
+        for kind, index in self.failures:
+            kinds.setdefault (kind, []).append (index)
+        return kinds
+
+    def summary (self):
+        """
+        Returns a list of lines summarising the log.
+        """
+        summary = [_("%d errors, %d warnings") %
+                   (self.error_count (), self.level_counts['W'])]
+        for kind, indices in self.failures_by_kind ().items ():
+            jobs = set ()
+            for index in indices:
+                job = self._records[index][2]
+                if job:
+                    jobs.add (int (job))
+
+            line = "%s: %d" % (_(FAILURE_DESCRIPTIONS[kind]), len (indices))
+            if jobs:
+                described = [self._describe_job (job)
+                             for job in sorted (jobs)[:5]]
+                if len (jobs) > 5:
+                    described.append ("...")
+                line += " (%s)" % ", ".join (described)
+            summary.append (line)
+            summary.append ("  " + self.lines[indices[-1]])
+
+        return summary
+
+    def _describe_job (self, job):
+        printer = self.job_printer.get (job)
+        if printer is None:
+            return _("job %d") % job
+        return _("job %d on %s") % (job, printer)
+
+    def text (self):
+        """
+        Returns the summary followed by the log itself.
+        """
+        return "\n".join (self.summary () + ['', self.raw_text])
+
+def parse_error_log (lines):
+    return ParsedErrorLog (lines)
+
+class ErrorLogParse(Question):
 
     def __init__ (self, troubleshooter):
         Question.__init__ (self, troubleshooter, "Error log parse")
@@ -38,30 +248,31 @@ class ErrorLogParse(Question):
         page.pack_start (sw, True, True, 0)
         self.buffer = textview.get_buffer ()
         troubleshooter.new_page (page, self)
+        self.parsed = None
 
     def display (self):
         answers = self.troubleshooter.answers
-        try:
-            journal = answers.get ('journal')
-            error_log = answers.get ('error_log')
-        except KeyError:
-            return False
+        self.parsed = None
+        for name in ['error_log', 'journal']:
+            lines = answers.get (name)
+            if not lines:
+                continue
 
-        display = False
-        if error_log:
-            for line in error_log:
-                if line[0] == 'E':
-                    display = error_log
-                    break
+            parsed = parse_error_log (lines)
+            if parsed.error_count ():
+                self.parsed = parsed
+                break
+
+        if self.parsed is None:
+            return False
 
-        if journal and not display:
-            for line in journal:
-                if line[0] == 'E':
-                    display = journal
-                    break
+        self.buffer.set_text (self.parsed.text ())
+        return True
 
-        if display:
-            self.buffer.set_text (reduce (lambda x, y: x + '\n' + y, 
-                                          display))
+    def collect_answer (self):
+        if self.parsed is None:
+            return {}
 
-        return display != False
+        return { 'error_log_failures':
+                 [(kind, self.parsed.lines[index])
+                  for kind, index in self.parsed.failures] }
@@ -24,6 +24,43 @@ import locale
 from gi.repository import Gtk
 
 from .base import *
+from timedops import record_value
+
+def locale_settings ():
+    """
+    Find the user's locale and the system's default language.
+    """
+    answers = {}
+    (messages, encoding) = locale.getlocale (locale.LC_MESSAGES)
+    (ctype, encoding) = locale.getlocale (locale.LC_CTYPE)
+    answers['user_locale_messages'] = messages
+    answers['user_locale_ctype'] = ctype
+
+    try:
+        system_lang = None
+        conf = None
+        for conffile in ["/etc/locale.conf", "/etc/sysconfig/i18n"]:
+            try:
+                conf = open (conffile).readlines ()
+            except IOError:
+                continue
+
+        if conf is not None:
+            for line in conf:
+                if line.startswith("LC_PAPER="):
+                    system_lang = line[9:].strip ('\n"')
+                elif system_lang is None and line.startswith ("LANG="):
+                    system_lang = line[5:].strip ('\n"')
+
+            if system_lang is not None:
+                dot = system_lang.find ('.')
+                if dot != -1:
+                    system_lang = system_lang[:dot]
+    except:
+        system_lang = None
+
+    answers['system_locale_lang'] = system_lang
+    return answers
 
 class Locale(Question):
     def __init__ (self, troubleshooter):
@@ -52,36 +89,7 @@ class Locale(Question):
         troubleshooter.new_page (page, self)
 
     def display (self):
-        self.answers = {}
-        (messages, encoding) = locale.getlocale (locale.LC_MESSAGES)
-        (ctype, encoding) = locale.getlocale (locale.LC_CTYPE)
-        self.answers['user_locale_messages'] = messages
-        self.answers['user_locale_ctype'] = ctype
-
-        try:
-            system_lang = None
-            conf = None
-            for conffile in ["/etc/locale.conf", "/etc/sysconfig/i18n"]:
-                try:
-                    conf = open (conffile).readlines ()
-                except IOError:
-                    continue
-
-            if conf is not None:
-                for line in conf:
-                    if line.startswith("LC_PAPER="):
-                        system_lang = line[9:].strip ('\n"')
-                    elif system_lang is None and line.startswith ("LANG="):
-                        system_lang = line[5:].strip ('\n"')
-
-                if system_lang is not None:
-                    dot = system_lang.find ('.')
-                    if dot != -1:
-                        system_lang = system_lang[:dot]
-        except:
-            system_lang = None
-
-        self.answers['system_locale_lang'] = system_lang
+        self.answers = record_value ('locale_settings', locale_settings)
 
         printer_page_size = None
         try:
@@ -30,7 +30,7 @@ from gi.repository import Gtk
 from gi.repository import Pango
 import tempfile
 import time
-from timedops import TimedOperation, OperationCanceled
+from timedops import TimedOperation, OperationCanceled, replaying
 
 from .base import *
 
@@ -39,6 +39,44 @@ from errordialogs import *
 
 DBUS_PATH="/com/redhat/PrinterSpooler"
 DBUS_IFACE="com.redhat.PrinterSpooler"
+
+# Job attributes needed for the jobs list.
+JOB_LIST_ATTRIBUTES = ["job-id",
+                       "job-name",
+                       "job-state",
+                       "job-printer-uri",
+                       "printer-name"]
+
+# Job attributes reported for test pages.
+JOB_STATUS_ATTRIBUTES = JOB_LIST_ATTRIBUTES + ["job-state-reasons",
+                                               "job-printer-state-message",
+                                               "job-printer-state-reasons",
+                                               "job-originating-user-name",
+                                               "document-format",
+                                               "job-k-octets",
+                                               "job-impressions-completed",
+                                               "time-at-creation",
+                                               "time-at-processing",
+                                               "time-at-completed",
+                                               "media",
+                                               "PageSize"]
+
+def get_job_attributes (c, jobid, requested_attributes):
+    """
+    Fetch some attributes of one job.
+
+    @returns: dict of attributes, or None if the server no longer
+    knows about the job
+    """
+    try:
+        return c.getJobAttributes (jobid,
+                                   requested_attributes=requested_attributes)
+    except cups.IPPError as e:
+        (e, s) = e.args
+        if e == cups.IPP_NOT_FOUND:
+            return None
+        raise
+
 class PrintTestPage(Question):
     STATE = { cups.IPP_JOB_PENDING: _("Pending"),
               cups.IPP_JOB_HELD: _("Held"),
@@ -160,28 +198,24 @@ class PrintTestPage(Question):
 
         test_jobs = self.persistent_answers.get ('test_page_job_id', [])
         def get_jobs ():
+            # Only fetch the active jobs and the test pages we
+            # submitted, not the whole job history.  After this the
+            # list is kept up to date by the subscription.
             c = self.authconn
-            try:
-                r = ["job-id",
-                     "job-name",
-                     "job-state",
-                     "job-printer-uri",
-                     "printer-name"]
-                jobs_dict = c.getJobs (which_jobs='not-completed',
-                                       my_jobs=False,
-                                       requested_attributes=r)
-                completed_jobs_dict = c.getJobs (which_jobs='completed',
-                                                 requested_attributes=r)
-            except TypeError:
-                # requested_attributes requires pycups 1.9.50
-                jobs_dict = c.getJobs (which_jobs='not-completed',
-                                       my_jobs=False)
-                completed_jobs_dict = c.getJobs (which_jobs='completed')
-            return (jobs_dict, completed_jobs_dict)
+            jobs_dict = c.getJobs (which_jobs='not-completed',
+                                   my_jobs=False,
+                                   requested_attributes=JOB_LIST_ATTRIBUTES)
+            for job in test_jobs:
+                if job not in jobs_dict:
+                    attrs = get_job_attributes (c, job, JOB_LIST_ATTRIBUTES)
+                    if attrs is not None:
+                        jobs_dict[job] = attrs
+
+            return jobs_dict
 
         self.op = TimedOperation (get_jobs, parent=parent)
         try:
-            (jobs_dict, completed_jobs_dict) = self.op.run ()
+            jobs_dict = self.op.run ()
         except (OperationCanceled, cups.IPPError):
             return False
 
@@ -197,15 +231,11 @@ class PrintTestPage(Question):
         # ...as well as any other jobs we've previous submitted as test pages.
         jobs = list (set(test_jobs).union (set (jobs_on_this_printer)))
 
-        completed_jobs_dict = None
         for job in jobs:
             try:
                 j = jobs_dict[job]
             except KeyError:
-                try:
-                    j = completed_jobs_dict[job]
-                except KeyError:
-                    continue
+                continue
 
             iter = model.append (None)
             self.job_to_iter[job] = iter
@@ -240,10 +270,13 @@ class PrintTestPage(Question):
         except (OperationCanceled, cups.IPPError):
             pass
 
-        try:
-            bus = dbus.SystemBus ()
-        except:
-            bus = None
+        # A replayed session must not touch the system bus.
+        bus = None
+        if not replaying ():
+            try:
+                bus = dbus.SystemBus ()
+            except:
+                bus = None
 
         self.bus = bus
         if bus:
@@ -303,20 +336,16 @@ class PrintTestPage(Question):
         model = self.treeview.get_model ()
         jobs = collect_jobs (model).jobs
         def collect_attributes (jobs):
-            job_attrs = None
             c = self.authconn
             with_attrs = []
             for (test, jobid, printer, doc, status) in jobs:
                 attrs = None
                 if test:
-                    try:
-                        attrs = c.getJobAttributes (jobid)
-                    except AttributeError:
-                        # getJobAttributes was introduced in pycups 1.9.35.
-                        if job_attrs is None:
-                            job_attrs = c.getJobs (which_jobs='all')
-
-                        attrs = self.job_attrs[jobid]
+                    attrs = get_job_attributes (c, jobid,
+                                                JOB_STATUS_ATTRIBUTES)
+                    if attrs is None:
+                        # The job has been purged from the history.
+                        attrs = {}
 
                 with_attrs.append ((test, jobid, printer, doc, status, attrs))
 
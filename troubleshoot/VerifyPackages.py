@@ -21,56 +21,259 @@
 
 from gi.repository import Gtk
 
+import json
 import subprocess
 from .base import *
 import os
-from timedops import TimedSubprocess
+from timedops import SubprocessOperation, record_value, replaying, run_steps
+
+# Most package verifications to run at once.
+MAX_WORKERS = 4
+
+# Seconds to allow for verifying all the packages.
+VERIFY_TIMEOUT = 120
+
+class PackageVerifier:
+    """
+    A package manager that can check installed files against its
+    database.
+    """
+    name = None
+    program = None
+
+    # Paths whose modification times change whenever packages are
+    # installed, updated or removed.
+    database = []
+
+    packages = []
+
+    def available (self):
+        return os.access (self.program, os.X_OK)
+
+    def args (self, package):
+        raise NotImplementedError
+
+    def database_mtime (self):
+        """
+        @returns: latest modification time of the package database,
+        or None if it cannot be found
+        """
+        mtimes = []
+        for path in self.database:
+            try:
+                mtimes.append (os.stat (path).st_mtime)
+                if os.path.isdir (path):
+                    for entry in os.scandir (path):
+                        mtimes.append (entry.stat ().st_mtime)
+            except OSError:
+                pass
+
+        if not mtimes:
+            return None
+
+        return max (mtimes)
+
+    def verify (self, package):
+        """
+        @returns: L{SubprocessOperation} whose output lines are empty
+        if nothing has changed
+        """
+        env = os.environ.copy ()
+        env['LC_ALL'] = "C"
+        return SubprocessOperation (args=self.args (package),
+                                    close_fds=True,
+                                    env=env,
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL)
+
+class RpmVerifier(PackageVerifier):
+    name = "rpm"
+    program = "/bin/rpm"
+    database = ["/var/lib/rpm", "/usr/lib/sysimage/rpm"]
+    packages = ["cups",
+                "foomatic",
+                "gutenprint",
+                "hpijs",
+                "hplip",
+                "system-config-printer"]
+
+    def args (self, package):
+        return [self.program, "-V", package]
+
+class DpkgVerifier(PackageVerifier):
+    name = "dpkg"
+    program = "/usr/bin/dpkg"
+    database = ["/var/lib/dpkg/status"]
+    packages = ["cups",
+                "foomatic-filters",
+                "printer-driver-gutenprint",
+                "printer-driver-hpijs",
+                "hplip",
+                "system-config-printer"]
+
+    def args (self, package):
+        return [self.program, "--verify", package]
+
+VERIFIERS = [RpmVerifier, DpkgVerifier]
+
+def find_verifier (name=None):
+    """
+    @param name: name of the verifier to use, or None for the first
+    available one
+    @returns: L{PackageVerifier}, or None
+    """
+    for verifier in VERIFIERS:
+        verifier = verifier ()
+        if name is not None:
+            if verifier.name == name:
+                return verifier
+        elif verifier.available ():
+            return verifier
+
+    return None
+
+def _default_cache_file ():
+    cache_home = (os.environ.get ("XDG_CACHE_HOME") or
+                  os.path.expanduser ("~/.cache"))
+    return os.path.join (cache_home, "system-config-printer",
+                         "package-verification.json")
+
+def _load_cache (cache_file, verifier, mtime):
+    try:
+        with open (cache_file) as f:
+            cache = json.load (f)
+    except (OSError, ValueError):
+        return None
+
+    if (cache.get ('verifier') != verifier.name or
+        cache.get ('database_mtime') != mtime or
+        cache.get ('packages') != verifier.packages):
+        return None
+
+    return cache.get ('results')
+
+def _save_cache (cache_file, verifier, mtime, results):
+    cache = { 'verifier': verifier.name,
+              'database_mtime': mtime,
+              'packages': verifier.packages,
+              'results': results }
+    try:
+        os.makedirs (os.path.dirname (cache_file), exist_ok=True)
+        tmp = "%s.%d" % (cache_file, os.getpid ())
+        with open (tmp, "w") as f:
+            json.dump (cache, f)
+        os.replace (tmp, cache_file)
+    except OSError as e:
+        debugprint ("Unable to write %s: %s" % (cache_file, e))
+
+def _cached_verification (verifier, cache_file):
+    # Returns (verifier name, database mtime, cached results or None),
+    # or None if there is no package manager.
+    if verifier is None:
+        verifier = find_verifier ()
+        if verifier is None:
+            return None
+
+    mtime = verifier.database_mtime ()
+    results = None
+    if mtime is not None:
+        results = _load_cache (cache_file, verifier, mtime)
+
+    return (verifier.name, mtime, results)
+
+def _verify_steps (verifier, cache_file, workers):
+    # Looking for the package manager and the cache is part of a
+    # recorded session, so that a replay does neither.
+    cached = record_value ('cached_verification', _cached_verification,
+                           verifier, cache_file)
+    if cached is None:
+        return None
+
+    (name, mtime, results) = cached
+    if results is not None:
+        debugprint ("Using cached package verification")
+        return results
+
+    if verifier is None:
+        verifier = find_verifier (name)
+
+    outcome = yield dict (operations=[verifier.verify (package)
+                                      for package in verifier.packages],
+                          timeout=VERIFY_TIMEOUT * 1000,
+                          max_running=workers, name='verify_packages')
+    results = {}
+    failed = False
+    for package, (result, exc) in zip (verifier.packages, outcome):
+        if exc is not None:
+            debugprint ("Verifying %s failed: %s" % (package, repr (exc)))
+            failed = True
+            continue
+
+        (stdout, stderr, status) = result
+        results[package] = stdout[:-1]
+
+    # Don't cache results if packages changed meanwhile.
+    if (not failed and not replaying () and mtime is not None and
+        verifier.database_mtime () == mtime):
+        _save_cache (cache_file, verifier, mtime, results)
+
+    return results
+
+def verify_packages (verifier=None, cache_file=None, workers=MAX_WORKERS,
+                     parent=None, show_dialog=False, started=None,
+                     callback=None):
+    """
+    Verify the printing-related packages, several at a time.
+
+    Results are cached against the package database's modification
+    time, so they are only worked out again once packages change.
+
+    @param verifier: package manager backend, or None to use the one
+    L{find_verifier} finds
+    @type verifier: L{PackageVerifier}
+    @param cache_file: where to cache results, or None for the default
+    @param started: called with the L{TimedOperations} running the
+    verifications, e.g. so that they can be canceled
+    @param callback: if given, called from the main loop as
+    callback (results, exception) instead of waiting for the results
+    @returns: dict of package name: list of verification output lines,
+    or None if there is no package manager to verify with
+    """
+    if cache_file is None:
+        cache_file = _default_cache_file ()
+
+    return run_steps (_verify_steps (verifier, cache_file, workers),
+                      callback=callback, started=started,
+                      parent=parent, show_dialog=show_dialog)
 
 class VerifyPackages(Question):
     def __init__ (self, troubleshooter):
         Question.__init__ (self, troubleshooter, "Verify packages")
         troubleshooter.new_page (Gtk.Label (), self)
 
-    def display (self):
+    def display_async (self, callback):
         self.answers = {}
-        packages_verification = {}
-
-        package_manager="/bin/rpm"
-        if not os.access (package_manager, os.X_OK):
-            return False
-
-        packages = ["cups",
-                    "foomatic",
-                    "gutenprint",
-                    "hpijs",
-                    "hplip",
-                    "system-config-printer"]
+        self.op = None
         parent = self.troubleshooter.get_window ()
 
-        new_environ = os.environ.copy()
-        new_environ['LC_ALL'] = "C"
+        def started (op):
+            self.op = op
 
-        for package in packages:
-            verification_args = [package_manager, "-V", package]
-            try:
-                self.op = TimedSubprocess (parent=parent,
-                                           args=verification_args,
-                                           close_fds=True,
-                                           env=new_environ,
-                                           stdin=subprocess.DEVNULL,
-                                           stdout=subprocess.PIPE,
-                                           stderr=subprocess.DEVNULL)
-                (verif_stdout, verif_stderr, result) = self.op.run ()
-            except:
-                # Problem executing command.
-                return False
-            packages_verification[package] = verif_stdout[:-1]
-
-        self.answers['packages_verification'] = packages_verification
-        return False
+        def verified (packages_verification, exception):
+            self.op = None
+            # An exception means a problem executing the command.
+            if exception is None and packages_verification is not None:
+                self.answers['packages_verification'] = packages_verification
+
+            callback (False)
+
+        verify_packages (parent=parent, show_dialog=True, started=started,
+                         callback=verified)
 
     def collect_answer (self):
         return self.answers
 
     def cancel_operation (self):
-        self.op.cancel ()
+        if self.op is not None:
+            self.op.cancel ()
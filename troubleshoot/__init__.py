@@ -20,6 +20,7 @@
 ## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Gtk
 import pprint
 import sys
@@ -43,10 +44,19 @@ if __name__ == "__main__":
 
 from . import base
 from .base import *
+from .session import Session, load_session
+import timedops
 
 class Troubleshooter:
-    def __init__ (self, quitfn=None, parent=None):
+    def __init__ (self, quitfn=None, parent=None, session=None):
+        """
+        @param session: a L{Session} to record into or to replay, or
+        None to neither record nor replay
+        """
         self._in_module_call = False
+        self.session = session
+        if session is not None:
+            timedops.set_session (session)
 
         main = Gtk.Window ()
         if parent:
@@ -107,9 +117,12 @@ class Troubleshooter:
         # timestamp should be accessible through whole troubleshoot
         now = datetime.datetime.fromtimestamp (time.time ())
         self.answers = {'error_log_timestamp': now.strftime ("%F %T")}
+        if session is not None:
+            session.set_initial_answers (self.answers)
         self.moving_backwards = False
 
-        main.show_all ()
+        if session is None or not session.replaying:
+            main.show_all ()
 
     def quit (self, *args):
         if self._in_module_call:
@@ -131,6 +144,8 @@ class Troubleshooter:
             self.questions.pop ()
 
         self.main.hide ()
+        if self.session is not None:
+            timedops.set_session (None)
         if self.quitfn:
             self.quitfn (self)
 
@@ -169,6 +184,28 @@ class Troubleshooter:
     def is_moving_backwards (self):
         return self.moving_backwards
 
+    def save_session (self, filename):
+        """
+        Save everything needed to replay this session.  Only
+        possible when the troubleshooter was given a session to
+        record into.
+        """
+        self.session.save (filename)
+
+    def replay (self):
+        """
+        Move forward through the pages of a recorded session.
+        """
+        last_page = len (self.session.recorded) - 1
+        context = GLib.MainContext.default ()
+        while (self.current_page < last_page and
+               self.current_page + 1 < len (self.questions)):
+            self._on_forward_clicked (None)
+
+            # Wait for the page to finish displaying.
+            while self._in_module_call:
+                context.iteration (True)
+
     def answers_as_text (self):
         text = ""
         n = 1
@@ -226,12 +263,17 @@ class Troubleshooter:
             self._report_traceback ()
 
         self.current_page -= 1
-        question = self.questions[self.current_page]
-        while not self._display (question):
-            # Skip this one.            
+        self._display (self.questions[self.current_page],
+                       self._back_displayed)
+
+    def _back_displayed (self, result):
+        if not result:
+            # Skip this one.
             debugprint ("Page %d: skip" % (self.current_page))
             self.current_page -= 1
-            question = self.questions[self.current_page]
+            self._display (self.questions[self.current_page],
+                           self._back_displayed)
+            return
 
         self.ntbk.set_current_page (self.current_page)
         answers = {}
@@ -260,15 +302,21 @@ class Troubleshooter:
             self._report_traceback ()
 
         self.current_page += 1
+        self._display (self.questions[self.current_page],
+                       self._forward_displayed)
+
+    def _forward_displayed (self, result):
         question = self.questions[self.current_page]
-        while not self._display (question):
+        if not result:
             # Skip this one, but collect its answers.
             answer_dict = self._collect_answer (question)
             self.question_answers[self.current_page] = answer_dict
             self.answers.update (answer_dict)
             debugprint ("Page %d: skip" % (self.current_page))
             self.current_page += 1
-            question = self.questions[self.current_page]
+            self._display (self.questions[self.current_page],
+                           self._forward_displayed)
+            return
 
         self.ntbk.set_current_page (self.current_page)
         try:
@@ -297,15 +345,23 @@ class Troubleshooter:
         except:
             pass
 
-    def _display (self, question):
-        result = False
+    def _display (self, question, callback):
+        # The page may finish displaying later, from the main loop;
+        # until then we are busy.
+        if self.session is not None:
+            self.session.start_page (self.current_page, question)
+
+        def displayed (result):
+            question.displayed = result
+            if self.session is not None:
+                self.session.displayed (result)
+            callback (result)
+
         try:
-            result = question.display ()
+            question.display_async (displayed)
         except:
             self._report_traceback ()
-
-        question.displayed = result
-        return result
+            displayed (False)
 
     def _can_click_forward (self, question):
         try:
@@ -321,7 +377,10 @@ class Troubleshooter:
         except:
             self._report_traceback ()
 
-        return answer
+        if self.session is None:
+            return answer
+
+        return self.session.collected (self.current_page, question, answer)
 
 QUESTIONS = ["Welcome",
              "SchedulerNotRunning",
@@ -355,8 +414,8 @@ QUESTIONS = ["Welcome",
              "Locale",
              "Shrug"]
 
-def run (quitfn=None, parent=None):
-    troubleshooter = Troubleshooter (quitfn, parent=parent)
+def run (quitfn=None, parent=None, session=None):
+    troubleshooter = Troubleshooter (quitfn, parent=parent, session=session)
     modules_imported = []
     for module in QUESTIONS:
         try:
@@ -369,18 +428,50 @@ def run (quitfn=None, parent=None):
             troubleshooter._report_traceback ()
     return troubleshooter
 
+def replay (filename):
+    """
+    Replay a recorded session without contacting any CUPS server.
+
+    @returns: list of descriptions of where the replay differed from
+    the recording
+    @raises ValueError: the file is not a session that can be replayed
+    """
+    recorded = load_session (filename)
+    troubleshooter = run (session=recorded)
+    troubleshooter.replay ()
+    troubleshooter.quit ()
+    return recorded.differences ()
+
 if __name__ == "__main__":
     import getopt
+    record = None
     try:
         opts, args = getopt.gnu_getopt (sys.argv[1:], '',
-                                        ['debug'])
+                                        ['debug', 'record=', 'replay='])
         for opt, optarg in opts:
             if opt == '--debug':
                 set_debugging (True)
+            elif opt == '--record':
+                record = optarg
+            elif opt == '--replay':
+                differences = replay (optarg)
+                for difference in differences:
+                    print (difference)
+                sys.exit (1 if differences else 0)
     except getopt.GetoptError:
         pass
+
+    def quit (troubleshooter):
+        if record:
+            troubleshooter.save_session (record)
+        Gtk.main_quit ()
+
+    session = None
+    if record:
+        session = Session ()
+
     Gdk.threads_init()
-    run (Gtk.main_quit)
+    run (quit, session=session)
     Gdk.threads_enter ()
     Gtk.main ()
     Gdk.threads_leave ()
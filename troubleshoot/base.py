@@ -48,6 +48,12 @@ class Question:
         if it should be skipped."""
         return True
 
+    def display_async (self, callback):
+        """Like display(), but callback is called with the result
+        instead.  Pages that wait for slow operations override this
+        so as to finish from the main loop."""
+        callback (self.display ())
+
     def connect_signals (self, handler):
         pass
 
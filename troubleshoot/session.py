@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+
+## Printing troubleshooter
+
+## Copyright (C) 2026 Red Hat, Inc.
+
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Record a troubleshooting session so that it can be replayed later
+without access to the original CUPS server.
+
+A session holds, for each page, whether it was displayed, the answers
+it gave, and the outcome of every operation it ran through timedops
+(CUPS requests, network probes, helper commands).  When replaying, the
+operations are not run: their recorded outcomes are returned instead,
+so each question's own logic decides the path through the
+troubleshooter just as it did originally.
+"""
+
+import base64
+import gzip
+import importlib
+import json
+import time
+from debug import *
+
+# Version of the file format written by Session.save.
+FORMAT = 1
+
+# Modules whose exceptions are recreated when replaying.  Anything
+# else is replayed as RuntimeError.
+_EXCEPTION_MODULES = ["builtins", "cups", "socket", "subprocess",
+                      "timedops"]
+
+class ReplayObject:
+    """
+    Stands in for a value that could not be recorded, such as a CUPS
+    connection.  Every attribute is another ReplayObject, and calling
+    one returns a ReplayObject too.
+    """
+    def __init__ (self, description):
+        self.description = description
+
+    def __repr__ (self):
+        return self.description
+
+    @property
+    def __name__ (self):
+        # Named like the method it stands in for, so that operations
+        # run with it are found in the recording.
+        return self.description.rpartition ('.')[2]
+
+    def __getattr__ (self, name):
+        if name.startswith ('__'):
+            raise AttributeError (name)
+
+        return ReplayObject ("%s.%s" % (self.description, name))
+
+    def __call__ (self, *args, **kwds):
+        return ReplayObject ("%s()" % self.description)
+
+def encode (value):
+    """
+    Convert a value into something JSON can represent.
+    """
+    if value is None or isinstance (value, (bool, int, float, str)):
+        return value
+
+    if isinstance (value, list):
+        return [encode (x) for x in value]
+
+    if isinstance (value, tuple):
+        return { '__type__': 'tuple',
+                 'value': [encode (x) for x in value] }
+
+    if isinstance (value, (set, frozenset)):
+        return { '__type__': 'set',
+                 'value': [encode (x) for x in value] }
+
+    if isinstance (value, bytes):
+        return { '__type__': 'bytes',
+                 'value': base64.b64encode (value).decode ('ascii') }
+
+    if isinstance (value, dict):
+        if (all ([isinstance (k, str) for k in value.keys ()]) and
+            '__type__' not in value):
+            return { k: encode (v) for k, v in value.items () }
+
+        return { '__type__': 'dict',
+                 'items': [[encode (k), encode (v)]
+                           for k, v in value.items ()] }
+
+    if isinstance (value, BaseException):
+        cls = value.__class__
+        return { '__type__': 'exception',
+                 'class': "%s.%s" % (cls.__module__, cls.__name__),
+                 'args': encode (value.args) }
+
+    if isinstance (value, ReplayObject):
+        return { '__type__': 'object', 'repr': value.description }
+
+    return { '__type__': 'object', 'repr': repr (value) }
+
+def _exception_class (name):
+    (module, _, cls) = name.rpartition ('.')
+    if module in _EXCEPTION_MODULES:
+        try:
+            klass = getattr (importlib.import_module (module), cls, None)
+            if isinstance (klass, type) and issubclass (klass, BaseException):
+                return klass
+        except ImportError:
+            pass
+
+    return RuntimeError
+
+def decode (value):
+    """
+    Reverse L{encode}.
+    """
+    if isinstance (value, list):
+        return [decode (x) for x in value]
+
+    if not isinstance (value, dict):
+        return value
+
+    kind = value.get ('__type__')
+    if kind is None:
+        return { k: decode (v) for k, v in value.items () }
+    if kind == 'tuple':
+        return tuple (decode (value['value']))
+    if kind == 'set':
+        return set (decode (value['value']))
+    if kind == 'bytes':
+        return base64.b64decode (value['value'])
+    if kind == 'dict':
+        return { decode (k): decode (v) for k, v in value['items'] }
+    if kind == 'exception':
+        klass = _exception_class (value['class'])
+        args = decode (value['args'])
+        try:
+            return klass (*args)
+        except Exception:
+            return RuntimeError (*args)
+
+    return ReplayObject (value.get ('repr', '<unknown>'))
+
+def _public (answers):
+    # Answers starting with '_' hold things such as connections, which
+    # are different each time.
+    if not isinstance (answers, dict) or '__type__' in answers:
+        return answers
+
+    return { k: v for k, v in answers.items () if not k.startswith ('_') }
+
+class Session:
+    """
+    The pages visited in one run of the troubleshooter.
+
+    @ivar pages: for each page, a dict with 'question' (class name),
+    'displayed', 'answers' and 'operations', all in encoded form
+    @ivar initial_answers: the answers the troubleshooter started with
+    @ivar replaying: whether operations come from the recording
+    """
+    def __init__ (self, data=None):
+        self.replaying = data is not None
+        if data is None:
+            data = { 'format': FORMAT,
+                     'created': time.time (),
+                     'initial_answers': {},
+                     'pages': [] }
+
+        self.created = data.get ('created')
+        self.initial_answers = decode (data['initial_answers'])
+        self.recorded = data['pages']
+        self.pages = []
+        self.page = 0
+        self._cursors = {}
+
+    def set_initial_answers (self, answers):
+        if self.replaying:
+            answers.clear ()
+            answers.update (self.initial_answers)
+        else:
+            self.initial_answers = dict (answers)
+
+    def _recorded_page (self, page):
+        if page < len (self.recorded):
+            return self.recorded[page]
+
+        return None
+
+    def _current (self):
+        while len (self.pages) <= self.page:
+            self.pages.append ({ 'question': None,
+                                 'displayed': None,
+                                 'answers': {},
+                                 'operations': [] })
+
+        return self.pages[self.page]
+
+    def start_page (self, page, question):
+        """
+        Note that a page is about to be displayed.  Anything recorded
+        for it or for later pages is forgotten.
+        """
+        self.page = page
+        self._cursors = {}
+        del self.pages[page:]
+        self._current ()['question'] = question.__class__.__name__
+
+    def displayed (self, displayed):
+        self._current ()['displayed'] = displayed
+
+    def collected (self, page, question, answers):
+        """
+        Note the answers a page gave.  When replaying a page that was
+        displayed, the user's choices cannot be worked out again, so
+        the recorded answers are used instead.
+
+        @returns: the answers to use
+        """
+        self.page = page
+        current = self._current ()
+        current['question'] = question.__class__.__name__
+        current['answers'] = encode (answers)
+        recorded = self._recorded_page (self.page)
+        if (self.replaying and recorded is not None and
+            recorded['question'] == current['question'] and
+            recorded['displayed']):
+            return decode (recorded['answers'])
+
+        return answers
+
+    def record_operation (self, name, result, exception):
+        if self.replaying:
+            return
+
+        self._current ()['operations'].append ([name,
+                                                encode (result),
+                                                encode (exception)])
+
+    def next_operation (self, name):
+        """
+        Find the outcome of the next operation of this name that the
+        current page ran when it was recorded.
+
+        @returns: (result, exception), or None if there is no such
+        operation
+        """
+        recorded = self._recorded_page (self.page)
+        if recorded is None:
+            return None
+
+        operations = recorded['operations']
+        start = self._cursors.get (name, 0)
+        for i in range (start, len (operations)):
+            if operations[i][0] == name:
+                self._cursors[name] = i + 1
+                return (decode (operations[i][1]),
+                        decode (operations[i][2]))
+
+        return None
+
+    def differences (self):
+        """
+        Compare a replay with the recording.
+
+        @returns: list of descriptions of where the replay differed
+        """
+        differences = []
+        for page, recorded in enumerate (self.recorded):
+            if page >= len (self.pages):
+                differences.append ("Page %d (%s): not reached" %
+                                    (page, recorded['question']))
+                break
+
+            replayed = self.pages[page]
+            if replayed['question'] != recorded['question']:
+                differences.append ("Page %d: %s instead of %s" %
+                                    (page, replayed['question'],
+                                     recorded['question']))
+                break
+
+            if replayed['displayed'] != recorded['displayed']:
+                differences.append ("Page %d (%s): displayed %s, "
+                                    "recorded %s" %
+                                    (page, recorded['question'],
+                                     replayed['displayed'],
+                                     recorded['displayed']))
+            elif (not recorded['displayed'] and
+                  _public (replayed['answers']) !=
+                  _public (recorded['answers'])):
+                differences.append ("Page %d (%s): answers differ" %
+                                    (page, recorded['question']))
+
+        return differences
+
+    def save (self, filename):
+        data = { 'format': FORMAT,
+                 'created': self.created,
+                 'initial_answers': encode (self.initial_answers),
+                 'pages': self.pages }
+        with gzip.open (filename, 'wt', encoding='utf-8') as f:
+            json.dump (data, f)
+
+def load_session (filename):
+    """
+    Read a session saved with Session.save, ready for replaying.
+
+    @raises ValueError: the file is not a session this version can read
+    """
+    try:
+        with gzip.open (filename, 'rt', encoding='utf-8') as f:
+            data = json.load (f)
+    except OSError as e:
+        raise ValueError ("%s: %s" % (filename, e))
+
+    if not isinstance (data, dict) or data.get ('format') != FORMAT:
+        raise ValueError ("%s: unsupported session format" % filename)
+
+    return Session (data)